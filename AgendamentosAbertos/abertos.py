@@ -1,17 +1,41 @@
 import os
+import sys
 import json
 import requests
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+# Raiz do projeto no path para o código compartilhado (comum/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum import agendador, filtros_ixc, gravacao, limitador, memo, metricas, perfil
+from comum.json_incremental import iterar_registros
+from comum.paginacao import paginar
+from comum.registros import OrdemServico
+
 load_dotenv()
 
+# Gravação/reprodução do tráfego HTTP para testes offline (ALERTAS_GRAVACAO)
+gravacao.instalar_de_ambiente()
+
+# Métricas no formato do Prometheus em METRICAS_PORTA (desligadas sem a variável)
+metricas.instalar_de_ambiente()
+
+# Limite adaptativo de requisições simultâneas ao IXC, comum a todo o processo (IXC_LIMITADOR=0 desliga)
+limitador.instalar_de_ambiente()
+
+# Perfil do próximo ciclo com PERFIL_PROXIMO_CICLO=1 ou kill -USR1
+perfil.instalar_de_ambiente()
+
 # Configurações da API
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
+# URLs base (sobrescrevíveis para apontar para o Simulador/)
+IXC_BASE_URL = os.getenv("IXC_BASE_URL", "https://assinante.nmultifibra.com.br/webservice/v1")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
 # Headers padrão para as requisições IXC
 HEADERS = {
     "Authorization": f"Basic {AUTH_TOKEN}",
@@ -38,6 +62,24 @@ ESTADO_ARQUIVO = "alerts_state.json"
 # Intervalo de execução em minutos (pode ser alterado conforme necessidade)
 INTERVALO_MINUTOS = 30
 
+# Minutos de abertura a partir dos quais o chamado sem agendamento é alertado
+MINUTOS_ABERTURA = 30
+
+# Se o IXC aplica o IN de cada consulta; None até a primeira delas. Se não aplicar, a
+# busca dos chamados passa a ser uma consulta por assunto (FILTRO_IN_ASSUNTOS) e a dos
+# responsáveis uma por ticket (FILTRO_IN_TICKETS), até o fim do processo
+FILTRO_IN_ASSUNTOS = None
+FILTRO_IN_TICKETS = None
+
+# Responsável técnico de cada ticket, guardado entre ciclos. A entrada vale por
+# RESPONSAVEIS_VALIDADE_HORAS; antes disso só é consultada de novo se o ticket mudar
+ARQUIVO_RESPONSAVEIS = "responsaveis_tickets.json"
+RESPONSAVEIS_VALIDADE_HORAS = float(os.getenv("RESPONSAVEIS_VALIDADE_HORAS", "12"))
+LOTE_TICKETS = 500
+# Folga na busca de tickets alterados, para diferenças de relógio com o IXC
+SOBREPOSICAO_MINUTOS = 5
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
 def carregar_estado():
     if os.path.exists(ESTADO_ARQUIVO):
         with open(ESTADO_ARQUIVO, "r") as f:
@@ -48,39 +90,186 @@ def salvar_estado(estado):
     with open(ESTADO_ARQUIVO, "w") as f:
         json.dump(estado, f, indent=2, default=str)
 
-def buscar_chamados_abertos():
-    chamados = []
-    page = 1
-    url = "https://assinante.nmultifibra.com.br/webservice/v1/su_oss_chamado"
-    while True:
+def carregar_responsaveis():
+    if os.path.exists(ARQUIVO_RESPONSAVEIS):
+        try:
+            with open(ARQUIVO_RESPONSAVEIS, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+def salvar_responsaveis(responsaveis, agora):
+    """Grava o cache sem as entradas vencidas (arquivo temporário + troca)"""
+    validade = agora - timedelta(hours=RESPONSAVEIS_VALIDADE_HORAS)
+    for id_ticket in [t for t, e in responsaveis.items() if datetime.fromisoformat(e["consultado"]) < validade]:
+        del responsaveis[id_ticket]
+    temporario = ARQUIVO_RESPONSAVEIS + ".tmp"
+    with open(temporario, "w") as f:
+        json.dump(responsaveis, f)
+    os.replace(temporario, ARQUIVO_RESPONSAVEIS)
+
+def buscar_tickets(ids_tickets, condicoes=()):
+    """Registros de su_ticket dos ids, em lotes de LOTE_TICKETS com filtro IN, que
+    atendem às condições. None se o IXC não aplicar o IN"""
+    registros = []
+    for i in range(0, len(ids_tickets), LOTE_TICKETS):
+        lote = ids_tickets[i:i + LOTE_TICKETS]
+        ids = filtros_ixc.condicao("su_ticket.id", "IN", lote)
         payload = {
-            "qtype": "status",
-            "query": "A",
-            "oper": "=",
-            "page": str(page),
-            "rp": "9999"
+            "qtype": "id",
+            "query": "0",
+            "oper": ">",
+            "page": "1",
+            "rp": str(len(lote)),
+            "grid_param": filtros_ixc.grid_param([ids, *condicoes])
         }
+        data = consultar_ixc("su_ticket", payload)
+        if data.get("type") == "error":
+            return None
+        for registro in data.get("registros") or []:
+            if not filtros_ixc.atende(registro, [ids]):
+                return None
+            registros.append(registro)
+    return registros
+
+def atualizar_responsaveis(responsaveis, ids_tickets, agora):
+    """Deixa no cache o responsável atual de cada ticket. Os que faltam ou venceram
+    são consultados em lote; dos demais, vêm só os alterados desde a última verificação.
+    Sem IN no IXC (ou em falha), os que faltam ficam para a consulta por ticket"""
+    global FILTRO_IN_TICKETS
+    validade = agora - timedelta(hours=RESPONSAVEIS_VALIDADE_HORAS)
+    novos, guardados = [], []
+    for id_ticket in sorted(set(ids_tickets)):
+        entrada = responsaveis.get(id_ticket)
+        if entrada is None or datetime.fromisoformat(entrada["consultado"]) < validade:
+            novos.append(id_ticket)
+        else:
+            guardados.append(id_ticket)
+
+    alterados = 0
+    if FILTRO_IN_TICKETS is not False:
         try:
-            response = requests.post(url, json=payload, headers=HEADERS)
-            response.raise_for_status()
-            data = response.json()
+            registros = buscar_tickets(novos) if novos else []
+            if registros is not None:
+                for registro in registros:
+                    responsaveis[str(registro.get("id"))] = {
+                        "responsavel": registro.get("id_responsavel_tecnico"),
+                        "consultado": agora.isoformat(),
+                        "verificado": agora.isoformat(),
+                    }
+            if registros is not None and guardados:
+                desde = min(datetime.fromisoformat(responsaveis[t]["verificado"]) for t in guardados)
+                desde -= timedelta(minutes=SOBREPOSICAO_MINUTOS)
+                mudou = filtros_ixc.condicao("su_ticket.ultima_atualizacao", ">=", desde.strftime(FORMATO_DATA))
+                registros = buscar_tickets(guardados, [mudou])
+                if registros is not None:
+                    for registro in registros:
+                        entrada = responsaveis[str(registro.get("id"))]
+                        alterados += entrada["responsavel"] != registro.get("id_responsavel_tecnico")
+                        entrada["responsavel"] = registro.get("id_responsavel_tecnico")
+                    for id_ticket in guardados:
+                        responsaveis[id_ticket]["verificado"] = agora.isoformat()
+            if registros is None:
+                FILTRO_IN_TICKETS = False
+                # print("Filtro IN não aplicado pelo IXC; responsáveis consultados por ticket")
         except Exception as e:
-            # print(f"Erro ao buscar chamados (página {page}): {e}")
-            break
+            # print(f"Erro ao atualizar responsáveis em lote: {e}")
+            pass
+
+    metricas.CACHE.inc(len(guardados), cache="responsaveis_tickets", resultado="acerto")
+    metricas.CACHE.inc(len(novos), cache="responsaveis_tickets", resultado="falta")
+    perfil.contar("responsaveis_alterados", alterados)
+
+def responsavel_do_ticket(responsaveis, id_ticket, agora):
+    """Responsável técnico pelo cache; fora dele, consulta o ticket e guarda"""
+    entrada = responsaveis.get(str(id_ticket))
+    if entrada is not None:
+        return entrada["responsavel"]
+    id_responsavel = obter_id_responsavel_por_ticket(id_ticket)
+    if id_responsavel:
+        responsaveis[str(id_ticket)] = {
+            "responsavel": id_responsavel,
+            "consultado": agora.isoformat(),
+            "verificado": agora.isoformat(),
+        }
+    return id_responsavel
 
-        if "registros" in data and data["registros"]:
-            chamados.extend(data["registros"])
-            if len(data["registros"]) < 9999:
+def listar_chamados(qtype, query, condicoes, cabecalho):
+    """Gera os registros de su_oss_chamado do filtro principal e das condições do grid,
+    decodificando cada página em fluxo. Falhas encerram a listagem (cabecalho['erro'])"""
+    url = f"{IXC_BASE_URL}/su_oss_chamado"
+    rp = 9999
+
+    def buscar_pagina(page, cabecalho_pagina):
+        payload = {
+            "qtype": qtype,
+            "query": str(query),
+            "oper": "=",
+            "page": str(page),
+            "rp": str(rp),
+            "grid_param": filtros_ixc.grid_param(condicoes)
+        }
+        with requests.post(url, json=payload, headers=HEADERS, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            yield from iterar_registros(response.iter_content(65536), cabecalho_pagina)
+
+    yield from paginar(buscar_pagina, rp, cabecalho_total=cabecalho, nome="su_oss_chamado")
+
+def buscar_chamados_abertos(agora=None):
+    """Gera os chamados (OrdemServico) abertos, dos assuntos alvo e com pelo menos
+    MINUTOS_ABERTURA de abertura, um a um.
+
+    Os filtros vão na consulta (grid_param), então só essas OS trafegam. Os assuntos
+    seguem num único IN; se o IXC recusar o IN ou devolver outro assunto, a busca
+    continua com uma consulta por assunto, sem repetir as OS já geradas. Cada registro
+    ainda é conferido contra as condições, caso o IXC ignore alguma delas."""
+    global FILTRO_IN_ASSUNTOS
+    agora = agora or datetime.now()
+    limite = (agora - timedelta(minutes=MINUTOS_ABERTURA)).strftime(FORMATO_DATA)
+    status = filtros_ixc.condicao("su_oss_chamado.status", "=", "A")
+    abertura = filtros_ixc.condicao("su_oss_chamado.data_abertura", "<=", limite)
+    assuntos = filtros_ixc.condicao("su_oss_chamado.id_assunto", "IN", ASSUNTOS_ALVO)
+    vistos = set()
+
+    if FILTRO_IN_ASSUNTOS is not False:
+        cabecalho = {}
+        for registro in listar_chamados("status", "A", [assuntos, abertura], cabecalho):
+            if not filtros_ixc.atende(registro, [assuntos]):
+                FILTRO_IN_ASSUNTOS = False
                 break
-            page += 1
+            if filtros_ixc.atende(registro, [status, abertura]):
+                vistos.add(registro.get("id"))
+                yield OrdemServico.de_registro(registro)
         else:
-            break
-    return chamados
+            if cabecalho.get("type") != "error":
+                # Falhas de rede encerram a listagem, como antes (print(f"Erro ao buscar chamados: {e}"))
+                if "erro" not in cabecalho:
+                    FILTRO_IN_ASSUNTOS = True
+                return
+            FILTRO_IN_ASSUNTOS = False
+        # print("Filtro IN de assuntos não aplicado pelo IXC; consultando por assunto")
+
+    for id_assunto in ASSUNTOS_ALVO:
+        cabecalho = {}
+        for registro in listar_chamados("id_assunto", id_assunto, [status, abertura], cabecalho):
+            if registro.get("id") not in vistos and filtros_ixc.atende(registro, [status, abertura]):
+                yield OrdemServico.de_registro(registro)
+        if "erro" in cabecalho:
+            return
+
+def consultar_ixc(tabela, payload):
+    """JSON de uma listagem do IXC, memorizado no ciclo por tabela + payload (o mesmo
+    responsável ou assunto em vários chamados gera uma única requisição)"""
+    def consultar():
+        response = requests.post(f"{IXC_BASE_URL}/{tabela}", json=payload, headers=HEADERS)
+        response.raise_for_status()
+        return response.json()
+    return memo.memorizar(memo.chave(tabela, payload), consultar)
 
 def obter_id_responsavel_por_ticket(id_ticket):
     if not id_ticket:
         return None
-    url = "https://assinante.nmultifibra.com.br/webservice/v1/su_ticket"
     payload = {
         "qtype": "id",
         "query": str(id_ticket),
@@ -89,9 +278,7 @@ def obter_id_responsavel_por_ticket(id_ticket):
         "rp": "1"
     }
     try:
-        response = requests.post(url, json=payload, headers=HEADERS)
-        response.raise_for_status()
-        data = response.json()
+        data = consultar_ixc("su_ticket", payload)
         if "registros" in data and data["registros"]:
             return data["registros"][0].get("id_responsavel_tecnico")
     except Exception as e:
@@ -102,7 +289,6 @@ def obter_id_responsavel_por_ticket(id_ticket):
 def obter_nome_responsavel(id_responsavel):
     if not id_responsavel:
         return "Não informado"
-    url = "https://assinante.nmultifibra.com.br/webservice/v1/funcionarios"
     payload = {
         "qtype": "id",
         "query": str(id_responsavel),
@@ -111,9 +297,7 @@ def obter_nome_responsavel(id_responsavel):
         "rp": "1"
     }
     try:
-        response = requests.post(url, json=payload, headers=HEADERS)
-        response.raise_for_status()
-        data = response.json()
+        data = consultar_ixc("funcionarios", payload)
         if "registros" in data and data["registros"]:
             return data["registros"][0].get("funcionario", "Desconhecido")
     except Exception as e:
@@ -122,7 +306,6 @@ def obter_nome_responsavel(id_responsavel):
     return "Não encontrado"
 
 def obter_assunto_por_id(id_assunto):
-    url = "https://assinante.nmultifibra.com.br/webservice/v1/su_oss_assunto"
     payload = {
         "qtype": "id",
         "query": str(id_assunto),
@@ -131,9 +314,7 @@ def obter_assunto_por_id(id_assunto):
         "rp": "1"
     }
     try:
-        response = requests.post(url, json=payload, headers=HEADERS)
-        response.raise_for_status()
-        data = response.json()
+        data = consultar_ixc("su_oss_assunto", payload)
         if "registros" in data and data["registros"]:
             return data["registros"][0].get("assunto", str(id_assunto))
     except Exception as e:
@@ -142,7 +323,7 @@ def obter_assunto_por_id(id_assunto):
     return str(id_assunto)
 
 def enviar_alerta_telegram(mensagem, max_retries=5):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": TELEGRAM_CHAT_ID,
         "text": mensagem,
@@ -173,38 +354,34 @@ def enviar_alerta_telegram(mensagem, max_retries=5):
     # print("Falha ao enviar mensagem após múltiplas tentativas.")
     return False
 
-def main():
-    # print(f"Iniciando monitoria - {datetime.now()}")
-    estado = carregar_estado()
-    agora = datetime.now()
-    chamados = buscar_chamados_abertos()
-    # print(f"Total de chamados com status A: {len(chamados)}")
+def filtrar_chamados(chamados, estado, agora):
+    """Etapa de filtro: consome os chamados em fluxo e guarda apenas os elegíveis
 
+    Retorna (elegiveis, ids_abertos, contagem), onde ids_abertos são as OS abertas
+    com assunto alvo (usadas para limpar o estado) e contagem alimenta o relatório.
+    """
     ids_abertos = set()
     total_assunto_filtrado = 0
     total_tempo_filtrado = 0
     total_ja_alertado = 0
-    total_responsavel_filtrado = 0
-    alertas_enviados = 0
 
+    elegiveis = []
     for chamado in chamados:
-        id_os = chamado["id"]
-        id_assunto = int(chamado["id_assunto"])
+        id_os = chamado.id
+        id_assunto = chamado.id_assunto
 
         if id_assunto not in ASSUNTOS_ALVO:
             continue
         total_assunto_filtrado += 1
         ids_abertos.add(id_os)
 
-        data_abertura_str = chamado["data_abertura"]
-        try:
-            data_abertura = datetime.strptime(data_abertura_str, "%Y-%m-%d %H:%M:%S")
-        except Exception as e:
-            # print(f"Erro ao converter data {data_abertura_str} do chamado {id_os}: {e}")
+        data_abertura = chamado.data_abertura
+        if data_abertura is None:
+            # print(f"Data de abertura inválida no chamado {id_os}")
             continue
 
         minutos_abertura = (agora - data_abertura).total_seconds() / 60.0
-        if minutos_abertura < 30:
+        if minutos_abertura < MINUTOS_ABERTURA:
             continue
         total_tempo_filtrado += 1
 
@@ -216,12 +393,53 @@ def main():
                 total_ja_alertado += 1
                 continue
 
-        id_ticket = chamado.get("id_ticket")
+        elegiveis.append(chamado)
+
+    contagem = {
+        "assunto": total_assunto_filtrado,
+        "tempo": total_tempo_filtrado,
+        "ja_alertado": total_ja_alertado,
+    }
+    return elegiveis, ids_abertos, contagem
+
+@perfil.medir_ciclo("agendamentos_abertos")
+@memo.por_ciclo
+def main(orcamento=None):
+    """Alerta os chamados elegíveis, os abertos há mais tempo primeiro. Se o orçamento
+    do ciclo acabar, os restantes ficam sem alerta no estado e entram no próximo ciclo"""
+    # print(f"Iniciando monitoria - {datetime.now()}")
+    estado = carregar_estado()
+    agora = datetime.now()
+
+    total_responsavel_filtrado = 0
+    alertas_enviados = 0
+
+    with perfil.etapa("buscar_filtrar"):
+        elegiveis, ids_abertos, contagem = filtrar_chamados(buscar_chamados_abertos(agora), estado, agora)
+    perfil.contar("elegiveis", len(elegiveis))
+    elegiveis.sort(key=lambda chamado: chamado.data_abertura)
+
+    responsaveis = carregar_responsaveis()
+    with perfil.etapa("responsaveis"):
+        atualizar_responsaveis(responsaveis, [str(c.id_ticket) for c in elegiveis if c.id_ticket], agora)
+
+    adiados = 0
+    for restantes, chamado in enumerate(elegiveis, 1):
+        if orcamento is not None and orcamento.esgotado():
+            adiados = len(elegiveis) - restantes + 1
+            perfil.marcar_resultado("parcial")
+            break
+        metricas.FILA.definir(len(elegiveis) - restantes, fila="chamados_elegiveis")
+        id_os = chamado.id
+        id_assunto = chamado.id_assunto
+        data_abertura_str = chamado.data_abertura.strftime("%Y-%m-%d %H:%M:%S")
+        id_ticket = chamado.id_ticket
         if not id_ticket:
             # print(f"Chamado {id_os} sem id_ticket, ignorado.")
             continue
 
-        id_responsavel = obter_id_responsavel_por_ticket(id_ticket)
+        with perfil.etapa("enriquecer"):
+            id_responsavel = responsavel_do_ticket(responsaveis, id_ticket, agora)
         if not id_responsavel:
             # print(f"Chamado {id_os}: não foi possível obter responsável.")
             continue
@@ -230,12 +448,13 @@ def main():
             total_responsavel_filtrado += 1
             continue
 
-        nome_responsavel = obter_nome_responsavel(id_responsavel)
-        assunto_desc = obter_assunto_por_id(id_assunto)
+        with perfil.etapa("enriquecer"):
+            nome_responsavel = obter_nome_responsavel(id_responsavel)
+            assunto_desc = obter_assunto_por_id(id_assunto)
 
         mensagem = (
             f"⏱️ ORDEM DE SERVIÇO S/ AGENDAMENTO\n\n"
-            f"ID Cliente: {chamado['id_cliente']}\n"
+            f"ID Cliente: {chamado.id_cliente}\n"
             f"ID O.S.: {id_os}\n"
             f"Assunto: {assunto_desc}\n"
             f"Abertura: {data_abertura_str}\n"
@@ -243,15 +462,20 @@ def main():
             f"Responsável: {nome_responsavel}"
         )
 
-        if enviar_alerta_telegram(mensagem):
+        with perfil.etapa("enviar"):
+            enviado = enviar_alerta_telegram(mensagem)
+        if enviado:
+            metricas.ALERTAS.inc(canal="telegram", resultado="enviado")
             alertas_enviados += 1
             estado[id_os] = {
                 "last_alert": agora.isoformat(),
                 "subject_id": id_assunto,
-                "client_id": chamado["id_cliente"],
+                "client_id": chamado.id_cliente,
                 "open_date": data_abertura_str,
                 "responsavel_id": id_responsavel
             }
+        else:
+            metricas.ALERTAS.inc(canal="telegram", resultado="falha")
 
         time.sleep(1)
 
@@ -260,18 +484,22 @@ def main():
         if id_os not in ids_abertos:
             del estado[id_os]
     salvar_estado(estado)
+    salvar_responsaveis(responsaveis, agora)
+
+    perfil.contar("responsavel_fora_da_lista", total_responsavel_filtrado)
+    perfil.contar("alertas", alertas_enviados)
+    perfil.contar("adiados", adiados)
 
     # print("\n--- RELATÓRIO DE FILTRAGEM ---")
-    # print(f"Chamados com assunto alvo: {total_assunto_filtrado}")
-    # print(f"Chamados com >=30 min abertura: {total_tempo_filtrado}")
-    # print(f"Chamados já alertados <30 min: {total_ja_alertado}")
+    # print(f"Chamados com assunto alvo: {contagem['assunto']}")
+    # print(f"Chamados com >=30 min abertura: {contagem['tempo']}")
+    # print(f"Chamados já alertados <30 min: {contagem['ja_alertado']}")
     # print(f"Chamados com responsável fora da lista: {total_responsavel_filtrado}")
     # print(f"Alertas enviados agora: {alertas_enviados}")
+    # print(f"Chamados adiados para o próximo ciclo: {adiados}")
     # print("Monitoria finalizada.\n")
 
 if __name__ == "__main__":
-    # Loop infinito com agendamento interno
-    while True:
-        main()
-        # print(f"Aguardando {INTERVALO_MINUTOS} minutos até a próxima execução...")
-        time.sleep(INTERVALO_MINUTOS * 60)  # Converte minutos para segundos
\ No newline at end of file
+    # Loop infinito em ritmo fixo de INTERVALO_MINUTOS, uma instância por pasta
+    with agendador.instancia_unica("agendamentos_abertos"):
+        agendador.executar_em_ritmo(main, INTERVALO_MINUTOS * 60, nome="agendamentos_abertos")
\ No newline at end of file
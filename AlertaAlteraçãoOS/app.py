@@ -1,11 +1,33 @@
+import json
+import logging
 import os
-import requests
-import time
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+# Raiz do projeto no path para o código compartilhado (comum/) e a pasta do script (regras.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from comum import agendador, gravacao, limitador, metricas, perfil, resiliencia
+from comum.json_incremental import iterar_registros
+from comum.paginacao import paginar
+from comum.registros import MensagemOS, OrdemServico
+from regras import REGRAS, Motor
+
 load_dotenv()
 
+# Gravação/reprodução do tráfego HTTP para testes offline (ALERTAS_GRAVACAO)
+gravacao.instalar_de_ambiente()
+
+# Métricas no formato do Prometheus em METRICAS_PORTA (desligadas sem a variável)
+metricas.instalar_de_ambiente()
+
+# Limite adaptativo de requisições simultâneas ao IXC, comum a todo o processo (IXC_LIMITADOR=0 desliga)
+limitador.instalar_de_ambiente()
+
+# Perfil do próximo ciclo com PERFIL_PROXIMO_CICLO=1 ou kill -USR1
+perfil.instalar_de_ambiente()
+
 # ==================== CONFIGURAÇÕES ====================
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
@@ -30,10 +52,40 @@ RESPONSAVEIS_ALVO = [283] # Meu ID: 236
 # Vinicius Arruda Felix = 152
 ENCARREGADOS_IDS = [152]  # Adicione os demais IDs conforme necessário
 
-BASE_URL = "https://assinante.nmultifibra.com.br/webservice/v1"
+# Regras de violação (regras.py) com os papéis de cada operador já indexados
+MOTOR_REGRAS = Motor(REGRAS, terceirizada=RESPONSAVEIS_ALVO, encarregado=ENCARREGADOS_IDS)
+
+BASE_URL = os.getenv("IXC_BASE_URL", "https://assinante.nmultifibra.com.br/webservice/v1")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
 INTERVALO_MINUTOS = 15
 ARQUIVO_ULTIMA_EXEC = "ultima_execucao.txt"
 
+# Modo de acompanhamento: a cada ACOMPANHAMENTO_SEGUNDOS lê só as mensagens com id maior
+# que o último visto, em vez de varrer as OS do mês a cada INTERVALO_MINUTOS (0 = desligado)
+ACOMPANHAMENTO_SEGUNDOS = float(os.getenv("ACOMPANHAMENTO_SEGUNDOS", "0") or 0)
+ARQUIVO_ULTIMO_ID = "ultimo_id_mensagem.txt"
+RP_ACOMPANHAMENTO = 500
+
+# Falhas seguidas por OS no acompanhamento; na ACOMPANHAMENTO_MAX_TENTATIVAS-ésima a
+# OS é pulada e o último id passa dela, para uma OS com defeito não prender a fila
+ARQUIVO_TENTATIVAS = "tentativas_acompanhamento.json"
+ACOMPANHAMENTO_MAX_TENTATIVAS = int(os.getenv("ACOMPANHAMENTO_MAX_TENTATIVAS", "5"))
+
+# (id da OS, tipo, data) das violações já alertadas após a última execução salva;
+# evita repetir alertas quando um ciclo parcial é refeito a partir da mesma marca,
+# inclusive depois de um reinício (ficam em ARQUIVO_VIOLACOES)
+VIOLACOES_ALERTADAS = set()
+ARQUIVO_VIOLACOES = "violacoes_alertadas.json"
+
+# id da OS -> início do último ciclo que a analisou por completo, quando mais recente que
+# a última execução salva (ciclos interrompidos pelo orçamento ou por falhas); ficam em
+# ARQUIVO_MARCAS para um reinício não refazer as OS já cobertas
+MARCAS_OS = {}
+ARQUIVO_MARCAS = "marcas_os.json"
+
+# Nomes de assunto do modo de acompanhamento, que roda a cada poucos segundos
+CACHE_ASSUNTOS = {}
+
 # ==================== FUNÇÕES AUXILIARES ====================
 def carregar_ultima_execucao():
     try:
@@ -46,23 +98,82 @@ def salvar_ultima_execucao(timestamp):
     with open(ARQUIVO_ULTIMA_EXEC, 'w') as f:
         f.write(timestamp.isoformat())
 
+def carregar_ultimo_id():
+    try:
+        with open(ARQUIVO_ULTIMO_ID, 'r') as f:
+            return int(f.read().strip())
+    except:
+        return None
+
+def salvar_ultimo_id(id_mensagem):
+    with open(ARQUIVO_ULTIMO_ID, 'w') as f:
+        f.write(str(id_mensagem))
+
+def carregar_tentativas():
+    try:
+        with open(ARQUIVO_TENTATIVAS, 'r') as f:
+            return json.load(f)
+    except:
+        return {}
+
+def salvar_tentativas(tentativas):
+    with open(ARQUIVO_TENTATIVAS, 'w') as f:
+        json.dump(tentativas, f)
+
+def carregar_violacoes_alertadas():
+    try:
+        with open(ARQUIVO_VIOLACOES, 'r') as f:
+            return {(id_os, tipo, datetime.fromisoformat(data)) for id_os, tipo, data in json.load(f)}
+    except:
+        return set()
+
+def salvar_violacoes_alertadas():
+    with open(ARQUIVO_VIOLACOES, 'w') as f:
+        json.dump([[id_os, tipo, data.isoformat()] for id_os, tipo, data in sorted(VIOLACOES_ALERTADAS)], f)
+
+def carregar_marcas_os():
+    try:
+        with open(ARQUIVO_MARCAS, 'r') as f:
+            return {id_os: datetime.fromisoformat(marca) for id_os, marca in json.load(f).items()}
+    except:
+        return {}
+
+def salvar_marcas_os():
+    with open(ARQUIVO_MARCAS, 'w') as f:
+        json.dump({id_os: marca.isoformat() for id_os, marca in MARCAS_OS.items()}, f)
+
 def api_request(endpoint, payload):
+    """Resposta JSON ou None; falhas transitórias persistentes lançam resiliencia.FalhaRequisicao"""
     url = f"{BASE_URL}/{endpoint}"
     try:
-        response = requests.post(url, headers=HEADERS, json=payload, timeout=60)
+        response = resiliencia.requisitar("POST", url, headers=HEADERS, json=payload, timeout=60)
         response.raise_for_status()
         return response.json()
+    except resiliencia.FalhaRequisicao:
+        raise
     except Exception as e:
         """ print(f"[ERRO] Requisição para {endpoint} falhou: {e}") """
         if 'response' in locals():
             """ print("Resposta:", response.text[:500]) """
         return None
 
+def api_request_stream(endpoint, payload, cabecalho):
+    """Gera os registros da resposta um a um, sem montar a página inteira em memória.
+    Os demais campos (ex.: total) ficam em cabecalho ao fim da iteração"""
+    url = f"{BASE_URL}/{endpoint}"
+    try:
+        with resiliencia.requisitar("POST", url, headers=HEADERS, json=payload, timeout=60, stream=True) as response:
+            response.raise_for_status()
+            yield from iterar_registros(response.iter_content(65536), cabecalho)
+    except Exception as e:
+        """ print(f"[ERRO] Requisição para {endpoint} falhou: {e}") """
+        cabecalho['erro'] = str(e)
+
 def get_oss_por_data_abertura(data_inicio):
-    todas_os = []
-    page = 1
+    """Gera as OS (OrdemServico) abertas a partir de data_inicio, uma a uma"""
     rp = 5000
-    while True:
+
+    def buscar_pagina(page, cabecalho):
         """ print(f"Buscando página {page} de OS com data_abertura >= {data_inicio}...") """
         payload = {
             "qtype": "data_abertura",
@@ -71,50 +182,94 @@ def get_oss_por_data_abertura(data_inicio):
             "page": str(page),
             "rp": str(rp)
         }
-        data = api_request("su_oss_chamado", payload)
-        if not data:
-            break
-
-        registros = data.get('registros', [])
-        todas_os.extend(registros)
-        total = int(data.get('total', 0))
-        """ print(f"Página {page}: {len(registros)} registros, total informado: {total}") """
+        return api_request_stream("su_oss_chamado", payload, cabecalho)
 
-        if len(registros) < rp or page * rp >= total:
-            """ print("Última página atingida.") """
-            break
-        page += 1
-
-    """ print(f"Total de OS coletadas: {len(todas_os)}") """
-    return todas_os
+    cabecalho = {}
+    for registro in paginar(buscar_pagina, rp, cabecalho_total=cabecalho, nome="su_oss_chamado"):
+        yield OrdemServico.de_registro(registro)
+    if "erro" in cabecalho:
+        raise resiliencia.FalhaRequisicao(f"Listagem de OS incompleta: {cabecalho['erro']}", "paginacao")
 
 def get_mensagens_os(id_chamado):
-    todas_msgs = []
-    page = 1
-    while True:
+    rp = 1000
+
+    def buscar_pagina(page, cabecalho):
         payload = {
             "qtype": "id_chamado",
             "query": str(id_chamado),
             "oper": "=",
             "page": str(page),
-            "rp": "1000"
+            "rp": str(rp)
         }
-        data = api_request("su_oss_chamado_mensagem", payload)
-        if not data:
-            break
+        return api_request_stream("su_oss_chamado_mensagem", payload, cabecalho)
 
-        registros = data.get('registros', [])
-        todas_msgs.extend(registros)
+    todas_msgs = []
+    cabecalho = {}
+    for registro in paginar(buscar_pagina, rp, cabecalho_total=cabecalho, nome="su_oss_chamado_mensagem"):
+        msg = MensagemOS.de_registro(registro)
+        # Mensagens sem data válida não entram na análise
+        if msg.data is not None:
+            todas_msgs.append(msg)
+    if "erro" in cabecalho:
+        raise resiliencia.FalhaRequisicao(f"Mensagens da OS {id_chamado} incompletas: {cabecalho['erro']}", "paginacao")
+
+    todas_msgs.sort(key=lambda x: x.data)
+    return todas_msgs
 
-        total = int(data.get('total', 0))
-        if len(registros) < 1000 or page * 1000 >= total:
-            break
-        page += 1
+def get_os(id_chamado):
+    """OrdemServico pelo id, ou None se não existir"""
+    payload = {
+        "qtype": "id",
+        "query": str(id_chamado),
+        "oper": "=",
+        "page": "1",
+        "rp": "1"
+    }
+    data = api_request("su_oss_chamado", payload)
+    if data is None:
+        raise resiliencia.FalhaRequisicao(f"OS {id_chamado} não consultada", "resposta")
+    registros = data.get('registros') or []
+    return OrdemServico.de_registro(registros[0]) if registros else None
 
-    todas_msgs.sort(key=lambda x: x['data'])
-    return todas_msgs
+def get_mensagens_novas(ultimo_id, rp=RP_ACOMPANHAMENTO):
+    """Até rp mensagens (MensagemOS) com id > ultimo_id, em ordem de id.
+
+    O id é crescente, então a próxima consulta parte do último id lido (sem page):
+    mensagens gravadas entre as consultas não deslocam as páginas."""
+    payload = {
+        "qtype": "id",
+        "query": str(ultimo_id),
+        "oper": ">",
+        "page": "1",
+        "rp": str(rp),
+        "sortname": "id",
+        "sortorder": "asc"
+    }
+    cabecalho = {}
+    mensagens = [MensagemOS.de_registro(registro)
+                 for registro in api_request_stream("su_oss_chamado_mensagem", payload, cabecalho)]
+    if "erro" in cabecalho:
+        raise resiliencia.FalhaRequisicao(f"Mensagens após o id {ultimo_id} incompletas: {cabecalho['erro']}", "paginacao")
+    return mensagens
+
+def get_ultimo_id_mensagem():
+    payload = {
+        "qtype": "id",
+        "query": "0",
+        "oper": ">",
+        "page": "1",
+        "rp": "1",
+        "sortname": "id",
+        "sortorder": "desc"
+    }
+    data = api_request("su_oss_chamado_mensagem", payload)
+    if data is None:
+        raise resiliencia.FalhaRequisicao("Último id de mensagem não consultado", "resposta")
+    registros = data.get('registros') or []
+    return MensagemOS.de_registro(registros[0]).id if registros else 0
 
 def obter_nome_assunto(id_assunto, cache):
+    metricas.registrar_cache("assuntos", id_assunto in cache)
     if id_assunto in cache:
         return cache[id_assunto]
 
@@ -125,7 +280,11 @@ def obter_nome_assunto(id_assunto, cache):
         "page": "1",
         "rp": "1"
     }
-    data = api_request("su_oss_assunto", payload)
+    try:
+        data = api_request("su_oss_assunto", payload)
+    except resiliencia.FalhaRequisicao:
+        # Só o nome do alerta depende disso: não guarda no cache para tentar de novo
+        return f'Desconhecido ({id_assunto})'
     if data and data.get('registros'):
         nome = data['registros'][0].get('assunto', f'Desconhecido ({id_assunto})')
     else:
@@ -135,191 +294,252 @@ def obter_nome_assunto(id_assunto, cache):
     return nome
 
 def analisar_os(os_data, cache_assuntos, ultima_execucao):
-    id_os = os_data['id']
-    id_cliente = os_data['id_cliente']
-    id_assunto = int(os_data['id_assunto'])
-    assunto_nome = obter_nome_assunto(id_assunto, cache_assuntos)
-
-    tecnico_atual = None
-    if os_data.get('id_tecnico'):
-        try:
-            tecnico_atual = int(os_data['id_tecnico'])
-        except:
-            pass
-    tecnico_definido_por = None
-    status_atual = None
-    encaminhada_por_encarregado = False
-    reagendada = False  # Indica que a OS está em fluxo de pós-reagendamento
-    violacoes = []
-
-    mensagens = get_mensagens_os(id_os)
-    hoje = datetime.now().date()
-
-    for msg in mensagens:
-        try:
-            data_msg = datetime.strptime(msg['data'], "%Y-%m-%d %H:%M:%S")
-        except:
-            continue
-
-        if data_msg <= ultima_execucao:
-            continue
-
-        id_operador = int(msg.get('id_operador', 0))
-        is_terceirizada = id_operador in RESPONSAVEIS_ALVO
-        is_encarregado = id_operador in ENCARREGADOS_IDS
-        id_evento = int(msg.get('id_evento', 0))
-        status_msg = msg.get('status', '')
-        id_tecnico_msg = msg.get('id_tecnico')
-        if id_tecnico_msg:
-            try:
-                id_tecnico_msg = int(id_tecnico_msg)
-            except:
-                id_tecnico_msg = None
-
-        status_anterior = status_atual
-
-        # Se a OS está em reagendamento (status RAG ou evento 11), ativa a flag
-        if status_msg == 'RAG' or id_evento == 11:
-            reagendada = True
-
-        # Se já foi encaminhada por encarregado, qualquer ação da terceirizada é violação
-        if encaminhada_por_encarregado and is_terceirizada:
-            if id_evento in (4, 5):
-                if id_evento == 4:
-                    desc = f"Alterou técnico (encaminhamento) após encarregado"
-                else:
-                    desc = f"Agendou após encarregado"
-                violacoes.append((
-                    "apos_encarregado",
-                    desc,
-                    data_msg,
-                    msg.get('historico', '')
-                ))
-        else:
-            # Regras aplicáveis quando não há bloqueio por encarregado
-            if is_terceirizada:
-                # 1) Agendamento para o mesmo dia (sempre verificar)
-                if id_evento == 5:
-                    data_agenda_final = msg.get('data_final')
-                    if data_agenda_final and data_agenda_final != '0000-00-00 00:00:00':
-                        try:
-                            data_agenda = datetime.strptime(data_agenda_final, "%Y-%m-%d %H:%M:%S").date()
-                            data_acao = data_msg.date()
-                            if data_agenda == data_acao:
-                                violacoes.append((
-                                    "mesmo_dia",
-                                    f"Agendou para o mesmo dia",
-                                    data_msg,
-                                    msg.get('historico', '')
-                                ))
-                        except:
-                            pass
-
-                # 2) Regras que só se aplicam se NÃO estiver em modo reagendamento
-                if not reagendada:
-                    # Alteração de técnico (evento 4)
-                    if id_evento == 4 and id_tecnico_msg is not None:
-                        if (tecnico_atual is not None and
-                            tecnico_definido_por not in RESPONSAVEIS_ALVO and
-                            id_tecnico_msg != tecnico_atual):
-                            violacoes.append((
-                                "alteracao_tecnico",
-                                f"Técnico alterado de {tecnico_atual} para {id_tecnico_msg}",
-                                data_msg,
-                                msg.get('historico', '')
-                            ))
-
-                    # Troca de status EN -> AG (evento 5)
-                    if id_evento == 5 and status_anterior == 'EN':
-                        violacoes.append((
-                            "en_para_ag",
-                            "Status alterado de EN para AG",
-                            data_msg,
-                            msg.get('historico', '')
-                        ))
-
-        # ----- Atualização do estado global (independente do operador) -----
-        # Atualiza técnico
-        if id_evento == 4 and id_tecnico_msg is not None:
-            tecnico_atual = id_tecnico_msg
-            tecnico_definido_por = id_operador
-
-        # Atualiza status
-        if status_msg:
-            status_atual = status_msg
-
-        # Verifica se este evento é um encaminhamento feito por um encarregado
-        if is_encarregado and id_evento == 4:
-            encaminhada_por_encarregado = True
-
-    return violacoes, assunto_nome, id_cliente
+    with perfil.etapa("enriquecer"):
+        assunto_nome = obter_nome_assunto(os_data.id_assunto, cache_assuntos)
+        mensagens = get_mensagens_os(os_data.id)
+    perfil.contar("mensagens", len(mensagens))
+    with perfil.etapa("analisar"):
+        violacoes = analisar_mensagens(os_data, mensagens, ultima_execucao)
+    return violacoes, assunto_nome, os_data.id_cliente
+
+def analisar_mensagens(os_data, mensagens, ultima_execucao):
+    """Aplica as regras ao histórico (ordenado por data) de uma OS, sem acessar a API"""
+    return MOTOR_REGRAS.analisar(os_data, mensagens, ultima_execucao)
 
 def enviar_telegram(mensagem):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": TELEGRAM_CHAT_ID,
         "text": mensagem,
         "parse_mode": "HTML"
     }
     try:
-        requests.post(url, json=payload, timeout=10)
+        response = resiliencia.requisitar("POST", url, json=payload, timeout=10)
+        metricas.ALERTAS.inc(canal="telegram", resultado="enviado" if response.ok else "falha")
+        return response.ok
     except Exception as e:
+        metricas.ALERTAS.inc(canal="telegram", resultado="falha")
         """ print(f"[ERRO] Falha ao enviar mensagem Telegram: {e}") """
-
-def executar_monitoramento(ultima_execucao):
+        return False
+
+def alertar_violacoes(os_data, violacoes, assunto_nome, id_cliente):
+    """Envia um alerta com as violações ainda não alertadas da OS.
+    Retorna False se o envio falhou (as violações ficam para a próxima tentativa)"""
+    chaves = [(os_data.id, tipo, data_hora) for tipo, _, data_hora, _ in violacoes]
+    violacoes = [v for v, chave in zip(violacoes, chaves) if chave not in VIOLACOES_ALERTADAS]
+    if not violacoes:
+        return True
+    msg = f"🛑 TERCEIRIZADA MEXEU NA O.S\n\n"
+    msg += f"• ID Cliente: {id_cliente}\n"
+    msg += f"• ID O.S: {os_data.id}\n"
+    msg += f"• Assunto: {assunto_nome}\n"
+
+    for tipo, desc, data_hora, hist in violacoes:
+        data_str = data_hora.strftime("%d/%m/%Y - %H:%M")
+        msg += f"• Horário de Alteração: {data_str} ({MOTOR_REGRAS.rotulo(tipo)})\n"
+
+    perfil.contar("alertas")
+    with perfil.etapa("enviar"):
+        enviado = enviar_telegram(msg)
+    if enviado:
+        VIOLACOES_ALERTADAS.update(chaves)
+        salvar_violacoes_alertadas()
+        """ print(f"Alerta enviado para OS {os_data.id}") """
+    return enviado
+
+def priorizar_oss(oss_alvo, ultima_execucao):
+    """Ordena as OS: primeiro as há mais tempo sem análise (sobras de ciclos anteriores),
+    depois as atualizadas mais recentemente"""
+    oss_alvo.sort(key=lambda os: os.ultima_atualizacao or os.data_abertura or datetime.min, reverse=True)
+    oss_alvo.sort(key=lambda os: MARCAS_OS.get(os.id, ultima_execucao))
+
+@perfil.medir_ciclo("alerta_alteracao_os")
+def executar_monitoramento(ultima_execucao, inicio=None, orcamento=None):
+    """Analisa as OS alvo em ordem de prioridade até o orçamento acabar.
+
+    Retorna até onde todas as OS alvo já foram analisadas (nova última execução) ou
+    None se o ciclo falhou. OS adiadas pelo orçamento ou com falha de API/envio
+    seguram a marca e vão primeiro no próximo ciclo."""
     # print(f"[{datetime.now()}] Iniciando ciclo de monitoramento...")
     # print(f"Última execução: {ultima_execucao}")
+    inicio = inicio or datetime.now()
     try:
-        hoje = datetime.now()
-        data_inicio = hoje.strftime("%Y-%m-01")
+        data_inicio = inicio.strftime("%Y-%m-01")
 
         cache_assuntos = {}
 
-        todas_os = get_oss_por_data_abertura(data_inicio)
-        if not todas_os:
-            """ print("Nenhuma OS encontrada com abertura a partir de", data_inicio) """
-            return
-
-        oss_alvo = [
-            os for os in todas_os
-            if os.get('status') in ['AG', 'EN']
-            and int(os.get('id_assunto', 0)) in ASSUNTOS_ALVO
-        ]
+        # Filtro aplicado em fluxo: só as OS alvo ficam em memória
+        with perfil.etapa("buscar"):
+            oss_alvo = [
+                os for os in get_oss_por_data_abertura(data_inicio)
+                if os.status in ('AG', 'EN')
+                and os.id_assunto in ASSUNTOS_ALVO
+            ]
+        metricas.FILA.definir(len(oss_alvo), fila="os_alvo")
+        perfil.contar("os_alvo", len(oss_alvo))
+        if not oss_alvo:
+            """ print("Nenhuma OS alvo encontrada com abertura a partir de", data_inicio) """
+            MARCAS_OS.clear()
+            return inicio
         """ print(f"OS com status AG/EN e assuntos alvo: {len(oss_alvo)}") """
-
-        for os_data in oss_alvo:
-            violacoes, assunto_nome, id_cliente = analisar_os(os_data, cache_assuntos, ultima_execucao)
-            if violacoes:
-                msg = f"🛑 TERCEIRIZADA MEXEU NA O.S\n\n"
-                msg += f"• ID Cliente: {id_cliente}\n"
-                msg += f"• ID O.S: {os_data['id']}\n"
-                msg += f"• Assunto: {assunto_nome}\n"
-
-                for tipo, desc, data_hora, hist in violacoes:
-                    data_str = data_hora.strftime("%d/%m/%Y - %H:%M")
-                    if tipo == "mesmo_dia":
-                        msg += f"• Horário de Alteração: {data_str} (Agendou para o mesmo dia)\n"
-                    elif tipo == "alteracao_tecnico":
-                        msg += f"• Horário de Alteração: {data_str} (Alterou técnico)\n"
-                    elif tipo == "en_para_ag":
-                        msg += f"• Horário de Alteração: {data_str} (Trocou EN para AG)\n"
-                    elif tipo == "apos_encarregado":
-                        msg += f"• Horário de Alteração: {data_str} (Ação após encaminhamento do encarregado)\n"
-
-                enviar_telegram(msg)
-                """ print(f"Alerta enviado para OS {os_data['id']}") """
+        priorizar_oss(oss_alvo, ultima_execucao)
+
+        falhas = 0
+        adiadas = 0
+        for restantes, os_data in enumerate(oss_alvo, 1):
+            if orcamento is not None and orcamento.esgotado():
+                adiadas = len(oss_alvo) - restantes + 1
+                break
+            metricas.FILA.definir(len(oss_alvo) - restantes, fila="os_alvo")
+            desde = MARCAS_OS.get(os_data.id, ultima_execucao)
+            try:
+                violacoes, assunto_nome, id_cliente = analisar_os(os_data, cache_assuntos, desde)
+            except resiliencia.FalhaRequisicao as e:
+                falhas += 1
+                """ print(f"[ERRO] OS {os_data.id} não analisada: {e}") """
+                continue
+            if not alertar_violacoes(os_data, violacoes, assunto_nome, id_cliente):
+                falhas += 1
+                continue
+            MARCAS_OS[os_data.id] = inicio
+
+        # A última execução avança até onde todas as OS alvo já foram cobertas
+        nova_marca = min(MARCAS_OS.get(os_data.id, ultima_execucao) for os_data in oss_alvo)
+        ids_alvo = {os_data.id for os_data in oss_alvo}
+        for id_os, marca in list(MARCAS_OS.items()):
+            if marca <= nova_marca or id_os not in ids_alvo:
+                del MARCAS_OS[id_os]
+
+        if falhas or adiadas:
+            perfil.contar("falhas", falhas)
+            perfil.contar("adiadas", adiadas)
+            perfil.marcar_resultado("parcial")
+            """ print(f"Ciclo parcial: {falhas} OS com falha, {adiadas} adiadas pelo orçamento") """
+        return nova_marca
     except Exception as e:
+        perfil.marcar_resultado("erro")
         """ print(f"[ERRO] Falha no ciclo de monitoramento: {e}") """
+        return None
+
+def ciclo(orcamento=None):
+    ultima_exec = carregar_ultima_execucao()
+    VIOLACOES_ALERTADAS.update(carregar_violacoes_alertadas())
+    MARCAS_OS.clear()
+    MARCAS_OS.update(carregar_marcas_os())
+    # A marca é o início do ciclo: mensagens gravadas durante ele entram no próximo
+    nova_marca = executar_monitoramento(ultima_exec, datetime.now(), orcamento)
+    salvar_marcas_os()
+    if nova_marca is not None and nova_marca > ultima_exec:
+        salvar_ultima_execucao(nova_marca)
+        # Violações até a marca não voltam a ser analisadas
+        VIOLACOES_ALERTADAS.difference_update([v for v in VIOLACOES_ALERTADAS if v[2] <= nova_marca])
+        salvar_violacoes_alertadas()
+
+def analisar_os_acompanhada(id_chamado, desde):
+    """Analisa as mensagens de uma OS posteriores a desde, como o modo por intervalo faz
+    com as posteriores à última execução. Retorna False se o alerta não foi entregue"""
+    with perfil.etapa("enriquecer"):
+        os_data = get_os(id_chamado)
+    if os_data is None or os_data.status not in ('AG', 'EN') or os_data.id_assunto not in ASSUNTOS_ALVO:
+        return True
+    perfil.contar("os_alvo")
+    with perfil.etapa("enriquecer"):
+        assunto_nome = obter_nome_assunto(os_data.id_assunto, CACHE_ASSUNTOS)
+        mensagens = get_mensagens_os(os_data.id)
+    perfil.contar("mensagens", len(mensagens))
+    with perfil.etapa("analisar"):
+        violacoes = analisar_mensagens(os_data, mensagens, desde)
+    return alertar_violacoes(os_data, violacoes, assunto_nome, os_data.id_cliente)
+
+@perfil.medir_ciclo("alerta_alteracao_os_acompanhamento")
+def acompanhar(orcamento=None):
+    """Lê as mensagens com id maior que o último visto e analisa as OS que as receberam.
+
+    O último id só avança até antes da primeira mensagem de uma OS com falha (de API
+    ou de envio) ou adiada pelo orçamento; ela é relida no próximo ciclo e as
+    violações já alertadas não se repetem. Uma OS que falha
+    ACOMPANHAMENTO_MAX_TENTATIVAS vezes seguidas é pulada (com erro no log)."""
+    ultimo_id = carregar_ultimo_id()
+    if ultimo_id is None:
+        # Primeira execução: parte do fim da tabela (o histórico é do modo por intervalo)
+        salvar_ultimo_id(get_ultimo_id_mensagem())
+        return
+
+    VIOLACOES_ALERTADAS.update(carregar_violacoes_alertadas())
+    tentativas = carregar_tentativas()
+    tentativas_antes = dict(tentativas)
+    pendentes = []
+    while True:
+        with perfil.etapa("buscar"):
+            novas = get_mensagens_novas(ultimo_id)
+        if not novas:
+            break
+        perfil.contar("mensagens_novas", len(novas))
+
+        # id da OS -> [primeiro id novo, data da mensagem nova mais antiga], na ordem dos ids
+        por_os = {}
+        for msg in novas:
+            if msg.data is None:
+                continue
+            pendente = por_os.get(msg.id_chamado)
+            if pendente is None:
+                por_os[msg.id_chamado] = [msg.id, msg.data]
+            elif msg.data < pendente[1]:
+                pendente[1] = msg.data
+
+        for id_chamado, (primeiro_id, data) in por_os.items():
+            if orcamento is not None and orcamento.esgotado():
+                pendentes.append(primeiro_id)
+                continue
+            try:
+                # A janela começa na mensagem nova mais antiga da OS
+                entregue = analisar_os_acompanhada(id_chamado, data - timedelta(microseconds=1))
+            except resiliencia.FalhaRequisicao as e:
+                """ print(f"[ERRO] OS {id_chamado} não analisada: {e}") """
+                entregue = False
+            chave = str(id_chamado)
+            if entregue:
+                tentativas.pop(chave, None)
+                continue
+            tentativas[chave] = tentativas.get(chave, 0) + 1
+            if tentativas[chave] >= ACOMPANHAMENTO_MAX_TENTATIVAS:
+                logging.getLogger("alertas.acompanhamento").error(
+                    f"OS {id_chamado} falhou {tentativas[chave]} vezes seguidas; "
+                    f"mensagens a partir do id {primeiro_id} puladas")
+                perfil.contar("os_puladas")
+                del tentativas[chave]
+                continue
+            pendentes.append(primeiro_id)
+
+        if pendentes:
+            salvar_ultimo_id(min(pendentes) - 1)
+            perfil.contar("os_pendentes", len(pendentes))
+            perfil.marcar_resultado("parcial")
+            break
+        ultimo_id = novas[-1].id
+        salvar_ultimo_id(ultimo_id)
+        if len(novas) < RP_ACOMPANHAMENTO or (orcamento is not None and orcamento.esgotado()):
+            break
+
+    if tentativas != tentativas_antes:
+        salvar_tentativas(tentativas)
+
+    # Sem mensagens a reler, as violações já alertadas não voltam a aparecer
+    if not pendentes and VIOLACOES_ALERTADAS:
+        VIOLACOES_ALERTADAS.clear()
+        salvar_violacoes_alertadas()
 
 def main():
     """ print(f"Monitoramento iniciado. Intervalo: {INTERVALO_MINUTOS} minutos.") """
-    while True:
-        ultima_exec = carregar_ultima_execucao()
-        executar_monitoramento(ultima_exec)
-        agora = datetime.now()
-        salvar_ultima_execucao(agora)
-        """ print(f"Aguardando {INTERVALO_MINUTOS} minutos até a próxima execução...") """
-        time.sleep(INTERVALO_MINUTOS * 60)
+    if ACOMPANHAMENTO_SEGUNDOS:
+        # Modo de acompanhamento: alertas em segundos, uma consulta curta por ciclo
+        with agendador.instancia_unica("alerta_alteracao_os"):
+            agendador.executar_em_ritmo(acompanhar, ACOMPANHAMENTO_SEGUNDOS,
+                                        nome="alerta_alteracao_os_acompanhamento")
+        return
+    # Ritmo fixo de INTERVALO_MINUTOS; cada ciclo tem 80% do intervalo (CICLO_ORCAMENTO_S)
+    with agendador.instancia_unica("alerta_alteracao_os"):
+        agendador.executar_em_ritmo(ciclo, INTERVALO_MINUTOS * 60, nome="alerta_alteracao_os")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
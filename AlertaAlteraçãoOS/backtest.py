@@ -0,0 +1,244 @@
+"""Backtest das regras do AlertaAlteraçãoOS sobre um dump local do IXC.
+
+Baixa um mês de ``su_oss_chamado`` e ``su_oss_chamado_mensagem`` (uma consulta
+paginada por tabela, do dia 1º até o início do mês seguinte, gravada em JSONL) e depois roda ``analisar_mensagens`` sobre o
+dump, sem rede, simulando os ciclos de ``INTERVALO_MINUTOS``:
+
+    python backtest.py baixar --mes 2024-05 --pasta dump_2024_05
+    python backtest.py rodar dump_2024_05 --saida atual.json
+    python backtest.py rodar dump_2024_05 --comparar atual.json   # após mudar as regras
+
+Cada ciclo ao vivo só analisa (e só acumula estado com) as mensagens posteriores à
+execução anterior; por isso o histórico de cada OS é dividido em janelas de
+``--ciclo-minutos`` e cada janela é analisada à parte (``--ciclo-minutos 0`` analisa o
+histórico inteiro de uma vez). O status da OS no dump é o final, então o filtro AG/EN
+do ciclo ao vivo só é aplicado com ``--status``.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# app.py coloca a raiz do projeto (comum/) no path
+import app
+from comum import filtros_ixc
+from comum.paginacao import paginar
+from comum.registros import MensagemOS, OrdemServico
+
+TABELA_OS = "su_oss_chamado"
+TABELA_MENSAGENS = "su_oss_chamado_mensagem"
+RP = 5000
+
+
+# ==================== DUMP ====================
+def baixar_tabela(tabela: str, qtype: str, desde: str, ate: str, caminho: str) -> int:
+    """Grava em JSONL os registros da tabela com desde <= qtype < ate; retorna a quantidade"""
+    # O limite superior vai em grid_param e é conferido de novo em cada registro recebido
+    limite = filtros_ixc.condicao(f"{tabela}.{qtype}", "<", ate)
+
+    def buscar_pagina(page, cabecalho):
+        payload = {"qtype": qtype, "query": desde, "oper": ">=", "page": str(page), "rp": str(RP),
+                   "grid_param": filtros_ixc.grid_param([limite])}
+        return app.api_request_stream(tabela, payload, cabecalho)
+
+    cabecalho = {}
+    total = 0
+    with open(caminho + ".parcial", "w", encoding="utf-8") as f:
+        for registro in paginar(buscar_pagina, RP, cabecalho_total=cabecalho, nome=tabela):
+            if not filtros_ixc.atende(registro, [limite]):
+                continue
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            total += 1
+    if "erro" in cabecalho:
+        raise RuntimeError(f"{tabela}: {cabecalho['erro']} (após {total} registros)")
+    os.replace(caminho + ".parcial", caminho)
+    return total
+
+
+def baixar(mes: str, pasta: str):
+    primeiro_dia = datetime.strptime(mes, "%Y-%m")
+    seguinte = (primeiro_dia + timedelta(days=32)).replace(day=1)
+    inicio = primeiro_dia.strftime("%Y-%m-%d %H:%M:%S")
+    fim = seguinte.strftime("%Y-%m-%d %H:%M:%S")
+    os.makedirs(pasta, exist_ok=True)
+    for tabela, qtype in ((TABELA_OS, "data_abertura"), (TABELA_MENSAGENS, "data")):
+        t0 = time.perf_counter()
+        total = baixar_tabela(tabela, qtype, inicio, fim, os.path.join(pasta, tabela + ".jsonl"))
+        print(f"{tabela}: {total} registros em {time.perf_counter() - t0:.1f}s")
+
+
+def ler_registros(pasta: str, tabela: str) -> Iterator[Dict]:
+    """Registros de <tabela>.jsonl ou, na falta dele, de <tabela>.json (resposta do IXC)"""
+    caminho = os.path.join(pasta, tabela + ".jsonl")
+    if os.path.exists(caminho):
+        with open(caminho, "r", encoding="utf-8") as f:
+            for linha in f:
+                if linha.strip():
+                    yield json.loads(linha)
+        return
+    with open(os.path.join(pasta, tabela + ".json"), "r", encoding="utf-8") as f:
+        dados = json.load(f)
+    yield from (dados.get("registros", []) if isinstance(dados, dict) else dados)
+
+
+def carregar_dump(pasta: str, todas: bool, status: Optional[set]) -> Tuple[List[OrdemServico], Dict[str, List[MensagemOS]], int]:
+    """OS alvo do dump e o histórico de cada uma, ordenado por data"""
+    oss = []
+    for registro in ler_registros(pasta, TABELA_OS):
+        os_data = OrdemServico.de_registro(registro)
+        if not todas and os_data.id_assunto not in app.ASSUNTOS_ALVO:
+            continue
+        if status and os_data.status not in status:
+            continue
+        oss.append(os_data)
+
+    ids = {os_data.id for os_data in oss}
+    mensagens = defaultdict(list)
+    total = 0
+    for registro in ler_registros(pasta, TABELA_MENSAGENS):
+        # Só converte as mensagens das OS selecionadas
+        if str(registro.get("id_chamado", "")) not in ids:
+            continue
+        msg = MensagemOS.de_registro(registro)
+        if msg.data is not None:
+            mensagens[msg.id_chamado].append(msg)
+            total += 1
+    for historico in mensagens.values():
+        historico.sort(key=lambda x: x.data)
+    return oss, mensagens, total
+
+
+# ==================== EXECUÇÃO ====================
+def janelas(historico: List[MensagemOS], minutos: int) -> Iterator[List[MensagemOS]]:
+    """Divide o histórico ordenado nas mensagens vistas por cada ciclo de `minutos`"""
+    if minutos <= 0:
+        yield historico
+        return
+    passo = timedelta(minutes=minutos)
+    atual = []
+    fim = None
+    for msg in historico:
+        if fim is None or msg.data > fim:
+            if atual:
+                yield atual
+            # Fim da janela: próximo múltiplo de `minutos` desde a meia-noite
+            meia_noite = msg.data.replace(hour=0, minute=0, second=0, microsecond=0)
+            fim = meia_noite + passo * ((msg.data - meia_noite) // passo + 1)
+            atual = []
+        atual.append(msg)
+    if atual:
+        yield atual
+
+
+def rodar(oss: List[OrdemServico], mensagens: Dict[str, List[MensagemOS]], minutos: int,
+          desde: datetime) -> List[Tuple]:
+    """(id da OS, tipo, data, descrição) de cada violação, na ordem das OS"""
+    violacoes = []
+    for os_data in oss:
+        for janela in janelas(mensagens.get(os_data.id, []), minutos):
+            for tipo, desc, data_hora, _ in app.analisar_mensagens(os_data, janela, desde):
+                violacoes.append((os_data.id, tipo, data_hora.isoformat(sep=" "), desc))
+    return violacoes
+
+
+def commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def comparar(violacoes: List[Tuple], anterior: dict, exemplos: int) -> int:
+    """Mostra as violações novas e as que deixaram de ocorrer; retorna o nº de diferenças"""
+    atuais = set(violacoes)
+    antes = {tuple(v) for v in anterior.get("violacoes", [])}
+    novas = sorted(atuais - antes)
+    removidas = sorted(antes - atuais)
+    print(f"\nComparação com {anterior.get('commit') or '?'} ({anterior.get('data', '?')}): "
+          f"{len(novas)} novas, {len(removidas)} removidas, {len(atuais & antes)} iguais")
+    por_tipo = Counter(v[1] for v in atuais)
+    por_tipo_antes = Counter(v[1] for v in antes)
+    for tipo in sorted(set(por_tipo) | set(por_tipo_antes)):
+        print(f"  {tipo:<20} {por_tipo_antes[tipo]:>8} -> {por_tipo[tipo]:<8} ({por_tipo[tipo] - por_tipo_antes[tipo]:+d})")
+    for titulo, lista in (("Novas", novas), ("Removidas", removidas)):
+        if lista and exemplos:
+            print(f"  {titulo} (até {exemplos}):")
+            for id_os, tipo, data_hora, desc in lista[:exemplos]:
+                print(f"    OS {id_os}  {data_hora}  {tipo}: {desc}")
+    return len(novas) + len(removidas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest das regras do AlertaAlteraçãoOS")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_baixar = sub.add_parser("baixar", help="grava um mês de OS e mensagens do IXC em JSONL")
+    p_baixar.add_argument("--mes", required=True, help="AAAA-MM")
+    p_baixar.add_argument("--pasta", required=True)
+
+    p_rodar = sub.add_parser("rodar", help="aplica as regras ao dump")
+    p_rodar.add_argument("pasta")
+    p_rodar.add_argument("--ciclo-minutos", type=int, default=app.INTERVALO_MINUTOS,
+                         help="janela de cada ciclo simulado; 0 = histórico inteiro (padrão: %(default)s)")
+    p_rodar.add_argument("--desde", help="ignora mensagens até esta data (AAAA-MM-DD[ HH:MM:SS])")
+    p_rodar.add_argument("--todas", action="store_true", help="todas as OS, não só os assuntos alvo")
+    p_rodar.add_argument("--status", default="", help="só OS com estes status finais, ex.: AG,EN")
+    p_rodar.add_argument("--saida", help="salva o resultado em JSON")
+    p_rodar.add_argument("--comparar", help="JSON de uma execução anterior")
+    p_rodar.add_argument("--exemplos", type=int, default=10, help="diferenças listadas por grupo")
+    p_rodar.add_argument("--estrito", action="store_true", help="sai com código 1 se houver diferenças")
+    args = parser.parse_args()
+
+    if args.comando == "baixar":
+        baixar(args.mes, args.pasta)
+        return
+
+    status = {s.strip() for s in args.status.split(",") if s.strip()}
+    desde = datetime.fromisoformat(args.desde) if args.desde else datetime(2000, 1, 1)
+
+    t0 = time.perf_counter()
+    oss, mensagens, total_mensagens = carregar_dump(args.pasta, args.todas, status)
+    carga = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    violacoes = rodar(oss, mensagens, args.ciclo_minutos, desde)
+    analise = time.perf_counter() - t0
+    por_segundo = total_mensagens / analise if analise > 0 else 0.0
+
+    print(f"OS analisadas: {len(oss)}  mensagens: {total_mensagens}  carga: {carga:.2f}s")
+    print(f"Análise: {analise:.3f}s ({por_segundo:,.0f} mensagens/s)")
+    print(f"Violações: {len(violacoes)}")
+    for tipo, qtd in sorted(Counter(v[1] for v in violacoes).items()):
+        print(f"  {tipo:<20} {qtd:>8}")
+
+    if args.saida:
+        saida = {
+            "commit": commit_atual(),
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "dump": os.path.abspath(args.pasta),
+            "ciclo_minutos": args.ciclo_minutos,
+            "oss": len(oss),
+            "mensagens": total_mensagens,
+            "analise_s": round(analise, 4),
+            "mensagens_por_s": round(por_segundo, 1),
+            "violacoes": violacoes,
+        }
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(saida, f, ensure_ascii=False)
+        print(f"\nResultado salvo em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        if comparar(violacoes, anterior, args.exemplos) and args.estrito:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
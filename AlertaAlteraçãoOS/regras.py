@@ -0,0 +1,201 @@
+"""Regras de violação da terceirizada sobre o histórico de uma OS.
+
+Cada regra declara:
+
+- ``eventos``: ids de evento em que é avaliada (vazio = qualquer evento);
+- ``operador``: papel exigido de quem gerou o evento ("terceirizada", "encarregado");
+- ``estado``: valores exigidos das flags do estado corrente da OS (``EstadoOS``);
+- ``condicoes``: funções ``(msg, estado) -> bool`` sobre os campos do evento.
+
+O ``Motor`` guarda os papéis de cada operador e as regras candidatas de cada par
+(evento, papéis), então o histórico é percorrido uma única vez e cada mensagem só
+testa o estado e as condições das regras que lhe cabem, na ordem declarada.
+
+As regras veem o estado *antes* do evento corrente (exceto ``reagendada``, que já
+considera o próprio evento, como no fluxo original).
+
+Para conferir uma regra isolada::
+
+    regra.aplica(msg, EstadoOS(tecnico_atual=5), {"terceirizada"})
+    Motor([regra], terceirizada=[283]).analisar(os_data, mensagens, desde)
+
+O histórico até ``desde`` é ignorado: o estado parte só da OS e das mensagens
+posteriores, nos dois modos do app.py.
+
+Os cenários de exemplo ficam em ``test_regras.py`` (``python -m pytest``).
+"""
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+EVENTO_ENCAMINHAMENTO = 4
+EVENTO_AGENDAMENTO = 5
+EVENTO_REAGENDAMENTO = 11
+
+Condicao = Callable[["MensagemOS", "EstadoOS"], bool]
+
+
+class EstadoOS:
+    """Estado corrente da OS enquanto o histórico é percorrido"""
+    __slots__ = ("tecnico_atual", "tecnico_definido_pela_terceirizada", "status_atual",
+                 "encaminhada_por_encarregado", "reagendada")
+
+    def __init__(self, tecnico_atual=None, tecnico_definido_pela_terceirizada=False,
+                 status_atual=None, encaminhada_por_encarregado=False, reagendada=False):
+        self.tecnico_atual = tecnico_atual
+        self.tecnico_definido_pela_terceirizada = tecnico_definido_pela_terceirizada
+        self.status_atual = status_atual
+        self.encaminhada_por_encarregado = encaminhada_por_encarregado
+        # OS em fluxo de pós-reagendamento (status RAG ou evento 11)
+        self.reagendada = reagendada
+
+    def antes(self, msg):
+        """Atualizações que já valem para as regras do próprio evento"""
+        if msg.status == 'RAG' or msg.id_evento == EVENTO_REAGENDAMENTO:
+            self.reagendada = True
+
+    def depois(self, msg, papeis: FrozenSet[str]):
+        """Atualizações que só valem a partir do evento seguinte"""
+        if msg.id_evento == EVENTO_ENCAMINHAMENTO and msg.id_tecnico is not None:
+            self.tecnico_atual = msg.id_tecnico
+            self.tecnico_definido_pela_terceirizada = "terceirizada" in papeis
+        if msg.status:
+            self.status_atual = msg.status
+        if msg.id_evento == EVENTO_ENCAMINHAMENTO and "encarregado" in papeis:
+            self.encaminhada_por_encarregado = True
+
+
+class Regra:
+    """Violação declarada por evento, papel do operador, estado e condições"""
+    __slots__ = ("tipo", "rotulo", "descricao", "eventos", "operador", "estado", "condicoes",
+                 "_formatar")
+
+    def __init__(self, tipo: str, rotulo: str, descricao: str, eventos: Iterable[int] = (),
+                 operador: Optional[str] = None, estado: Optional[Dict[str, object]] = None,
+                 condicoes: Sequence[Condicao] = ()):
+        self.tipo = tipo
+        self.rotulo = rotulo            # texto no alerta do Telegram
+        self.descricao = descricao      # str.format com msg= e estado=
+        self.eventos = frozenset(eventos)
+        self.operador = operador
+        self.estado = tuple((estado or {}).items())
+        self.condicoes = tuple(condicoes)
+        self._formatar = "{" in descricao
+
+    def aplica(self, msg, estado: EstadoOS, papeis: Iterable[str] = ()) -> bool:
+        if self.eventos and msg.id_evento not in self.eventos:
+            return False
+        if self.operador is not None and self.operador not in papeis:
+            return False
+        return self.confere(msg, estado)
+
+    def confere(self, msg, estado: EstadoOS) -> bool:
+        """Só estado e condições; evento e operador já filtrados pelo Motor"""
+        for campo, valor in self.estado:
+            if getattr(estado, campo) != valor:
+                return False
+        for condicao in self.condicoes:
+            if not condicao(msg, estado):
+                return False
+        return True
+
+    def descrever(self, msg, estado: EstadoOS) -> str:
+        if not self._formatar:
+            return self.descricao
+        return self.descricao.format(msg=msg, estado=estado)
+
+    def __repr__(self):
+        return f"Regra({self.tipo!r})"
+
+
+# ==================== REGRAS ====================
+LIVRE = {"encaminhada_por_encarregado": False}
+LIVRE_SEM_REAGENDAMENTO = {"encaminhada_por_encarregado": False, "reagendada": False}
+
+REGRAS = [
+    # Com a OS encaminhada por um encarregado, encaminhar ou agendar é sempre violação
+    Regra("apos_encarregado", "Ação após encaminhamento do encarregado",
+          "Alterou técnico (encaminhamento) após encarregado",
+          eventos=[EVENTO_ENCAMINHAMENTO], operador="terceirizada",
+          estado={"encaminhada_por_encarregado": True}),
+    Regra("apos_encarregado", "Ação após encaminhamento do encarregado",
+          "Agendou após encarregado",
+          eventos=[EVENTO_AGENDAMENTO], operador="terceirizada",
+          estado={"encaminhada_por_encarregado": True}),
+    # Agendamento para o mesmo dia (vale também em reagendamento)
+    Regra("mesmo_dia", "Agendou para o mesmo dia", "Agendou para o mesmo dia",
+          eventos=[EVENTO_AGENDAMENTO], operador="terceirizada", estado=LIVRE,
+          condicoes=[lambda msg, estado: msg.data_final is not None
+                     and msg.data_final.date() == msg.data.date()]),
+    # Troca de um técnico que não foi definido pela própria terceirizada
+    Regra("alteracao_tecnico", "Alterou técnico",
+          "Técnico alterado de {estado.tecnico_atual} para {msg.id_tecnico}",
+          eventos=[EVENTO_ENCAMINHAMENTO], operador="terceirizada",
+          estado=dict(LIVRE_SEM_REAGENDAMENTO, tecnico_definido_pela_terceirizada=False),
+          condicoes=[lambda msg, estado: msg.id_tecnico is not None
+                     and estado.tecnico_atual is not None
+                     and msg.id_tecnico != estado.tecnico_atual]),
+    Regra("en_para_ag", "Trocou EN para AG", "Status alterado de EN para AG",
+          eventos=[EVENTO_AGENDAMENTO], operador="terceirizada", estado=LIVRE_SEM_REAGENDAMENTO,
+          condicoes=[lambda msg, estado: estado.status_atual == 'EN']),
+]
+
+
+class Motor:
+    """Aplica um conjunto de regras ao histórico de uma OS em uma única passada"""
+
+    def __init__(self, regras: Sequence[Regra], **papeis: Iterable[int]):
+        self.regras = list(regras)
+        self._conjuntos = {nome: frozenset(ids) for nome, ids in papeis.items()}
+        self._papeis_por_operador: Dict[Optional[int], FrozenSet[str]] = {}
+        # (evento, papéis do operador) -> regras candidatas, na ordem declarada
+        self._candidatas: Dict[Tuple[Optional[int], FrozenSet[str]], Tuple[Regra, ...]] = {}
+        self._rotulos = {}
+        for regra in self.regras:
+            self._rotulos.setdefault(regra.tipo, regra.rotulo)
+
+    def papeis(self, id_operador) -> FrozenSet[str]:
+        papeis = self._papeis_por_operador.get(id_operador)
+        if papeis is None:
+            papeis = frozenset(nome for nome, ids in self._conjuntos.items() if id_operador in ids)
+            self._papeis_por_operador[id_operador] = papeis
+        return papeis
+
+    def candidatas(self, id_evento, papeis: FrozenSet[str]) -> Tuple[Regra, ...]:
+        chave = (id_evento, papeis)
+        regras = self._candidatas.get(chave)
+        if regras is None:
+            regras = tuple(
+                regra for regra in self.regras
+                if (not regra.eventos or id_evento in regra.eventos)
+                and (regra.operador is None or regra.operador in papeis)
+            )
+            self._candidatas[chave] = regras
+        return regras
+
+    def rotulo(self, tipo: str) -> str:
+        return self._rotulos.get(tipo, tipo)
+
+    def analisar(self, os_data, mensagens, ultima_execucao: datetime) -> List[Tuple]:
+        """(tipo, descrição, data, histórico) de cada violação após ultima_execucao"""
+        estado = EstadoOS(tecnico_atual=os_data.id_tecnico)
+        papeis_por_operador = self._papeis_por_operador
+        candidatas = self._candidatas
+        violacoes = []
+
+        for msg in mensagens:
+            if msg.data <= ultima_execucao:
+                continue
+            papeis = papeis_por_operador.get(msg.id_operador)
+            if papeis is None:
+                papeis = self.papeis(msg.id_operador)
+            regras = candidatas.get((msg.id_evento, papeis))
+            if regras is None:
+                regras = self.candidatas(msg.id_evento, papeis)
+            estado.antes(msg)
+            for regra in regras:
+                if regra.confere(msg, estado):
+                    violacoes.append((regra.tipo, regra.descrever(msg, estado), msg.data, msg.historico))
+            estado.depois(msg, papeis)
+
+        return violacoes
+
@@ -0,0 +1,67 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from regras import REGRAS, EstadoOS, Motor
+
+TERCEIRIZADA = 283
+ENCARREGADO = 152
+
+
+def _msg(data, operador, evento, status="", tecnico=None, data_final=None):
+    return SimpleNamespace(data=datetime.fromisoformat(data), id_operador=operador, id_evento=evento,
+                           status=status, id_tecnico=tecnico, data_final=data_final and
+                           datetime.fromisoformat(data_final), historico="")
+
+
+# (descrição, técnico inicial da OS, mensagens, tipos esperados)
+CASOS = [
+    ("agendamento para o mesmo dia", None,
+     [_msg("2024-05-02 09:00", 283, 5, "AG", data_final="2024-05-02 14:00")], ["mesmo_dia"]),
+    ("agendamento para outro dia", None,
+     [_msg("2024-05-02 09:00", 283, 5, "AG", data_final="2024-05-03 14:00")], []),
+    ("troca de técnico definido pelo provedor", 7,
+     [_msg("2024-05-02 09:00", 283, 4, tecnico=8)], ["alteracao_tecnico"]),
+    ("troca de técnico definido pela terceirizada", 7,
+     [_msg("2024-05-02 08:00", 283, 4, tecnico=8), _msg("2024-05-02 09:00", 283, 4, tecnico=9)],
+     ["alteracao_tecnico"]),
+    ("EN para AG", None,
+     [_msg("2024-05-02 08:00", 10, 1, "EN"), _msg("2024-05-02 09:00", 283, 5, "AG")], ["en_para_ag"]),
+    ("EN para AG em reagendamento", None,
+     [_msg("2024-05-02 08:00", 10, 1, "EN"), _msg("2024-05-02 09:00", 283, 5, "RAG")], []),
+    ("ações após encaminhamento do encarregado", 7,
+     [_msg("2024-05-02 08:00", 152, 4, tecnico=8), _msg("2024-05-02 09:00", 283, 4, tecnico=9),
+      _msg("2024-05-02 10:00", 283, 5, "AG", data_final="2024-05-02 15:00")],
+     ["apos_encarregado", "apos_encarregado"]),
+]
+
+
+@pytest.fixture(scope="module")
+def motor():
+    return Motor(REGRAS, terceirizada=[TERCEIRIZADA], encarregado=[ENCARREGADO])
+
+
+@pytest.mark.parametrize("descricao, tecnico, mensagens, esperado", CASOS, ids=[c[0] for c in CASOS])
+def test_cenarios(motor, descricao, tecnico, mensagens, esperado):
+    violacoes = motor.analisar(SimpleNamespace(id_tecnico=tecnico), mensagens, datetime(2000, 1, 1))
+    assert [tipo for tipo, *_ in violacoes] == esperado
+
+
+def test_historico_ate_a_ultima_execucao_e_ignorado(motor):
+    mensagens = [_msg("2024-05-02 08:00", 283, 4, tecnico=8), _msg("2024-05-02 09:00", 283, 4, tecnico=9)]
+    violacoes = motor.analisar(SimpleNamespace(id_tecnico=7), mensagens, datetime(2024, 5, 2, 8, 30))
+    # A troca das 08:00 não entra nem no estado: a das 09:00 parte do técnico da OS
+    assert [(tipo, data) for tipo, _, data, _ in violacoes] == [("alteracao_tecnico", datetime(2024, 5, 2, 9))]
+
+
+def test_rotulos(motor):
+    assert all(motor.rotulo(regra.tipo) == regra.rotulo for regra in REGRAS)
+    assert motor.rotulo("desconhecido") == "desconhecido"
+
+
+def test_regra_isolada():
+    regra = next(r for r in REGRAS if r.tipo == "mesmo_dia")
+    msg = _msg("2024-05-02 09:00", 283, 5, "AG", data_final="2024-05-02 14:00")
+    assert regra.aplica(msg, EstadoOS(), {"terceirizada"})
+    assert not regra.aplica(msg, EstadoOS(), {"encarregado"})
@@ -0,0 +1,264 @@
+"""Benchmarks das etapas de CPU dos monitores, com dados sintéticos.
+
+Etapas medidas (nenhuma acessa a rede):
+
+- ``registros_os``: conversão dos dicts do IXC em ``OrdemServico``;
+- ``filtro_abertos``: ``filtrar_chamados`` do AgendamentosAbertos;
+- ``analisar_mensagens``: regras do AlertaAlteraçãoOS sobre históricos longos;
+- ``telefones_atendimento``: extração e comparação do telefone nas mensagens dos
+  atendimentos automáticos (MonitoramentoRegistroAtendimento);
+- ``extrair_ramal``: ramal a partir do destino das ligações do Escallo.
+
+Cada etapa roda em várias escalas (itens processados); o tempo é o melhor de
+``--repeticoes`` rodadas (ao estilo do ``timeit``) e as alocações vêm do ``tracemalloc`` numa execução à
+parte. O resultado pode ser salvo em JSON e comparado com o de outro commit:
+
+    python benchmark.py --saida base.json
+    python benchmark.py --comparar base.json --tolerancia 10
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+from comum.registros import MensagemOS, OrdemServico, Ticket
+
+ESCALAS_PADRAO = [1000, 10000, 100000]
+HISTORICO_POR_OS = 200
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+
+def carregar_modulo(nome: str, caminho: str):
+    """Importa um script do projeto pelo caminho (as pastas não são pacotes)"""
+    spec = importlib.util.spec_from_file_location(nome, os.path.join(RAIZ, caminho))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+# Os scripts leem o .env e configuram logging ao serem importados; sem gravação de tráfego
+os.environ.pop("ALERTAS_GRAVACAO", None)
+abertos = carregar_modulo("abertos", "AgendamentosAbertos/abertos.py")
+app = carregar_modulo("app", "AlertaAlteraçãoOS/app.py")
+ligacoes = carregar_modulo("monitoramento_ligacoes", "MonitoramentoRegistroAtendimento/monitoramento_ligacoes.py")
+
+
+# ==================== GERADORES ====================
+def gerar_registros_os(rng: random.Random, qtd: int, agora: datetime, assuntos: List[int]) -> List[dict]:
+    registros = []
+    for i in range(1, qtd + 1):
+        abertura = agora - timedelta(minutes=rng.randint(0, 3 * 24 * 60))
+        registros.append({
+            "id": str(i),
+            "id_cliente": str(rng.randint(1, 50000)),
+            "id_assunto": str(rng.choice(assuntos) if rng.random() < 0.4 else rng.randint(1, 700)),
+            "id_tecnico": str(rng.choice([0, 283, 345, 359])),
+            "id_ticket": str(rng.randint(1, 10 ** 6)),
+            "status": rng.choice(["A", "AG", "EN", "F"]),
+            "data_abertura": abertura.strftime(FORMATO_DATA),
+        })
+    return registros
+
+
+def gerar_estado_abertos(rng: random.Random, chamados: List[OrdemServico], agora: datetime) -> Dict[str, dict]:
+    """Um terço das OS já alertadas, metade delas há menos de 30 minutos"""
+    estado = {}
+    for chamado in chamados:
+        if rng.random() < 0.33:
+            estado[chamado.id] = {"last_alert": (agora - timedelta(minutes=rng.randint(0, 60))).isoformat()}
+    return estado
+
+
+def gerar_historico(rng: random.Random, id_os: str, qtd: int, inicio: datetime,
+                    operadores: List[int]) -> List[MensagemOS]:
+    mensagens = []
+    data = inicio
+    for j in range(qtd):
+        data += timedelta(minutes=rng.randint(1, 90))
+        evento = rng.choice([4, 4, 5, 5, 11, 2])
+        status = {4: "EN", 5: "AG", 11: "RAG"}.get(evento, "")
+        mensagens.append(MensagemOS.de_registro({
+            "id": str(j), "id_chamado": id_os, "data": data.strftime(FORMATO_DATA),
+            "id_operador": str(rng.choice(operadores)), "id_evento": str(evento), "status": status,
+            "id_tecnico": str(rng.choice([283, 345, 359, 307])) if evento == 4 else "",
+            "data_final": (data + timedelta(days=rng.choice([0, 1]))).strftime(FORMATO_DATA) if evento == 5 else "",
+            "historico": f"Evento {evento}",
+        }))
+    return mensagens
+
+
+def gerar_atendimentos(rng: random.Random, qtd: int) -> Tuple[List[Ticket], List[str]]:
+    modelos = [
+        "Atendimento automático URA. Telefone de contato: {t}",
+        "Cliente retornou. telefone: {t}. Aguardando.",
+        "Contato realizado através do telefone: {t}",
+        "Cliente sem telefone informado na abertura do atendimento pela URA.",
+    ]
+    telefones = [f"11{rng.randint(900000000, 999999999)}" for _ in range(max(qtd // 10, 1))]
+    tickets = [Ticket.de_registro({
+        "id": str(i), "id_cliente": str(i), "id_assunto": "324",
+        "menssagem": rng.choice(modelos).format(t=("0" if rng.random() < 0.2 else "") + rng.choice(telefones)),
+    }) for i in range(qtd)]
+    return tickets, telefones
+
+
+def gerar_destinos(rng: random.Random, qtd: int, ramais: List[str]) -> List[str]:
+    modelos = ["Atendente ({r})", "ramal@{r}", "{r} Suporte", "Suporte N1 - fila ({r})", "URA - Desligou", "Fila Comercial"]
+    return [rng.choice(modelos).format(r=rng.choice(ramais)) for _ in range(qtd)]
+
+
+# ==================== MEDIÇÃO ====================
+def medir(funcao: Callable[[], object], repeticoes: int) -> Tuple[float, int, int]:
+    """(melhor tempo por execução em s, pico de memória em bytes, blocos alocados)
+
+    Como no ``timeit``, cada repetição executa a função tantas vezes quanto
+    necessário para durar ao menos 0,2 s, o que estabiliza as escalas pequenas.
+    """
+    gc.collect()
+    timer = timeit.Timer(funcao)
+    execucoes, _ = timer.autorange()
+    melhor = min(timer.repeat(repeat=repeticoes, number=execucoes)) / execucoes
+
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    blocos = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    del resultado
+    return melhor, pico, blocos
+
+
+def montar_etapas(escala: int, semente: int) -> Dict[str, Tuple[int, Callable[[], object]]]:
+    """Etapa -> (itens processados, função sem argumentos a ser medida)"""
+    rng = random.Random(semente + escala)
+    agora = datetime(2025, 1, 15, 12, 0, 0)
+    etapas = {}
+
+    registros = gerar_registros_os(rng, escala, agora, abertos.ASSUNTOS_ALVO)
+    etapas["registros_os"] = (escala, lambda: [OrdemServico.de_registro(r) for r in registros])
+
+    chamados = [OrdemServico.de_registro(r) for r in registros]
+    estado = gerar_estado_abertos(rng, chamados, agora)
+    etapas["filtro_abertos"] = (escala, lambda: abertos.filtrar_chamados(chamados, estado, agora))
+
+    qtd_os = max(escala // HISTORICO_POR_OS, 1)
+    operadores = app.RESPONSAVEIS_ALVO * 3 + app.ENCARREGADOS_IDS + [345, 359, 307, 1]
+    historicos = []
+    for i in range(qtd_os):
+        os_data = OrdemServico.de_registro({"id": str(i), "id_tecnico": "345", "status": "AG"})
+        historicos.append((os_data, gerar_historico(rng, str(i), HISTORICO_POR_OS, agora - timedelta(days=30), operadores)))
+    marco = agora - timedelta(days=60)
+    etapas["analisar_mensagens"] = (qtd_os * HISTORICO_POR_OS, lambda: [
+        app.analisar_mensagens(os_data, mensagens, marco) for os_data, mensagens in historicos
+    ])
+
+    tickets, telefones = gerar_atendimentos(rng, escala)
+    procurados = [rng.choice(telefones) for _ in range(10)]
+    etapas["telefones_atendimento"] = (escala * len(procurados), lambda: [
+        ticket.id_cliente
+        for telefone in procurados
+        for ticket in tickets
+        if telefone in ligacoes.telefones_da_mensagem(ticket.mensagem)
+    ])
+
+    destinos = gerar_destinos(rng, escala, ligacoes.ATENDENTES_FILTRO)
+    etapas["extrair_ramal"] = (escala, lambda: [ligacoes.extrair_ramal(d) for d in destinos])
+    return etapas
+
+
+def commit_atual() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def comparar(resultados: List[dict], anterior: dict, tolerancia: float) -> int:
+    """Mostra a variação de throughput contra outra execução; retorna o nº de regressões"""
+    base = {(r["etapa"], r["escala"]): r for r in anterior.get("resultados", [])}
+    regressoes = 0
+    print(f"\nComparação com {anterior.get('commit') or '?'} ({anterior.get('data', '?')}):")
+    for r in resultados:
+        ref = base.get((r["etapa"], r["escala"]))
+        if not ref:
+            continue
+        variacao = (r["itens_por_s"] / ref["itens_por_s"] - 1) * 100
+        marca = ""
+        if variacao < -tolerancia:
+            marca = "  <-- REGRESSÃO"
+            regressoes += 1
+        print(f"  {r['etapa']:<24} {r['escala']:>8}  {variacao:+7.1f}% itens/s{marca}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks das etapas de CPU dos monitores")
+    parser.add_argument("--escalas", default=",".join(map(str, ESCALAS_PADRAO)),
+                        help="escalas separadas por vírgula (padrão: %(default)s)")
+    parser.add_argument("--etapas", default="", help="apenas estas etapas, separadas por vírgula")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="salva o resultado em JSON")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=10.0,
+                        help="queda de throughput (%%) considerada regressão")
+    args = parser.parse_args()
+
+    escalas = [int(e) for e in args.escalas.split(",") if e.strip()]
+    filtro = {e.strip() for e in args.etapas.split(",") if e.strip()}
+
+    resultados = []
+    print(f"{'etapa':<24} {'escala':>8} {'itens':>9} {'tempo (ms)':>11} {'itens/s':>12} {'pico (KiB)':>11} {'B/item':>8}")
+    for escala in escalas:
+        for etapa, (itens, funcao) in montar_etapas(escala, args.semente).items():
+            if filtro and etapa not in filtro:
+                continue
+            tempo, pico, blocos = medir(funcao, args.repeticoes)
+            resultado = {
+                "etapa": etapa,
+                "escala": escala,
+                "itens": itens,
+                "tempo_s": round(tempo, 6),
+                "itens_por_s": round(itens / tempo, 1) if tempo > 0 else 0.0,
+                "pico_bytes": pico,
+                "blocos": blocos,
+            }
+            resultados.append(resultado)
+            print(f"{etapa:<24} {escala:>8} {itens:>9} {tempo * 1000:>11.2f} {resultado['itens_por_s']:>12,.0f} "
+                  f"{pico / 1024:>11.1f} {pico / max(itens, 1):>8.1f}")
+
+    saida = {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "semente": args.semente,
+        "repeticoes": args.repeticoes,
+        "resultados": resultados,
+    }
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(saida, f, indent=2, ensure_ascii=False)
+        print(f"\nResultado salvo em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        if comparar(resultados, anterior, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
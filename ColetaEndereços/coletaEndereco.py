@@ -2,13 +2,23 @@ import asyncio
 import logging
 import re
 import os
+import sys
 import json
-from typing import Dict, List, Optional, Tuple
+import time
+import csv
+import io
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, ConversationHandler
 import requests
 from dotenv import load_dotenv
 
+# Raiz do projeto no path para o código compartilhado (comum/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum import gravacao, limitador, metricas
+
 # Carrega variáveis de ambiente
 load_dotenv()
 
@@ -19,8 +29,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Gravação/reprodução das requisições ao IXC para testes offline (ALERTAS_GRAVACAO)
+gravacao.instalar_de_ambiente()
+
+# Métricas no formato do Prometheus em METRICAS_PORTA (desligadas sem a variável)
+metricas.instalar_de_ambiente()
+
 # Configurações da API IXC
-IXC_BASE_URL = "https://assinante.nmultifibra.com.br/webservice/v1"
+IXC_BASE_URL = os.getenv("IXC_BASE_URL", "https://assinante.nmultifibra.com.br/webservice/v1")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
 AUTH_TOKEN = os.getenv("AUTH_TOKEN", "")
 
 # Configuração do Telegram
@@ -29,6 +46,34 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
 
 # Estados da conversa
 REQUEST_PON = 1
+REQUEST_LOTE = 2
+
+# Tempo (em segundos) que o resultado de uma coleta fica em cache
+COLETA_CACHE_TTL = int(os.getenv("COLETA_CACHE_TTL", "120"))
+
+# Requisições simultâneas à API, compartilhadas por todas as coletas em andamento
+COLETA_CONCORRENCIA = int(os.getenv("COLETA_CONCORRENCIA", "10"))
+
+# Limite adaptativo de requisições simultâneas ao IXC, comum a todo o processo (IXC_LIMITADOR=0 desliga);
+# começa na concorrência das coletas para não estrangular o bot antes de medir o IXC
+limitador.instalar_de_ambiente(inicial=COLETA_CONCORRENCIA)
+
+# Máximo de PONs aceitas em uma coleta em lote
+MAX_PONS_LOTE = int(os.getenv("MAX_PONS_LOTE", "64"))
+
+# Catálogo local de endereços, atualizado em segundo plano (intervalo em segundos; 0 desativa)
+CATALOGO_ARQUIVO = os.getenv("CATALOGO_ARQUIVO", "catalogo_enderecos.json")
+CATALOGO_INTERVALO = int(os.getenv("CATALOGO_INTERVALO", "600"))
+# Validade (segundos) de uma entrada desde que foi consultada ou confirmada pela última sincronização;
+# vencida, o contrato é consultado de novo no IXC
+CATALOGO_VALIDADE = int(os.getenv("CATALOGO_VALIDADE", "3600"))
+# Montagem completa do catálogo (todas as PONs) na primeira execução; sem ela o catálogo é
+# preenchido aos poucos, com as PONs consultadas
+CATALOGO_COMPLETO = os.getenv("CATALOGO_COMPLETO", "0") == "1"
+
+# Limite de caracteres por mensagem e intervalo mínimo (segundos) entre edições
+LIMITE_MENSAGEM = 4000
+INTERVALO_EDICAO = 1.0
 
 # Headers para requisições IXC
 HEADERS = {
@@ -79,6 +124,82 @@ class IXCClient:
             logger.error(f"Erro ao buscar clientes da PON {pon}: {e}")
             return []
     
+    @staticmethod
+    def get_pons_transmissor(id_transmissor: str) -> List[str]:
+        """Retorna as PONs com clientes cadastrados no transmissor"""
+        url = f"{IXC_BASE_URL}/radpop_radio_cliente_fibra"
+        payload = {
+            "qtype": "id_transmissor",
+            "query": id_transmissor,
+            "oper": "=",
+            "page": "1",
+            "rp": "99999"
+        }
+        try:
+            response = requests.post(url, json=payload, headers=HEADERS, timeout=60)
+            response.raise_for_status()
+            data = response.json()
+            pons = {str(c.get("ponid", "")).strip() for c in data.get("registros", [])}
+            pons = [p for p in pons if re.match(r'^\d+/\d+/\d+(/\d+)?$', p)]
+            return sorted(pons, key=lambda p: [int(n) for n in p.split("/")])
+        except Exception as e:
+            logger.error(f"Erro ao buscar PONs do transmissor {id_transmissor}: {e}")
+            return []
+    
+    @staticmethod
+    def get_clientes_fibra() -> List[Dict]:
+        """Retorna todos os vínculos cliente x PON cadastrados"""
+        url = f"{IXC_BASE_URL}/radpop_radio_cliente_fibra"
+        registros = []
+        page = 1
+        while True:
+            payload = {
+                "qtype": "id",
+                "query": "0",
+                "oper": ">",
+                "page": str(page),
+                "rp": "5000"
+            }
+            try:
+                response = requests.post(url, json=payload, headers=HEADERS, timeout=120)
+                response.raise_for_status()
+                data = response.json()
+            except Exception as e:
+                logger.error(f"Erro ao listar clientes fibra (página {page}): {e}")
+                raise
+            pagina = data.get("registros", [])
+            registros.extend(pagina)
+            if len(pagina) < 5000 or page * 5000 >= int(data.get("total", 0)):
+                return registros
+            page += 1
+    
+    @staticmethod
+    def get_alterados(tabela: str, desde: str) -> List[Dict]:
+        """Retorna os registros da tabela alterados após a data informada"""
+        url = f"{IXC_BASE_URL}/{tabela}"
+        registros = []
+        page = 1
+        while True:
+            payload = {
+                "qtype": "ultima_atualizacao",
+                "query": desde,
+                "oper": ">",
+                "page": str(page),
+                "rp": "1000"
+            }
+            try:
+                response = requests.post(url, json=payload, headers=HEADERS, timeout=60)
+                response.raise_for_status()
+                data = response.json()
+            except Exception as e:
+                logger.error(f"Erro ao buscar alterações em {tabela} desde {desde}: {e}")
+                raise
+            pagina = data.get("registros", [])
+            registros.extend(pagina)
+            if len(pagina) < 1000 or page * 1000 >= int(data.get("total", 0)):
+                return registros
+            page += 1
+    
     @staticmethod
     def get_contrato(id_contrato: str) -> Optional[Dict]:
         url = f"{IXC_BASE_URL}/cliente_contrato"
@@ -163,6 +284,183 @@ class IXCClient:
             return None
 
 
+# Rótulos do status online (radusuarios.online) usados na exportação
+STATUS_ONLINE_ROTULOS = {"S": "Online", "N": "Offline", "SS": "Offline"}
+
+# Colunas do arquivo exportado
+COLUNAS_EXPORTACAO = ["ID Cliente", "Endereço", "Número", "Bairro", "Cidade", "Status", "ID Contrato"]
+
+
+class EnderecoCliente(NamedTuple):
+    """Endereço resolvido de um cliente da PON"""
+    id_cliente: str
+    endereco: str
+    numero: str
+    bairro: str
+    cidade: str
+    id_contrato: str
+    id_login: str
+    online: Optional[str] = None
+
+
+class ColetaEmAndamento:
+    """Resultado de uma coleta, preenchido à medida que os endereços são resolvidos"""
+    
+    def __init__(self):
+        self.enderecos: List[str] = []
+        self.registros: List[EnderecoCliente] = []
+        self.aviso: Optional[str] = None
+        self.erro: Optional[Exception] = None
+        self.concluida = False
+        self._evento = asyncio.Event()
+    
+    def _notificar(self):
+        evento, self._evento = self._evento, asyncio.Event()
+        evento.set()
+    
+    def adicionar(self, registro: EnderecoCliente, linha: str):
+        self.registros.append(registro)
+        self.enderecos.append(linha)
+        self._notificar()
+    
+    def concluir(self, aviso: Optional[str] = None, erro: Optional[Exception] = None):
+        self.aviso = aviso
+        self.erro = erro
+        self.concluida = True
+        self._notificar()
+    
+    async def acompanhar(self):
+        """Gera os endereços já resolvidos e os próximos, até a conclusão da coleta"""
+        entregues = 0
+        while True:
+            while entregues < len(self.enderecos):
+                yield self.enderecos[entregues]
+                entregues += 1
+            if self.concluida:
+                break
+            await self._evento.wait()
+        if self.erro is not None:
+            raise self.erro
+    
+    async def aguardar(self):
+        """Aguarda a conclusão da coleta (propaga o erro, se houver)"""
+        async for _ in self.acompanhar():
+            pass
+    
+    def resultado(self) -> List[str]:
+        if not self.enderecos and self.aviso:
+            return [self.aviso]
+        return list(self.enderecos)
+
+
+class CatalogoEnderecos:
+    """Catálogo local de endereços por contrato e de contratos por (transmissor, PON),
+    mantido em segundo plano e persistido em JSON"""
+    
+    def __init__(self, arquivo: str = CATALOGO_ARQUIVO, validade: int = CATALOGO_VALIDADE,
+                 sincronizado: bool = CATALOGO_INTERVALO > 0):
+        self.arquivo = arquivo
+        self.validade = validade
+        # Sem a atualização em segundo plano, a última sincronização não confirma mais as entradas
+        self.sincronizado = sincronizado
+        self._lock = threading.Lock()
+        self.contratos: Dict[str, Dict] = {}
+        self.pons: Dict[str, List[Dict]] = {}
+        self.contratos_por_cliente: Dict[str, set] = {}
+        self.ultima_sincronizacao: Optional[str] = None
+        self.sincronizado_em = 0.0
+        self.carregar()
+    
+    @staticmethod
+    def chave_pon(id_transmissor: str, pon: str) -> str:
+        return f"{id_transmissor}|{pon}"
+    
+    def carregar(self):
+        if not os.path.exists(self.arquivo):
+            return
+        try:
+            with open(self.arquivo, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        except Exception as e:
+            logger.error(f"Erro ao carregar catálogo de endereços: {e}")
+            return
+        self.contratos = dados.get("contratos", {})
+        self.pons = dados.get("pons", {})
+        self.marcar_sincronizacao(dados.get("ultima_sincronizacao"))
+        for id_contrato, entrada in self.contratos.items():
+            self.contratos_por_cliente.setdefault(entrada.get("id_cliente", ""), set()).add(id_contrato)
+        logger.info(f"Catálogo de endereços carregado: {len(self.contratos)} contratos, {len(self.pons)} PONs")
+    
+    def salvar(self):
+        with self._lock:
+            dados = {
+                "ultima_sincronizacao": self.ultima_sincronizacao,
+                "contratos": dict(self.contratos),
+                "pons": dict(self.pons)
+            }
+        temporario = f"{self.arquivo}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(temporario, self.arquivo)
+    
+    def marcar_sincronizacao(self, instante: Optional[str]):
+        self.ultima_sincronizacao = instante
+        self.sincronizado_em = 0.0
+        if instante and self.sincronizado:
+            self.sincronizado_em = datetime.strptime(instante, '%Y-%m-%d %H:%M:%S').timestamp()
+    
+    def possui(self, id_contrato: str) -> bool:
+        return id_contrato in self.contratos
+    
+    def obter(self, id_contrato: str) -> Optional[Dict]:
+        """Entrada do contrato, se consultada ou confirmada por uma sincronização dentro da validade"""
+        entrada = self.contratos.get(id_contrato)
+        if not entrada:
+            return None
+        confirmada = max(entrada.get("atualizado_em", 0), self.sincronizado_em)
+        if time.time() - confirmada > self.validade:
+            return None
+        return entrada
+    
+    def registrar_contrato(self, id_contrato: str, entrada: Dict):
+        entrada["atualizado_em"] = time.time()
+        with self._lock:
+            anterior = self.contratos.get(id_contrato)
+            if anterior and anterior.get("id_cliente") != entrada.get("id_cliente"):
+                self.contratos_por_cliente.get(anterior.get("id_cliente"), set()).discard(id_contrato)
+            self.contratos[id_contrato] = entrada
+            self.contratos_por_cliente.setdefault(entrada.get("id_cliente", ""), set()).add(id_contrato)
+    
+    def remover_contrato(self, id_contrato: str):
+        with self._lock:
+            entrada = self.contratos.pop(id_contrato, None)
+            if entrada:
+                self.contratos_por_cliente.get(entrada.get("id_cliente"), set()).discard(id_contrato)
+    
+    def registrar_pon(self, id_transmissor: str, pon: str, clientes: List[Dict]):
+        membros = [
+            {"id_contrato": str(c.get("id_contrato") or ""), "id_login": str(c.get("id_login") or "")}
+            for c in clientes
+        ]
+        with self._lock:
+            self.pons[self.chave_pon(id_transmissor, pon)] = membros
+    
+    def contratos_pendentes(self) -> set:
+        """Contratos presentes em alguma PON e ainda sem endereço no catálogo"""
+        with self._lock:
+            return {
+                m["id_contrato"] for membros in self.pons.values() for m in membros
+                if m["id_contrato"] and m["id_contrato"] not in self.contratos
+            }
+    
+    def contratos_dos_clientes(self, ids_cliente: List[str]) -> set:
+        with self._lock:
+            contratos = set()
+            for id_cliente in ids_cliente:
+                contratos |= self.contratos_por_cliente.get(id_cliente, set())
+            return contratos
+
+
 class EnderecoCollector:
     """Coletor de endereços"""
     
@@ -170,6 +468,45 @@ class EnderecoCollector:
         self.ixc = IXCClient()
         self.transmissores_cache = None
         self.transmissores_map = {}
+        # Coletas em andamento e resultados recentes, por (transmissor, pon, filter_offline)
+        self.coletas_em_andamento: Dict[Tuple[str, str, bool], "ColetaEmAndamento"] = {}
+        self.coletas_cache: Dict[Tuple[str, str, bool], Tuple[float, "ColetaEmAndamento"]] = {}
+        # Cadastros compartilhados entre coletas (cidades quase nunca mudam)
+        self.cidades_cache: Dict[str, str] = {}
+        self._limite_api: Optional[asyncio.Semaphore] = None
+        self.catalogo = CatalogoEnderecos()
+    
+    def limite_api(self) -> asyncio.Semaphore:
+        """Semáforo global de requisições, criado no loop do bot"""
+        if self._limite_api is None:
+            self._limite_api = asyncio.Semaphore(COLETA_CONCORRENCIA)
+        return self._limite_api
+    
+    async def executar_limitado(self, func, *args):
+        """Executa uma consulta bloqueante ao IXC respeitando o limite global de concorrência"""
+        async with self.limite_api():
+            return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+    
+    def get_cidade(self, id_cidade: str) -> str:
+        metricas.registrar_cache("cidades", id_cidade in self.cidades_cache)
+        if id_cidade not in self.cidades_cache:
+            nome = self.ixc.get_cidade(id_cidade)
+            if nome is None:
+                return ""
+            self.cidades_cache[id_cidade] = nome
+        return self.cidades_cache[id_cidade]
+    
+    def resolver_transmissor(self, transmissor_desc: str) -> Optional[str]:
+        """Retorna o ID do transmissor pela descrição (exata ou parcial)"""
+        transmissor_id = self.transmissores_map.get(transmissor_desc)
+        if not transmissor_id:
+            transmissor_id = self.transmissores_map.get(transmissor_desc.upper())
+        if not transmissor_id:
+            for key in self.transmissores_map.keys():
+                if transmissor_desc.upper() in key.upper():
+                    transmissor_id = self.transmissores_map[key]
+                    break
+        return transmissor_id
     
     def load_transmissores(self):
         if self.transmissores_cache is None:
@@ -244,7 +581,7 @@ class EnderecoCollector:
         
         cidade_nome = ""
         if cidade_id and cidade_id != "0":
-            cidade_nome = self.ixc.get_cidade(cidade_id) or ""
+            cidade_nome = self.get_cidade(cidade_id)
         
         return endereco, numero, bairro, cidade_nome
     
@@ -269,82 +606,384 @@ class EnderecoCollector:
             linha += f" - {cidade}"
         return linha
     
+    def transmissor_da_chave(self, transmissor_desc: str) -> str:
+        """Identifica o transmissor nas chaves das coletas: o ID resolvido, para que apelidos
+        e nomes parciais da mesma OLT dividam a coleta, ou a descrição se não resolver"""
+        return self.resolver_transmissor(transmissor_desc.strip()) or transmissor_desc.strip().upper()
+    
+    async def iniciar_coleta(self, transmissor_desc: str, pon: str, filter_offline: bool = False) -> ColetaEmAndamento:
+        """Retorna a coleta da PON, reaproveitando coletas idênticas em andamento ou recentes"""
+        if self.transmissores_cache is None:
+            await asyncio.get_running_loop().run_in_executor(None, self.load_transmissores)
+        chave = (self.transmissor_da_chave(transmissor_desc), pon.strip(), filter_offline)
+        agora = time.monotonic()
+        
+        em_cache = self.coletas_cache.get(chave)
+        if em_cache and agora - em_cache[0] < COLETA_CACHE_TTL:
+            logger.info(f"Coleta {chave} respondida pelo cache")
+            metricas.registrar_cache("coletas", True)
+            return em_cache[1]
+        
+        coleta = self.coletas_em_andamento.get(chave)
+        if coleta is None:
+            metricas.registrar_cache("coletas", False)
+            coleta = ColetaEmAndamento()
+            self.coletas_em_andamento[chave] = coleta
+            metricas.FILA.definir(len(self.coletas_em_andamento), fila="coletas_em_andamento")
+            # A tarefa não pertence a nenhum solicitante: cancelar uma espera não interrompe a coleta
+            tarefa = asyncio.ensure_future(self._executar_coleta(coleta, transmissor_desc, pon, filter_offline))
+            tarefa.add_done_callback(lambda t: self._finalizar_coleta(chave, coleta))
+        else:
+            logger.info(f"Coleta {chave} já em andamento, acompanhando resultado")
+            metricas.CACHE.inc(cache="coletas", resultado="compartilhada")
+        return coleta
+    
     async def coletar_enderecos(self, transmissor_desc: str, pon: str, filter_offline: bool = False) -> List[str]:
+        """Coleta os endereços de uma PON e aguarda o resultado completo"""
+        coleta = await self.iniciar_coleta(transmissor_desc, pon, filter_offline)
+        await coleta.aguardar()
+        return coleta.resultado()
+    
+    def parse_lote(self, text: str) -> Tuple[List[Tuple[str, Optional[str]]], List[str]]:
+        """Interpreta uma linha por item: 'TRANSMISSOR - PON' ou apenas 'TRANSMISSOR' (todas as PONs).
+        Retorna (itens, linhas_invalidas)"""
+        itens = []
+        invalidas = []
+        for linha in text.splitlines():
+            linha = linha.strip()
+            if not linha:
+                continue
+            transmissor, pon = self.parse_input(linha)
+            if transmissor and pon:
+                itens.append((transmissor, pon))
+            elif re.search(r'\d+/\d+/\d+', linha):
+                invalidas.append(linha)
+            else:
+                itens.append((linha, None))
+        return itens, invalidas
+    
+    async def iniciar_lote(self, itens: List[Tuple[str, Optional[str]]],
+                           filter_offline: bool = False) -> Tuple[List[Tuple[str, str, ColetaEmAndamento]], List[str]]:
+        """Expande transmissores inteiros em suas PONs e inicia todas as coletas em paralelo.
+        Retorna ([(transmissor, pon, coleta)], avisos)"""
+        avisos = []
+        if not await asyncio.get_running_loop().run_in_executor(None, self.load_transmissores):
+            return [], ["❌ Erro ao carregar transmissores. Verifique a conexão com a API."]
+        
+        async def expandir(transmissor: str, pon: Optional[str]) -> List[Tuple[str, str]]:
+            if pon:
+                return [(transmissor, pon)]
+            transmissor_id = self.resolver_transmissor(transmissor)
+            if not transmissor_id:
+                avisos.append(f"❌ Transmissor '{transmissor}' não encontrado!")
+                return []
+            pons = await self.executar_limitado(self.ixc.get_pons_transmissor, transmissor_id)
+            if not pons:
+                avisos.append(f"ℹ️ Nenhuma PON encontrada no transmissor {transmissor}")
+            return [(transmissor, p) for p in pons]
+        
+        pares = []
+        vistos = set()
+        for expandidos in await asyncio.gather(*[expandir(t, p) for t, p in itens]):
+            for transmissor, pon in expandidos:
+                chave = (self.transmissor_da_chave(transmissor), pon)
+                if chave not in vistos:
+                    vistos.add(chave)
+                    pares.append((transmissor, pon))
+        
+        if len(pares) > MAX_PONS_LOTE:
+            avisos.append(f"⚠️ Lote limitado a {MAX_PONS_LOTE} PONs ({len(pares) - MAX_PONS_LOTE} ignoradas)")
+            pares = pares[:MAX_PONS_LOTE]
+        
+        coletas = [(t, p, await self.iniciar_coleta(t, p, filter_offline)) for t, p in pares]
+        return coletas, avisos
+    
+    async def exportar_csv(self, coleta: ColetaEmAndamento) -> bytes:
+        """Gera em memória o CSV da coleta, consultando o status online que ainda não é conhecido"""
+        async def status(registro: EnderecoCliente) -> Optional[str]:
+            if registro.online is not None or not registro.id_login:
+                return registro.online
+            return await self.executar_limitado(self.ixc.get_status_login, registro.id_login)
+        
+        status_list = await asyncio.gather(*[status(r) for r in coleta.registros])
+        
+        buffer = io.StringIO()
+        # ';' e BOM UTF-8 para abrir direto no Excel em português
+        writer = csv.writer(buffer, delimiter=';')
+        writer.writerow(COLUNAS_EXPORTACAO)
+        for registro, online in zip(coleta.registros, status_list):
+            writer.writerow([
+                registro.id_cliente, registro.endereco, registro.numero, registro.bairro,
+                registro.cidade, STATUS_ONLINE_ROTULOS.get(online or "", "Desconhecido"),
+                registro.id_contrato
+            ])
+        return buffer.getvalue().encode("utf-8-sig")
+    
+    def _finalizar_coleta(self, chave: Tuple[str, str, bool], coleta: ColetaEmAndamento):
+        self.coletas_em_andamento.pop(chave, None)
+        metricas.FILA.definir(len(self.coletas_em_andamento), fila="coletas_em_andamento")
+        # Falhas não são guardadas para permitir nova tentativa imediata
+        if coleta.erro is not None or (not coleta.enderecos and (coleta.aviso or "").startswith("❌")):
+            return
+        agora = time.monotonic()
+        self.coletas_cache[chave] = (agora, coleta)
+        for k in [k for k, (ts, _) in self.coletas_cache.items() if agora - ts >= COLETA_CACHE_TTL]:
+            del self.coletas_cache[k]
+    
+    async def _executar_coleta(self, coleta: ColetaEmAndamento, transmissor_desc: str, pon: str, filter_offline: bool):
+        try:
+            with metricas.CICLO_DURACAO.cronometrar(etapa="coleta_pon"):
+                aviso = await self._preencher_coleta(coleta, transmissor_desc, pon, filter_offline)
+        except Exception as e:
+            logger.error(f"Erro na coleta {transmissor_desc} - {pon}: {e}")
+            coleta.concluir(erro=e)
+        else:
+            coleta.concluir(aviso)
+    
+    def _resolver_contrato(self, id_contrato: str, contrato: Optional[Dict] = None) -> Optional[Dict]:
+        """Consulta o contrato e o endereço do cliente no IXC e atualiza o catálogo"""
+        if contrato is None:
+            contrato = self.ixc.get_contrato(id_contrato)
+        if not contrato:
+            return None
+        entrada = {
+            "status": contrato.get("status", ""),
+            "id_cliente": str(contrato.get("id_cliente") or ""),
+            "endereco": "", "numero": "", "bairro": "", "cidade": ""
+        }
+        # Endereço só é necessário para contratos ativos
+        if entrada["status"] == "A" and entrada["id_cliente"]:
+            endereco, numero, bairro, cidade = self.get_endereco_completo(contrato)
+            entrada.update(endereco=endereco, numero=numero, bairro=bairro, cidade=cidade)
+        self.catalogo.registrar_contrato(id_contrato, entrada)
+        return entrada
+    
+    def _registro_do_catalogo(self, cliente: Dict, entrada: Optional[Dict],
+                              online: Optional[str]) -> Tuple[Optional[EnderecoCliente], bool]:
+        """Converte uma entrada do catálogo em registro. Retorna (registro, contrato_inativo)"""
+        if not entrada:
+            return None, False
+        # Verifica se o contrato está ativo
+        if entrada["status"] != "A":
+            return None, True
+        if not entrada["id_cliente"]:
+            return None, False
+        registro = EnderecoCliente(entrada["id_cliente"], entrada["endereco"], entrada["numero"],
+                                   entrada["bairro"], entrada["cidade"], str(cliente.get("id_contrato")),
+                                   str(cliente.get("id_login") or ""), online)
+        return registro, False
+    
+    def _resolver_endereco(self, cliente: Dict, online: Optional[str] = None) -> Tuple[Optional[EnderecoCliente], bool]:
+        """Resolve o endereço de um cliente da PON. Retorna (registro, contrato_inativo)"""
+        id_contrato = cliente.get("id_contrato")
+        if not id_contrato:
+            return None, False
+        entrada = self.catalogo.obter(str(id_contrato)) or self._resolver_contrato(str(id_contrato))
+        return self._registro_do_catalogo(cliente, entrada, online)
+    
+    async def _resolver_contratos(self, ids_contrato: List[str]):
+        """Resolve em paralelo (respeitando o limite global) os contratos informados"""
+        for inicio in range(0, len(ids_contrato), 500):
+            lote = ids_contrato[inicio:inicio + 500]
+            await asyncio.gather(*[self.executar_limitado(self._resolver_contrato, i) for i in lote])
+            self.catalogo.salvar()
+    
+    async def atualizar_catalogo(self):
+        """Monta o catálogo na primeira execução (se CATALOGO_COMPLETO) e depois o atualiza a partir
+        das alterações recentes"""
+        inicio = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        desde = self.catalogo.ultima_sincronizacao
+        
+        if desde is None and not CATALOGO_COMPLETO:
+            logger.info("Catálogo de endereços vazio: será preenchido com as PONs consultadas")
+        elif desde is None:
+            logger.info("Montando catálogo de endereços de todas as PONs...")
+            vinculos = await self.executar_limitado(self.ixc.get_clientes_fibra)
+            por_pon: Dict[Tuple[str, str], List[Dict]] = {}
+            for v in vinculos:
+                por_pon.setdefault((str(v.get("id_transmissor")), str(v.get("ponid", "")).strip()), []).append(v)
+            for (id_transmissor, pon), clientes in por_pon.items():
+                self.catalogo.registrar_pon(id_transmissor, pon, clientes)
+        else:
+            contratos = await self.executar_limitado(self.ixc.get_alterados, "cliente_contrato", desde)
+            clientes = await self.executar_limitado(self.ixc.get_alterados, "cliente", desde)
+            # Contratos alterados já trazem os dados do contrato; clientes alterados exigem reconsulta
+            alterados = [c for c in contratos if self.catalogo.possui(str(c.get("id")))]
+            for contrato in alterados:
+                await self.executar_limitado(self._resolver_contrato, str(contrato.get("id")), contrato)
+            ids_alterados = {str(c.get("id")) for c in alterados}
+            por_cliente = self.catalogo.contratos_dos_clientes([str(c.get("id")) for c in clientes]) - ids_alterados
+            await self._resolver_contratos(sorted(por_cliente))
+            logger.info(f"Catálogo atualizado: {len(alterados)} contratos e {len(por_cliente)} "
+                        f"contratos de clientes alterados desde {desde}")
+        
+        # Contratos vistos nas PONs que ainda não têm endereço no catálogo
+        pendentes = self.catalogo.contratos_pendentes()
+        if pendentes:
+            logger.info(f"Resolvendo {len(pendentes)} contratos ausentes do catálogo...")
+            await self._resolver_contratos(sorted(pendentes))
+        
+        self.catalogo.marcar_sincronizacao(inicio)
+        self.catalogo.salvar()
+    
+    async def manter_catalogo(self):
+        """Tarefa de segundo plano que mantém o catálogo de endereços atualizado"""
+        while True:
+            try:
+                with metricas.CICLO_DURACAO.cronometrar(etapa="atualizar_catalogo"):
+                    await self.atualizar_catalogo()
+                metricas.CICLOS.inc(resultado="ok")
+            except Exception as e:
+                metricas.CICLOS.inc(resultado="erro")
+                logger.error(f"Erro ao atualizar catálogo de endereços: {e}")
+            await asyncio.sleep(CATALOGO_INTERVALO)
+    
+    async def _preencher_coleta(self, coleta: ColetaEmAndamento, transmissor_desc: str, pon: str,
+                                filter_offline: bool) -> Optional[str]:
+        """Alimenta a coleta com os endereços à medida que são resolvidos. Retorna o aviso final, se houver"""
         logger.info(f"Iniciando coleta para {transmissor_desc} - {pon} (offline={filter_offline})")
+        loop = asyncio.get_running_loop()
         
-        if not self.load_transmissores():
-            return ["❌ Erro ao carregar transmissores. Verifique a conexão com a API."]
+        if not await loop.run_in_executor(None, self.load_transmissores):
+            return "❌ Erro ao carregar transmissores. Verifique a conexão com a API."
         
-        transmissor_id = self.transmissores_map.get(transmissor_desc)
-        if not transmissor_id:
-            transmissor_id = self.transmissores_map.get(transmissor_desc.upper())
+        transmissor_id = self.resolver_transmissor(transmissor_desc)
         if not transmissor_id:
-            for key in self.transmissores_map.keys():
-                if transmissor_desc.upper() in key.upper():
-                    transmissor_id = self.transmissores_map[key]
-                    break
-        if not transmissor_id:
-            return [f"❌ Transmissor '{transmissor_desc}' não encontrado!"]
+            return f"❌ Transmissor '{transmissor_desc}' não encontrado!"
         
-        clientes = self.ixc.get_clientes_pon(transmissor_id, pon)
+        # A composição da PON é sempre consultada (verificação de atualidade); os endereços vêm do catálogo
+        clientes = await self.executar_limitado(self.ixc.get_clientes_pon, transmissor_id, pon)
         if not clientes:
-            return [f"❌ Nenhum cliente encontrado para PON {pon} no transmissor {transmissor_desc}"]
+            return f"❌ Nenhum cliente encontrado para PON {pon} no transmissor {transmissor_desc}"
+        self.catalogo.registrar_pon(transmissor_id, pon, clientes)
         
         logger.info(f"Encontrados {len(clientes)} clientes na PON {pon}")
         
         # Filtro offline (se ativado)
+        cliente_status = {}
         if filter_offline:
             ids_login = [c.get("id_login") for c in clientes if c.get("id_login")]
             if not ids_login:
-                return ["ℹ️ Nenhum cliente com id_login encontrado."]
-            loop = asyncio.get_event_loop()
-            tasks = [loop.run_in_executor(None, self.ixc.get_status_login, str(id_log)) for id_log in ids_login]
+                return "ℹ️ Nenhum cliente com id_login encontrado."
+            tasks = [self.executar_limitado(self.ixc.get_status_login, str(id_log)) for id_log in ids_login]
             status_list = await asyncio.gather(*tasks)
             cliente_status = {ids_login[i]: status_list[i] for i in range(len(ids_login))}
             clientes_filtrados = [c for c in clientes if c.get("id_login") and cliente_status.get(c["id_login"]) in ("N", "SS")]
             clientes = clientes_filtrados
             if not clientes:
-                return ["ℹ️ Nenhum cliente offline encontrado nesta PON."]
+                return "ℹ️ Nenhum cliente offline encontrado nesta PON."
         
-        # Processamento dos endereços com filtro de status
-        enderecos = []
+        # Processamento dos endereços com filtro de status: primeiro os que já estão no catálogo,
+        # depois os demais na ordem em que ficam prontos
         ignorados_status = 0
-        for cliente in clientes:
-            id_contrato = cliente.get("id_contrato")
-            if not id_contrato:
-                continue
-            contrato = self.ixc.get_contrato(str(id_contrato))
-            if not contrato:
-                continue
-            # Verifica se o contrato está ativo
-            if contrato.get("status") != "A":
+        
+        def incluir(registro: Optional[EnderecoCliente], inativo: bool):
+            nonlocal ignorados_status
+            if inativo:
                 ignorados_status += 1
-                continue
-            id_cliente = contrato.get("id_cliente")
-            if not id_cliente:
-                continue
-            endereco, numero, bairro, cidade = self.get_endereco_completo(contrato)
-            linha = self.format_endereco(str(id_cliente), endereco, numero, bairro, cidade)
-            enderecos.append(linha)
+            elif registro:
+                linha = self.format_endereco(registro.id_cliente, registro.endereco,
+                                             registro.numero, registro.bairro, registro.cidade)
+                coleta.adicionar(registro, linha)
+        
+        tarefas = []
+        for c in clientes:
+            online = cliente_status.get(c.get("id_login"))
+            entrada = self.catalogo.obter(str(c.get("id_contrato") or ""))
+            metricas.registrar_cache("catalogo", bool(entrada))
+            if entrada:
+                incluir(*self._registro_do_catalogo(c, entrada, online))
+            elif c.get("id_contrato"):
+                tarefas.append(self.executar_limitado(self._resolver_endereco, c, online))
         
-        if not enderecos:
+        for futuro in asyncio.as_completed(tarefas):
+            incluir(*await futuro)
+        
+        if not coleta.enderecos:
             if ignorados_status > 0:
-                return [f"ℹ️ Nenhum cliente ativo encontrado. {ignorados_status} clientes ignorados por status não ativo."]
+                return f"ℹ️ Nenhum cliente ativo encontrado. {ignorados_status} clientes ignorados por status não ativo."
             else:
-                return ["ℹ️ Nenhum endereço encontrado para os clientes desta PON."]
+                return "ℹ️ Nenhum endereço encontrado para os clientes desta PON."
         
-        logger.info(f"Coleta concluída: {len(enderecos)} endereços, {ignorados_status} ignorados por status.")
-        return enderecos
-
+        logger.info(f"Coleta concluída: {len(coleta.enderecos)} endereços, {ignorados_status} ignorados por status.")
+        return None
 
 # Instância global do coletor
 collector = EnderecoCollector()
 
 
+class RespostaProgressiva:
+    """Exibe linhas no chat à medida que chegam, editando a mensagem atual com
+    intervalo mínimo e abrindo uma nova mensagem quando a atual atinge o limite"""
+    
+    def __init__(self, update: Update, mensagem_inicial, titulo: str):
+        self.update = update
+        self.titulo = titulo
+        self.total = 0
+        self.primeira = mensagem_inicial
+        self.linhas_primeira: List[str] = []
+        self.atual = mensagem_inicial
+        self.linhas_atual: List[str] = self.linhas_primeira
+        self.texto_enviado: Dict[int, str] = {}
+        self.ultima_edicao = 0.0
+        # Edição agendada para o fim do intervalo mínimo, com as linhas que chegaram dentro dele
+        self._pendente: Optional[asyncio.Task] = None
+        self._lock_edicao = asyncio.Lock()
+    
+    def _texto(self, linhas: List[str]) -> str:
+        if linhas is self.linhas_primeira:
+            return f"{self.titulo} ({self.total}):\n\n" + "\n".join(linhas)
+        return "\n".join(linhas)
+    
+    async def _editar(self, mensagem, linhas: List[str]):
+        async with self._lock_edicao:
+            texto = self._texto(linhas)
+            # O Telegram rejeita edições sem alteração de conteúdo
+            if self.texto_enviado.get(id(mensagem)) == texto:
+                return
+            await mensagem.edit_text(texto)
+            self.texto_enviado[id(mensagem)] = texto
+            self.ultima_edicao = time.monotonic()
+    
+    async def _editar_ao_fim_do_intervalo(self):
+        await asyncio.sleep(max(0.0, self.ultima_edicao + INTERVALO_EDICAO - time.monotonic()))
+        self._pendente = None
+        try:
+            await self._editar(self.atual, self.linhas_atual)
+        except Exception as e:
+            logger.warning(f"Erro ao atualizar mensagem da coleta: {e}")
+    
+    async def adicionar(self, linha: str):
+        self.total += 1
+        if len(self._texto(self.linhas_atual)) + len(linha) + 1 > LIMITE_MENSAGEM:
+            # Mensagem cheia: fecha com o conteúdo final e começa uma nova
+            await self._editar(self.atual, self.linhas_atual)
+            await asyncio.sleep(0.3)
+            self.atual = await self.update.message.reply_text(linha)
+            self.linhas_atual = [linha]
+            self.texto_enviado[id(self.atual)] = linha
+            return
+        self.linhas_atual.append(linha)
+        if time.monotonic() - self.ultima_edicao >= INTERVALO_EDICAO:
+            await self._editar(self.atual, self.linhas_atual)
+        elif self._pendente is None:
+            self._pendente = asyncio.create_task(self._editar_ao_fim_do_intervalo())
+    
+    async def finalizar(self):
+        if self._pendente is not None:
+            self._pendente.cancel()
+            self._pendente = None
+        await self._editar(self.atual, self.linhas_atual)
+        if self.atual is not self.primeira:
+            # Atualiza o total no cabeçalho da primeira mensagem
+            await self._editar(self.primeira, self.linhas_primeira)
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "👋 Bem-vindo ao coletor de endereços!\n"
-        "Digite /enderecos para todos os endereços ou /offline para apenas offlines."
+        "Digite /enderecos para todos os endereços ou /offline para apenas offlines.\n"
+        "Use /exportar para receber o resultado em arquivo."
     )
 
 
@@ -354,6 +993,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/start - Inicia o bot\n"
         "/enderecos - Coleta todos os endereços de uma PON\n"
         "/offline - Coleta apenas endereços de clientes offline\n"
+        "/exportar - Envia os endereços de uma PON em arquivo CSV (/exportar offline para apenas offlines)\n"
+        "/lote - Coleta várias PONs ou um transmissor inteiro (/lote offline para apenas offlines)\n"
         "/help - Mostra esta mensagem\n"
         "/cancel - Cancela operação em andamento\n\n"
         "📝 Formato para busca:\n"
@@ -366,6 +1007,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def enderecos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inicia coleta de todos os endereços"""
     context.user_data['filter_offline'] = False
+    context.user_data['exportar'] = False
     await update.message.reply_text(
         "📋 Me informe o Transmissor e a PON (todos os endereços):\n\n"
         "📝 Formato: `OLT_TRMS_01 - 0/15/12`"
@@ -376,6 +1018,7 @@ async def enderecos_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def offline_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Inicia coleta apenas de clientes offline"""
     context.user_data['filter_offline'] = True
+    context.user_data['exportar'] = False
     await update.message.reply_text(
         "📋 Me informe o Transmissor e a PON (apenas offlines):\n\n"
         "📝 Formato: `OLT_TRMS_01 - 0/15/12`"
@@ -383,6 +1026,18 @@ async def offline_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return REQUEST_PON
 
 
+async def exportar_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inicia coleta com envio do resultado em arquivo CSV (/exportar offline para apenas offlines)"""
+    filter_offline = bool(context.args) and context.args[0].lower() == "offline"
+    context.user_data['filter_offline'] = filter_offline
+    context.user_data['exportar'] = True
+    await update.message.reply_text(
+        f"📋 Me informe o Transmissor e a PON ({'apenas offlines' if filter_offline else 'todos os endereços'}, em arquivo):\n\n"
+        "📝 Formato: `OLT_TRMS_01 - 0/15/12`"
+    )
+    return REQUEST_PON
+
+
 async def receive_pon(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text.strip()
     transmissor, pon = collector.parse_input(user_input)
@@ -396,46 +1051,52 @@ async def receive_pon(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return REQUEST_PON
     
     filter_offline = context.user_data.get('filter_offline', False)
+    exportar = context.user_data.get('exportar', False)
     
     processing_msg = await update.message.reply_text(
         f"🔍 Buscando endereços{' (offlines)' if filter_offline else ''} para {transmissor} - {pon}...\n"
         "⏳ Isso pode levar alguns segundos..."
     )
+    resposta = None
     
     try:
-        enderecos = await collector.coletar_enderecos(transmissor, pon, filter_offline)
-        
-        if len(enderecos) == 1 and (enderecos[0].startswith("❌") or enderecos[0].startswith("ℹ️")):
-            await processing_msg.edit_text(enderecos[0])
-            return ConversationHandler.END
+        coleta = await collector.iniciar_coleta(transmissor, pon, filter_offline)
         
-        total = len(enderecos)
-        if filter_offline:
-            cabecalho = f"📍 Endereços de clientes offline ({total}):\n\n"
-        else:
-            cabecalho = f"📍 Endereços encontrados ({total}):\n\n"
-        
-        resposta_completa = cabecalho + "\n".join(enderecos)
-        
-        # Divisão por limite de caracteres
-        if len(resposta_completa) <= 4000:
-            await processing_msg.edit_text(resposta_completa)
-            await update.message.reply_text(f"✅ Busca concluída! Total: {total} endereços.")
+        if exportar:
+            # Modo exportação: aguarda a coleta completa e envia um único arquivo
+            async for _ in coleta.acompanhar():
+                pass
+            if not coleta.enderecos:
+                await processing_msg.edit_text(coleta.aviso)
+                return ConversationHandler.END
+            total = len(coleta.registros)
+            conteudo = await collector.exportar_csv(coleta)
+            nome_arquivo = (
+                f"enderecos_{'offline_' if filter_offline else ''}{re.sub(r'[^A-Za-z0-9]+', '_', transmissor)}_"
+                f"{pon.replace('/', '-')}_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+            )
+            await update.message.reply_document(
+                document=conteudo,
+                filename=nome_arquivo,
+                caption=f"✅ Busca concluída! Total: {total} endereços."
+            )
+            await processing_msg.edit_text(f"📎 Arquivo gerado: {nome_arquivo}")
         else:
-            partes = []
-            parte_atual = cabecalho
-            for endereco in enderecos:
-                if len(parte_atual) + len(endereco) + 1 > 4000:
-                    partes.append(parte_atual)
-                    parte_atual = ""
-                parte_atual += endereco + "\n"
-            if parte_atual:
-                partes.append(parte_atual)
+            if filter_offline:
+                titulo = "📍 Endereços de clientes offline"
+            else:
+                titulo = "📍 Endereços encontrados"
+            resposta = RespostaProgressiva(update, processing_msg, titulo)
             
-            await processing_msg.edit_text(partes[0])
-            for i in range(1, len(partes)):
-                await asyncio.sleep(0.3)
-                await update.message.reply_text(partes[i].strip())
+            async for endereco in coleta.acompanhar():
+                await resposta.adicionar(endereco)
+            
+            if not coleta.enderecos:
+                await processing_msg.edit_text(coleta.aviso)
+                return ConversationHandler.END
+            
+            total = resposta.total
+            await resposta.finalizar()
             await update.message.reply_text(f"✅ Busca concluída! Total: {total} endereços.")
         
         # Log opcional
@@ -443,6 +1104,8 @@ async def receive_pon(update: Update, context: ContextTypes.DEFAULT_TYPE):
             try:
                 app = context.application
                 tipo = "offlines" if filter_offline else "todos"
+                if exportar:
+                    tipo += ", arquivo"
                 await app.bot.send_message(
                     chat_id=TELEGRAM_CHAT_ID,
                     text=f"📊 Relatório de coleta ({tipo}):\n"
@@ -456,6 +1119,125 @@ async def receive_pon(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     except Exception as e:
         logger.error(f"Erro na coleta: {e}")
+        aviso = f"❌ Ocorreu um erro durante a coleta:\n{str(e)}"
+        if resposta is not None and resposta.total:
+            # As linhas já exibidas ficam; o erro vai em uma nova mensagem
+            try:
+                await resposta.finalizar()
+            except Exception as erro_edicao:
+                logger.warning(f"Erro ao atualizar mensagem da coleta: {erro_edicao}")
+            await update.message.reply_text(aviso)
+        else:
+            await processing_msg.edit_text(aviso)
+    
+    return ConversationHandler.END
+
+
+def dividir_em_mensagens(linhas: List[str], limite: int = LIMITE_MENSAGEM) -> List[str]:
+    """Agrupa linhas em mensagens que respeitam o limite de caracteres"""
+    partes = []
+    parte_atual = ""
+    for linha in linhas:
+        if parte_atual and len(parte_atual) + len(linha) + 1 > limite:
+            partes.append(parte_atual.strip())
+            parte_atual = ""
+        parte_atual += linha + "\n"
+    if parte_atual.strip():
+        partes.append(parte_atual.strip())
+    return partes
+
+
+async def lote_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inicia coleta em lote de várias PONs (/lote offline para apenas offlines)"""
+    filter_offline = bool(context.args) and context.args[0].lower() == "offline"
+    context.user_data['filter_offline'] = filter_offline
+    await update.message.reply_text(
+        f"📋 Me informe as PONs ({'apenas offlines' if filter_offline else 'todos os endereços'}), uma por linha:\n\n"
+        "📝 Formato: `OLT_TRMS_01 - 0/15/12`\n"
+        "📡 Ou apenas o transmissor (`OLT_TRMS_01`) para todas as suas PONs"
+    )
+    return REQUEST_LOTE
+
+
+async def receive_lote(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    itens, invalidas = collector.parse_lote(update.message.text)
+    
+    if not itens:
+        await update.message.reply_text(
+            "❌ Nenhuma linha válida!\n"
+            "Use uma linha por PON: TRANSMISSOR - PON (ex: OLT_TRMS_01 - 0/15/12)\n"
+            "ou apenas o transmissor para todas as PONs.\n\n"
+            "Tente novamente:"
+        )
+        return REQUEST_LOTE
+    
+    filter_offline = context.user_data.get('filter_offline', False)
+    
+    processing_msg = await update.message.reply_text(
+        f"🔍 Buscando endereços{' (offlines)' if filter_offline else ''} em lote...\n"
+        "⏳ Isso pode levar alguns minutos..."
+    )
+    
+    try:
+        coletas, avisos = await collector.iniciar_lote(itens, filter_offline)
+        avisos = [f"❌ Linha inválida: {linha}" for linha in invalidas] + avisos
+        
+        # Progresso: uma edição a cada PON concluída, respeitando o intervalo mínimo
+        concluidas = 0
+        ultima_edicao = time.monotonic()
+        
+        async def aguardar(coleta: ColetaEmAndamento):
+            try:
+                await coleta.aguardar()
+            except Exception as e:
+                logger.error(f"Erro na coleta em lote: {e}")
+        
+        for futuro in asyncio.as_completed([aguardar(c) for _, _, c in coletas]):
+            await futuro
+            concluidas += 1
+            if time.monotonic() - ultima_edicao >= INTERVALO_EDICAO and concluidas < len(coletas):
+                await processing_msg.edit_text(f"⏳ {concluidas}/{len(coletas)} PONs concluídas...")
+                ultima_edicao = time.monotonic()
+        
+        # Resultado consolidado, agrupado por PON na ordem informada
+        total = 0
+        linhas = []
+        for transmissor, pon, coleta in coletas:
+            if coleta.erro is not None:
+                linhas += [f"📡 {transmissor} - {pon}", f"❌ Erro: {coleta.erro}", ""]
+            elif not coleta.enderecos:
+                linhas += [f"📡 {transmissor} - {pon}", coleta.aviso or "", ""]
+            else:
+                total += len(coleta.enderecos)
+                linhas += [f"📡 {transmissor} - {pon} ({len(coleta.enderecos)}):"] + coleta.enderecos + [""]
+        if avisos:
+            linhas += avisos
+        
+        partes = dividir_em_mensagens(linhas) or ["ℹ️ Nenhuma PON para coletar."]
+        await processing_msg.edit_text(partes[0])
+        for parte in partes[1:]:
+            await asyncio.sleep(0.3)
+            await update.message.reply_text(parte)
+        await update.message.reply_text(
+            f"✅ Lote concluído! {len(coletas)} PONs, total: {total} endereços."
+        )
+        
+        # Log opcional
+        if TELEGRAM_CHAT_ID:
+            try:
+                tipo = "offlines" if filter_offline else "todos"
+                await context.application.bot.send_message(
+                    chat_id=TELEGRAM_CHAT_ID,
+                    text=f"📊 Relatório de coleta em lote ({tipo}):\n"
+                         f"Usuário: {update.effective_user.username or update.effective_user.id}\n"
+                         f"PONs: {len(coletas)}\n"
+                         f"Endereços encontrados: {total}"
+                )
+            except Exception as e:
+                logger.error(f"Erro ao enviar log para chat_id: {e}")
+        
+    except Exception as e:
+        logger.error(f"Erro na coleta em lote: {e}")
         await processing_msg.edit_text(f"❌ Ocorreu um erro durante a coleta:\n{str(e)}")
     
     return ConversationHandler.END
@@ -475,6 +1257,12 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
         )
 
 
+async def iniciar_tarefas(application: Application):
+    """Inicia as tarefas de segundo plano junto com o bot"""
+    if CATALOGO_INTERVALO > 0:
+        application.create_task(collector.manter_catalogo())
+
+
 def main():
     if not TELEGRAM_BOT_TOKEN:
         logger.error("❌ TELEGRAM_BOT_TOKEN não configurado no arquivo .env")
@@ -483,17 +1271,27 @@ def main():
         logger.error("❌ AUTH_TOKEN não configurado no arquivo .env")
         return
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .base_url(f"{TELEGRAM_API_URL}/bot")
+        .base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        .post_init(iniciar_tarefas)
+        .build()
+    )
     application.add_error_handler(error_handler)
     
-    # ConversationHandler para os dois comandos (ambos levam ao mesmo estado REQUEST_PON)
+    # ConversationHandler para os comandos de coleta (uma PON em REQUEST_PON, várias em REQUEST_LOTE)
     conv_handler = ConversationHandler(
         entry_points=[
             CommandHandler('enderecos', enderecos_command),
-            CommandHandler('offline', offline_command)
+            CommandHandler('offline', offline_command),
+            CommandHandler('exportar', exportar_command),
+            CommandHandler('lote', lote_command)
         ],
         states={
             REQUEST_PON: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_pon)],
+            REQUEST_LOTE: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_lote)],
         },
         fallbacks=[CommandHandler('cancel', cancel)],
     )
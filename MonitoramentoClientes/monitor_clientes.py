@@ -5,8 +5,13 @@ from datetime import datetime, timedelta
 import logging
 from typing import Dict, List, Optional, Tuple
 import os
+import sys
 from dotenv import load_dotenv
 
+# Raiz do projeto no path para o código compartilhado (comum/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum import gravacao, limitador, metricas
+
 # ========== CARREGAR VARIÁVEIS DO .env ==========
 load_dotenv()
 
@@ -14,7 +19,8 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 AUTH_TOKEN = os.getenv("AUTH_TOKEN")
-API_BASE_URL = "https://assinante.nmultifibra.com.br/webservice/v1"
+API_BASE_URL = os.getenv("IXC_BASE_URL", "https://assinante.nmultifibra.com.br/webservice/v1")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
 
 if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID or not AUTH_TOKEN:
     """ print("ERRO: Variáveis de ambiente não carregadas corretamente!") """
@@ -55,6 +61,15 @@ logging.basicConfig(
     ]
 )
 
+# Gravação/reprodução do tráfego HTTP para testes offline (ALERTAS_GRAVACAO)
+gravacao.instalar_de_ambiente()
+
+# Métricas no formato do Prometheus em METRICAS_PORTA (desligadas sem a variável)
+metricas.instalar_de_ambiente()
+
+# Limite adaptativo de requisições simultâneas ao IXC, comum a todo o processo (IXC_LIMITADOR=0 desliga)
+limitador.instalar_de_ambiente()
+
 class ClienteMonitor:
     def __init__(self):
         self.sessao = requests.Session()
@@ -158,7 +173,7 @@ class ClienteMonitor:
     def enviar_telegram(self, mensagem: str):
         """Envia mensagem para o Telegram"""
         try:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+            url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
             payload = {
                 "chat_id": TELEGRAM_CHAT_ID,
                 "text": mensagem,
@@ -167,12 +182,15 @@ class ClienteMonitor:
             response = requests.post(url, json=payload, timeout=10)
             if response.status_code == 200:
                 logging.info("Mensagem enviada ao Telegram com sucesso!")
+                metricas.ALERTAS.inc(canal="telegram", resultado="enviado")
                 return True
             else:
                 logging.error(f"Erro ao enviar Telegram: {response.text}")
+                metricas.ALERTAS.inc(canal="telegram", resultado="falha")
                 return False
         except Exception as e:
             logging.error(f"Erro ao enviar mensagem Telegram: {e}")
+            metricas.ALERTAS.inc(canal="telegram", resultado="falha")
             return False
     
     def deve_enviar_alerta_offline(self, cliente_id: str) -> bool:
@@ -323,10 +341,12 @@ class ClienteMonitor:
         logging.info("INICIANDO CICLO DE MONITORAMENTO")
         logging.info("=" * 60)
         
-        for cliente in CLIENTES:
+        for restantes, cliente in enumerate(CLIENTES, 1):
+            metricas.FILA.definir(len(CLIENTES) - restantes, fila="clientes_pendentes")
             try:
                 logging.info(f"Processando cliente: {cliente['id']} - {cliente['razao']}")
-                self.processar_cliente(cliente)
+                with metricas.CICLO_DURACAO.cronometrar(etapa="processar_cliente"):
+                    self.processar_cliente(cliente)
                 time.sleep(1)  # Pausa curta entre requisições
             except Exception as e:
                 logging.error(f"Erro ao processar cliente {cliente['id']}: {e}")
@@ -351,7 +371,9 @@ class ClienteMonitor:
         
         while True:
             try:
-                self.monitorar_clientes()
+                with metricas.CICLO_DURACAO.cronometrar(etapa="total"):
+                    self.monitorar_clientes()
+                metricas.CICLOS.inc(resultado="ok")
                 # Aguarda 10 minutos para próxima verificação
                 logging.info("Aguardando 10 minutos para próxima verificação...")
                 time.sleep(600)  # 600 segundos = 10 minutos
@@ -359,6 +381,7 @@ class ClienteMonitor:
                 logging.info("Monitoramento interrompido pelo usuário.")
                 break
             except Exception as e:
+                metricas.CICLOS.inc(resultado="erro")
                 logging.error(f"Erro no loop principal: {e}")
                 time.sleep(60)  # Espera 1 minuto em caso de erro
 
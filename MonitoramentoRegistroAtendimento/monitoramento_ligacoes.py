@@ -5,7 +5,17 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
 import re
-import time
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Raiz do projeto no path para o código compartilhado (comum/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum import agendador, gravacao, limitador, memo, metricas, perfil, resiliencia
+from comum.fila_atraso import FilaAtraso
+from comum.processados import RegistroProcessados
+from comum.registros import Ligacao, Ticket
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -17,6 +27,7 @@ IXC_TOKEN_API = os.getenv('IXC_TOKEN_API')
 IXC_HOST_API = os.getenv('IXC_HOST_API')
 ESCALLO_HOST = os.getenv('ESCALLO_HOST')
 ESCALLO_TOKEN = os.getenv('ESCALLO_TOKEN')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
 
 # Configurações WhatsApp
 WHATSAPP_SERVICE_URL = os.getenv('WHATSAPP_SERVICE_URL', 'http://localhost:7575')
@@ -33,6 +44,38 @@ logging.basicConfig(
     ]
 )
 
+# Log retido por thread: as ligações verificadas em paralelo mandam o log para a
+# lista da thread, e o ciclo o emite em bloco, na ordem das ligações. O filtro fica nos
+# handlers da raiz (e não no logger), para reter também o que vem propagado de outros
+# loggers, como alertas.resiliencia e alertas.limitador
+_LOG_RETIDO = threading.local()
+
+class _ReterLog(logging.Filter):
+    def filter(self, record):
+        retidos = getattr(_LOG_RETIDO, "registros", None)
+        if retidos is None:
+            return True
+        # Com mais de um handler, o mesmo registro passa por aqui uma vez em cada
+        if not retidos or retidos[-1] is not record:
+            retidos.append(record)
+        return False
+
+_reter_log = _ReterLog()
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(_reter_log)
+
+# Gravação/reprodução do tráfego HTTP para testes offline (ALERTAS_GRAVACAO)
+gravacao.instalar_de_ambiente()
+
+# Métricas no formato do Prometheus em METRICAS_PORTA (desligadas sem a variável)
+metricas.instalar_de_ambiente()
+
+# Limite adaptativo de requisições simultâneas ao IXC, comum a todo o processo (IXC_LIMITADOR=0 desliga)
+limitador.instalar_de_ambiente()
+
+# Perfil do próximo ciclo com PERFIL_PROXIMO_CICLO=1 ou kill -USR1
+perfil.instalar_de_ambiente()
+
 # Lista de atendentes para filtrar
 ATENDENTES_FILTRO = [
     "4002", "4004", "4006", "4008", "4009", "4021", "4025", "4027",
@@ -94,6 +137,31 @@ ATENDIMENTOS_AUTOMATICOS_IDS = [324, 533, 679, 323, 322, 321, 329, 326, 435, 532
 # Arquivo para controlar última execução
 LAST_EXECUTION_FILE = "ultima_execucao.txt"
 
+# Busca as ligações desde alguns minutos antes da última execução: as que já foram
+# tratadas estão no registro de processadas e não geram trabalho nem alerta de novo
+SOBREPOSICAO_MINUTOS = 5
+
+# Ids das ligações já verificadas, por dia do fim da ligação (persistido; sobrevive a
+# quedas e reinícios)
+REGISTRO_LIGACOES = RegistroProcessados("ligacoes_processadas.json",
+                                        dias=int(os.getenv("LIGACOES_REGISTRO_DIAS", "3")))
+
+# Ligações aguardando a carência (o atendente pode registrar o atendimento logo após
+# desligar): cada uma é verificada uma vez, no primeiro ciclo após fim + carência
+CARENCIA_MINUTOS = float(os.getenv("LIGACOES_CARENCIA_MINUTOS", "10"))
+ARQUIVO_FILA = "fila_ligacoes.json"
+FILA_LIGACOES = FilaAtraso(ARQUIVO_FILA)
+FORMATO_DATA = '%Y-%m-%d %H:%M:%S'
+
+# Ligações cuja verificação ou alerta falhou LIGACOES_MAX_TENTATIVAS vezes, ou que já
+# passaram da retenção do registro, saem da fila e vão para ARQUIVO_DESCARTADAS
+LIGACOES_MAX_TENTATIVAS = int(os.getenv("LIGACOES_MAX_TENTATIVAS", "10"))
+ARQUIVO_DESCARTADAS = "ligacoes_descartadas.jsonl"
+
+# Ligações verificadas ao mesmo tempo (teto; as requisições simultâneas ao IXC são
+# dosadas pelo limitador adaptativo); os alertas saem na ordem das ligações
+LIGACOES_PARALELAS = int(os.getenv("LIGACOES_PARALELAS", "16"))
+
 def obter_ultima_data_hora():
     """Obtém a última data/hora de execução do arquivo"""
     try:
@@ -109,10 +177,10 @@ def obter_ultima_data_hora():
     hoje = datetime.now().strftime('%Y-%m-%d')
     return datetime.strptime(f"{hoje} 00:00:00", '%Y-%m-%d %H:%M:%S')
 
-def salvar_ultima_data_hora():
-    """Salva a data/hora atual como última execução"""
+def salvar_ultima_data_hora(data_hora=None):
+    """Salva a data/hora informada (padrão: agora) como última execução"""
     try:
-        data_atual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        data_atual = (data_hora or datetime.now()).strftime('%Y-%m-%d %H:%M:%S')
         with open(LAST_EXECUTION_FILE, 'w', encoding='utf-8') as f:
             f.write(data_atual)
         logging.info(f"Última execução salva: {data_atual}")
@@ -157,6 +225,25 @@ def formatar_telefone_para_ixc(numero):
     else:
         return numero_limpo
 
+# Padrões que citam o telefone do cliente na mensagem dos atendimentos automáticos
+PADROES_TELEFONE = [
+    re.compile(r'Telefone de contato:\s*(\d{10,11})', re.IGNORECASE),
+    re.compile(r'telefone:\s*(\d{10,11})', re.IGNORECASE),
+    re.compile(r'Contato realizado através do telefone:\s*(\d{10,11})', re.IGNORECASE)
+]
+
+def telefones_da_mensagem(mensagem):
+    """Extrai os telefones (sem o zero inicial) citados na mensagem de um atendimento"""
+    telefones = []
+    for padrao in PADROES_TELEFONE:
+        match = padrao.search(mensagem)
+        if match:
+            telefone = match.group(1)
+            if telefone.startswith('0'):
+                telefone = telefone[1:]
+            telefones.append(telefone)
+    return telefones
+
 def extrair_ramal(destino):
     """Extraí o ramal da string de destino"""
     try:
@@ -177,7 +264,7 @@ def extrair_ramal(destino):
 
 def obter_ligacoes_desde_ultima_execucao():
     """Obtém as ligações desde a última execução"""
-    ultima_execucao = obter_ultima_data_hora()
+    ultima_execucao = obter_ultima_data_hora() - timedelta(minutes=SOBREPOSICAO_MINUTOS)
     data_hoje = datetime.now().strftime('%Y-%m-%d')
     
     # Se a última execução foi ontem, começar do início do dia atual
@@ -204,7 +291,7 @@ def obter_ligacoes_desde_ultima_execucao():
     
     try:
         logging.info(f"Buscando ligações desde: {data_inicial} {horario_inicial}")
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = resiliencia.requisitar("POST", url, headers=headers, json=data, timeout=30)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -219,19 +306,31 @@ def get_ixc_headers():
         "ixcsoft": "listar"
     }
 
-def buscar_cliente_por_atendimentos_automaticos(telefone):
-    """Busca cliente pelos atendimentos automáticos do dia (primeira opção)"""
-    hoje = datetime.now().strftime('%Y-%m-%d')
-    telefone_limpo = ''.join(filter(str.isdigit, str(telefone)))
-    if telefone_limpo.startswith('0'):
-        telefone_limpo = telefone_limpo[1:]
-    
-    clientes_encontrados = []
+def consultar_ixc(tabela, data):
+    """Resposta JSON de uma listagem do IXC, ou None se não for 200 ou não for JSON.
+
+    Memorizada no ciclo por tabela + payload: consultas repetidas (o mesmo cliente em
+    várias ligações) saem da memória e as simultâneas esperam uma única requisição.
+    O resultado é compartilhado e não deve ser alterado"""
+    def consultar():
+        url = f"{IXC_HOST_API}/{tabela}"
+        response = resiliencia.requisitar("POST", url, headers=get_ixc_headers(), json=data, timeout=30)
+        if response.status_code != 200:
+            logging.error(f"        Erro na resposta da API ({tabela}): {response.status_code}")
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            logging.error(f"        Erro ao decodificar JSON ({tabela})")
+            return None
+    return memo.memorizar(memo.chave(tabela, data), consultar)
+
+def indexar_atendimentos_automaticos():
+    """Telefone citado -> [(dia de criação, id do cliente)] dos atendimentos automáticos.
+    Uma consulta por assunto serve a todas as ligações verificadas no ciclo"""
+    indice = {}
     
     for id_assunto in ATENDIMENTOS_AUTOMATICOS_IDS:
-        url = f"{IXC_HOST_API}/su_ticket"
-        headers = get_ixc_headers()
-        
         data = {
             "qtype": "id_assunto",
             "query": str(id_assunto),
@@ -241,78 +340,54 @@ def buscar_cliente_por_atendimentos_automaticos(telefone):
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data, timeout=30)
-            
-            if response.status_code != 200:
-                continue
-            
-            try:
-                dados = response.json()
-            except:
+            dados = consultar_ixc("su_ticket", data)
+            if dados is None:
                 continue
             
-            total = dados.get("total")
-            if total is not None:
-                if isinstance(total, str):
-                    try:
-                        total_int = int(total)
-                    except ValueError:
-                        total_int = 0
-                else:
-                    total_int = int(total) if total else 0
-                
-                if total_int > 0:
-                    for atendimento in dados.get("registros", []):
-                        # Verificar se o atendimento é do dia atual
-                        data_criacao_str = atendimento.get("data_criacao", "")
-                        if not data_criacao_str or data_criacao_str == "0000-00-00 00:00:00":
-                            continue
-                        
-                        try:
-                            data_criacao = datetime.strptime(data_criacao_str, '%Y-%m-%d %H:%M:%S')
-                            if data_criacao.strftime('%Y-%m-%d') != hoje:
-                                continue
-                        except:
-                            continue
-                        
-                        # Extrair telefone da mensagem
-                        mensagem = atendimento.get("menssagem", "")
-                        
-                        # Padrões para extrair telefone
-                        padroes = [
-                            r'Telefone de contato:\s*(\d{10,11})',
-                            r'telefone:\s*(\d{10,11})',
-                            r'Contato realizado através do telefone:\s*(\d{10,11})'
-                        ]
-                        
-                        for padrao in padroes:
-                            match = re.search(padrao, mensagem, re.IGNORECASE)
-                            if match:
-                                telefone_atendimento = match.group(1)
-                                telefone_atendimento_limpo = ''.join(filter(str.isdigit, str(telefone_atendimento)))
-                                
-                                if telefone_atendimento_limpo.startswith('0'):
-                                    telefone_atendimento_limpo = telefone_atendimento_limpo[1:]
-                                
-                                # Comparar telefones
-                                if telefone_atendimento_limpo == telefone_limpo:
-                                    id_cliente = atendimento.get("id_cliente")
-                                    if id_cliente and id_cliente != "0":
-                                        # Buscar informações completas do cliente
-                                        cliente_completo = obter_cliente_por_id(id_cliente)
-                                        if cliente_completo and cliente_completo.get("ativo") == "S":
-                                            # Adicionar telefone formatado
-                                            cliente_completo["telefone"] = formatar_telefone_para_ixc(telefone)
-                                            cliente_completo["telefone_original"] = telefone
-                                            
-                                            if cliente_completo not in clientes_encontrados:
-                                                clientes_encontrados.append(cliente_completo)
-                                        elif cliente_completo:
-                                            logging.info(f"        Cliente {id_cliente} encontrado mas está INATIVO (ativo: {cliente_completo.get('ativo')})")
+            for registro in dados.get("registros") or []:
+                atendimento = Ticket.de_registro(registro)
+                id_cliente = atendimento.id_cliente
+                if atendimento.data_criacao is None or not id_cliente or id_cliente == "0":
+                    continue
+                # Cada telefone citado uma vez por atendimento
+                for telefone in dict.fromkeys(telefones_da_mensagem(atendimento.mensagem)):
+                    indice.setdefault(telefone, []).append((atendimento.data_criacao.date(), id_cliente))
+        except resiliencia.FalhaRequisicao:
+            raise
         except Exception as e:
             logging.error(f"Erro ao buscar atendimento automático ID {id_assunto}: {e}")
             continue
     
+    return indice
+
+def buscar_cliente_por_atendimentos_automaticos(telefone, indice=None, dia=None):
+    """Busca cliente pelos atendimentos automáticos do dia da ligação (primeira opção)"""
+    if indice is None:
+        indice = indexar_atendimentos_automaticos()
+    dia = dia or datetime.now().date()
+    telefone_limpo = ''.join(filter(str.isdigit, str(telefone)))
+    if telefone_limpo.startswith('0'):
+        telefone_limpo = telefone_limpo[1:]
+    
+    clientes_encontrados = []
+    
+    for data_criacao, id_cliente in indice.get(telefone_limpo, []):
+        # Verificar se o atendimento é do dia da ligação
+        if data_criacao != dia:
+            continue
+        
+        # Buscar informações completas do cliente
+        cliente_completo = obter_cliente_por_id(id_cliente)
+        if cliente_completo and cliente_completo.get("ativo") == "S":
+            # Adicionar telefone formatado
+            cliente_completo["telefone"] = formatar_telefone_para_ixc(telefone)
+            cliente_completo["telefone_original"] = telefone
+                    
+            if cliente_completo not in clientes_encontrados:
+                clientes_encontrados.append(cliente_completo)
+        elif cliente_completo:
+            logging.info(f"        Cliente {id_cliente} encontrado mas está INATIVO (ativo: {cliente_completo.get('ativo')})")
+    
     # Remover duplicados por ID
     clientes_unicos = []
     ids_vistos = set()
@@ -326,9 +401,6 @@ def buscar_cliente_por_atendimentos_automaticos(telefone):
 
 def obter_cliente_por_id(id_cliente):
     """Obtém informações do cliente pelo ID"""
-    url = f"{IXC_HOST_API}/cliente"
-    headers = get_ixc_headers()
-    
     data = {
         "qtype": "id",
         "query": str(id_cliente),
@@ -338,14 +410,8 @@ def obter_cliente_por_id(id_cliente):
     }
     
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        
-        if response.status_code != 200:
-            return None
-        
-        try:
-            dados = response.json()
-        except:
+        dados = consultar_ixc("cliente", data)
+        if dados is None:
             return None
         
         total = dados.get("total")
@@ -365,6 +431,8 @@ def obter_cliente_por_id(id_cliente):
                     "nome": cliente.get("razao") or cliente.get("fantasia") or "Nome não disponível",
                     "ativo": cliente.get("ativo", "N")
                 }
+    except resiliencia.FalhaRequisicao:
+        raise
     except Exception:
         pass
     
@@ -378,9 +446,6 @@ def buscar_cliente_ixc(telefone):
     clientes_encontrados = []
     
     for campo in campos:
-        url = f"{IXC_HOST_API}/cliente"
-        headers = get_ixc_headers()
-        
         data = {
             "qtype": campo,
             "query": telefone_formatado,
@@ -390,14 +455,8 @@ def buscar_cliente_ixc(telefone):
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data, timeout=30)
-            
-            if response.status_code != 200:
-                continue
-            
-            try:
-                dados = response.json()
-            except:
+            dados = consultar_ixc("cliente", data)
+            if dados is None:
                 continue
             
             total = dados.get("total")
@@ -425,6 +484,8 @@ def buscar_cliente_ixc(telefone):
                         }
                         if cliente_info["id"] and cliente_info not in clientes_encontrados:
                             clientes_encontrados.append(cliente_info)
+        except resiliencia.FalhaRequisicao:
+            raise
         except Exception:
             continue
     
@@ -439,7 +500,7 @@ def buscar_cliente_ixc(telefone):
     
     return clientes_unicos
 
-def buscar_cliente_por_telefone(telefone):
+def buscar_cliente_por_telefone(telefone, indice=None, dia=None):
     """Busca cliente usando as duas estratégias: primeiro atendimentos automáticos, depois busca direta"""
     # VALIDAÇÃO: Verificar se o telefone é válido
     if not validar_telefone(telefone):
@@ -449,7 +510,7 @@ def buscar_cliente_por_telefone(telefone):
     logging.info(f"  Buscando cliente para telefone: {telefone}")
     
     # PRIMEIRA OPÇÃO: Buscar pelos atendimentos automáticos do dia
-    clientes = buscar_cliente_por_atendimentos_automaticos(telefone)
+    clientes = buscar_cliente_por_atendimentos_automaticos(telefone, indice, dia)
     
     if clientes:
         logging.info(f"  ✓ Cliente encontrado via atendimentos automáticos: {len(clientes)}")
@@ -462,17 +523,9 @@ def buscar_cliente_por_telefone(telefone):
     return clientes
 
 def verificar_atendimento_existente(id_cliente, data_ligacao, id_responsavel):
-    """Verifica se existe algum atendimento para o cliente criado no dia atual"""
+    """Verifica se existe algum atendimento para o cliente criado no dia da ligação (datetime)"""
     try:
-        data_ligacao_dt = datetime.strptime(data_ligacao, '%Y-%m-%d %H:%M:%S')
-        data_hoje = data_ligacao_dt.strftime('%Y-%m-%d')
-        
-        # Definir intervalo do dia: 00:00:00 até 23:59:59
-        inicio_dia = f"{data_hoje} 00:00:00"
-        fim_dia = f"{data_hoje} 23:59:59"
-        
-        url = f"{IXC_HOST_API}/su_ticket"
-        headers = get_ixc_headers()
+        dia_ligacao = data_ligacao.date()
         
         # Buscar atendimentos do dia para o cliente
         data = {
@@ -483,16 +536,8 @@ def verificar_atendimento_existente(id_cliente, data_ligacao, id_responsavel):
             "rp": "100"
         }
         
-        response = requests.post(url, headers=headers, json=data, timeout=30)
-        
-        if response.status_code != 200:
-            logging.error(f"        Erro na resposta da API: {response.status_code}")
-            return False
-        
-        try:
-            dados = response.json()
-        except:
-            logging.error(f"        Erro ao decodificar JSON")
+        dados = consultar_ixc("su_ticket", data)
+        if dados is None:
             return False
         
         total = dados.get("total")
@@ -508,43 +553,34 @@ def verificar_atendimento_existente(id_cliente, data_ligacao, id_responsavel):
             if total_int > 0:
                 logging.info(f"        Encontrados {total_int} atendimentos para o cliente")
                 
-                for atendimento in dados.get("registros", []):
-                    data_criacao_str = atendimento.get("data_criacao", "")
+                for registro in dados.get("registros", []):
+                    atendimento = Ticket.de_registro(registro)
                     
                     # Pular se a data de criação for inválida
-                    if not data_criacao_str or data_criacao_str == "0000-00-00 00:00:00":
+                    if atendimento.data_criacao is None:
                         continue
                     
-                    try:
-                        # Verificar se o atendimento foi criado no dia atual
-                        data_criacao = datetime.strptime(data_criacao_str, '%Y-%m-%d %H:%M:%S')
+                    # Verificar se o atendimento foi criado no dia da ligação
+                    if atendimento.data_criacao.date() == dia_ligacao:
+                        id_resp_tec = atendimento.id_responsavel_tecnico
                         
-                        # Criar datas de início e fim do dia para comparação
-                        inicio_dia_dt = datetime.strptime(inicio_dia, '%Y-%m-%d %H:%M:%S')
-                        fim_dia_dt = datetime.strptime(fim_dia, '%Y-%m-%d %H:%M:%S')
+                        # Registrar informação do atendimento encontrado
+                        logging.info(f"        Atendimento ID {atendimento.id} criado em {atendimento.data_criacao} por ID {id_resp_tec}")
                         
-                        # Verificar se o atendimento foi criado no dia atual
-                        if inicio_dia_dt <= data_criacao <= fim_dia_dt:
-                            id_resp_tec = str(atendimento.get("id_responsavel_tecnico", ""))
-                            
-                            # Registrar informação do atendimento encontrado
-                            logging.info(f"        Atendimento ID {atendimento.get('id')} criado em {data_criacao_str} por ID {id_resp_tec}")
-                            
-                            # Verificar se foi criado pelo mesmo responsável
-                            if id_resp_tec == id_responsavel:
-                                logging.info(f"        ✓ Atendimento do mesmo responsável encontrado para hoje!")
-                                return True
-                            else:
-                                logging.info(f"        ⚠ Atendimento encontrado, mas de outro responsável (ID: {id_resp_tec})")
+                        # Verificar se foi criado pelo mesmo responsável
+                        if id_resp_tec == id_responsavel:
+                            logging.info(f"        ✓ Atendimento do mesmo responsável encontrado para hoje!")
+                            return True
                         else:
-                            logging.debug(f"        Atendimento fora do dia atual: {data_criacao_str}")
-                    except Exception as e:
-                        logging.error(f"        Erro ao processar data {data_criacao_str}: {e}")
-                        continue
+                            logging.info(f"        ⚠ Atendimento encontrado, mas de outro responsável (ID: {id_resp_tec})")
+                    else:
+                        logging.debug(f"        Atendimento fora do dia atual: {atendimento.data_criacao}")
         
         logging.info(f"        Nenhum atendimento encontrado para hoje")
         return False
         
+    except resiliencia.FalhaRequisicao:
+        raise
     except Exception as e:
         logging.error(f"      Erro ao verificar atendimento: {e}")
         return False
@@ -577,7 +613,7 @@ def enviar_alerta_telegram(atendente, clientes, data_hora_ligacao, telefone):
         logging.error("Token ou Chat ID do Telegram não configurado")
         return False
     
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     mensagem = criar_mensagem_alerta(atendente, clientes, data_hora_ligacao, telefone)
     
     data = {
@@ -587,12 +623,14 @@ def enviar_alerta_telegram(atendente, clientes, data_hora_ligacao, telefone):
     }
     
     try:
-        response = requests.post(url, json=data, timeout=30)
+        response = resiliencia.requisitar("POST", url, json=data, timeout=30)
         response.raise_for_status()
         logging.info(f"  ✅ Telegram: Alerta enviado")
+        metricas.ALERTAS.inc(canal="telegram", resultado="enviado")
         return True
     except Exception as e:
         logging.error(f"  ❌ Erro ao enviar alerta para o Telegram: {e}")
+        metricas.ALERTAS.inc(canal="telegram", resultado="falha")
         return False
 
 def enviar_alerta_whatsapp(atendente, clientes, data_hora_ligacao, telefone, ramal):
@@ -624,6 +662,12 @@ def enviar_alerta_whatsapp(atendente, clientes, data_hora_ligacao, telefone, ram
     
     mensagem = criar_mensagem_alerta(atendente, clientes, data_hora_ligacao, telefone)
     
+    sucesso = enviar_mensagem_whatsapp(grupo_id, grupo_nome, mensagem)
+    metricas.ALERTAS.inc(canal="whatsapp", resultado="enviado" if sucesso else "falha")
+    return sucesso
+
+def enviar_mensagem_whatsapp(grupo_id, grupo_nome, mensagem):
+    """Confere a saúde do serviço de WhatsApp e envia a mensagem ao grupo"""
     logging.info(f"  📤 Tentando enviar para WhatsApp - Grupo {grupo_nome}")
     
     # Testar se o serviço está rodando
@@ -690,7 +734,7 @@ def testar_autenticacao_ixc():
     }
     
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=30)
+        response = resiliencia.requisitar("POST", url, headers=headers, json=data, timeout=30)
         
         if response.status_code == 200:
             try:
@@ -710,40 +754,16 @@ def testar_autenticacao_ixc():
         logging.error(f"✗ Erro ao testar autenticação IXC: {e}")
         return False
 
-def processar_ligacoes():
-    """Processa todas as ligações desde a última execução"""
-    logging.info("=" * 60)
-    logging.info(f"EXECUÇÃO: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    logging.info("=" * 60)
-    
-    # Testa autenticação primeiro
-    if not testar_autenticacao_ixc():
-        logging.error("Não é possível continuar devido a falha na autenticação.")
-        return
-    
-    # Obtém ligações desde a última execução
-    dados_ligacoes = obter_ligacoes_desde_ultima_execucao()
-    
-    if not dados_ligacoes or dados_ligacoes.get("code") != 200:
-        logging.error("Não foi possível obter ligações do Escallo")
-        return
-    
-    registros = dados_ligacoes.get("data", {}).get("registros", [])
-    logging.info(f"Novas ligações encontradas: {len(registros)}")
-    
-    if len(registros) == 0:
-        logging.info("Nenhuma nova ligação desde a última execução.")
-        # Salva o horário atual mesmo sem novas ligações
-        salvar_ultima_data_hora()
-        return
-    
+def filtrar_ligacoes(registros):
+    """Ligações atendidas pelos ramais monitorados, fora das filas de técnicos"""
     # Filtra ligações dos atendentes específicos, ignorando a fila "Suporte - Técnicos"
     ligacoes_filtradas = []
     
-    for ligacao in registros:
-        status = ligacao.get("filaAtendimentoLigacao.statusFormatado", "")
-        destino = ligacao.get("filaAtendimentoLigacao.destino", "")
-        fila_nome = ligacao.get("telefoniaFilaAtendimento.nome", "")
+    for registro in registros:
+        ligacao = Ligacao.de_registro(registro)
+        status = ligacao.status
+        destino = ligacao.destino
+        fila_nome = ligacao.fila_nome
         
         # Ignorar ligações da fila "Suporte - Técnicos"
         if fila_nome == "Suporte - Técnicos":
@@ -762,61 +782,86 @@ def processar_ligacoes():
         
         if ramal and ramal in ATENDENTES_FILTRO:
             # Usando dataHoraFinal
-            data_hora_final = ligacao.get("filaAtendimentoLigacao.dataHoraFinal")
+            data_hora_final = ligacao.data_hora_final
             
             if not data_hora_final:
                 continue
             
             ligacoes_filtradas.append({
-                "id": ligacao.get("filaAtendimentoLigacao.id"),
+                "id": ligacao.id,
                 "ramal": ramal,
                 "nome_atendente": RAMAL_NOME_MAP.get(ramal, "Desconhecido"),
-                "origem": ligacao.get("filaAtendimentoLigacao.origem"),
+                "origem": ligacao.origem,
                 "data_hora_final": data_hora_final,
                 "destino": destino,
                 "fila_nome": fila_nome
             })
     
-    logging.info(f"Ligações filtradas dos atendentes: {len(ligacoes_filtradas)}")
+    return ligacoes_filtradas
+
+def verificar_ligacao(ligacao, indice=None):
+    """Clientes da ligação a alertar (sem atendimento registrado); lista vazia se não
+    há o que alertar. indice: atendimentos automáticos do ciclo. Só consulta o IXC,
+    então pode rodar em paralelo com outras ligações"""
+    logging.info(f"\nProcessando ligação ID: {ligacao['id']}")
+    logging.info(f"Atendente: {ligacao['nome_atendente']}")
+    logging.info(f"Número: {ligacao['origem']}")
+    logging.info(f"Data/hora final da ligação: {ligacao['data_hora_final']}")
+    logging.info(f"Fila: {ligacao['fila_nome']}")
     
-    # Processa cada ligação filtrada
-    for ligacao in ligacoes_filtradas:
-        logging.info(f"\nProcessando ligação ID: {ligacao['id']}")
-        logging.info(f"Atendente: {ligacao['nome_atendente']}")
-        logging.info(f"Número: {ligacao['origem']}")
-        logging.info(f"Data/hora final da ligação: {ligacao['data_hora_final']}")
-        logging.info(f"Fila: {ligacao['fila_nome']}")
-        
-        # Busca cliente no IXC (usando as duas estratégias)
-        clientes = buscar_cliente_por_telefone(ligacao['origem'])
-        
-        if not clientes:
-            logging.info(f"  ✗ Nenhum cliente ATIVO encontrado no IXC para este telefone")
-            continue
-        
-        logging.info(f"  ✓ Clientes ATIVOS encontrados: {len(clientes)}")
-        
-        # Obtém o ID do responsável a partir do ramal
-        id_responsavel = RAMAL_RESPONSAVEL_MAP.get(ligacao['ramal'])
-        
-        if not id_responsavel:
-            logging.warning(f"  ID do responsável não encontrado para o ramal {ligacao['ramal']}")
-            continue
-        
-        logging.info(f"  ID do responsável mapeado: {id_responsavel}")
-        
-        # Verifica se já existe atendimento para algum dos clientes
-        algum_atendimento_registrado = False
-        
-        for cliente in clientes:
-            logging.info(f"    Verificando cliente: {cliente['nome']} (ID: {cliente['id']})")
-            
-            if verificar_atendimento_existente(cliente['id'], ligacao['data_hora_final'], id_responsavel):
-                logging.info(f"    ✓ Atendimento registrado encontrado para este cliente")
-                algum_atendimento_registrado = True
-                break
+    # Busca cliente no IXC (usando as duas estratégias)
+    with perfil.etapa("enriquecer"):
+        clientes = buscar_cliente_por_telefone(ligacao['origem'], indice, ligacao['data_hora_final'].date())
+    
+    if not clientes:
+        logging.info(f"  ✗ Nenhum cliente ATIVO encontrado no IXC para este telefone")
+        return []
+    
+    logging.info(f"  ✓ Clientes ATIVOS encontrados: {len(clientes)}")
+    
+    # Obtém o ID do responsável a partir do ramal
+    id_responsavel = RAMAL_RESPONSAVEL_MAP.get(ligacao['ramal'])
+    
+    if not id_responsavel:
+        logging.warning(f"  ID do responsável não encontrado para o ramal {ligacao['ramal']}")
+        return []
+    
+    logging.info(f"  ID do responsável mapeado: {id_responsavel}")
+    
+    # Verifica se já existe atendimento para algum dos clientes
+    algum_atendimento_registrado = False
+    
+    for cliente in clientes:
+        logging.info(f"    Verificando cliente: {cliente['nome']} (ID: {cliente['id']})")
         
-        if not algum_atendimento_registrado:
+        with perfil.etapa("analisar"):
+            registrado = verificar_atendimento_existente(cliente['id'], ligacao['data_hora_final'], id_responsavel)
+        if registrado:
+            logging.info(f"    ✓ Atendimento registrado encontrado para este cliente")
+            algum_atendimento_registrado = True
+            break
+    
+    if algum_atendimento_registrado:
+        logging.info(f"  ✓ Atendimento encontrado - Sem alerta")
+        return []
+    return clientes
+
+def verificar_ligacao_em_bloco(ligacao, indice=None):
+    """verificar_ligacao para as threads de trabalho: nunca lança, e devolve
+    (clientes, exceção, registros de log retidos) para o ciclo emitir em ordem"""
+    registros = _LOG_RETIDO.registros = []
+    try:
+        return verificar_ligacao(ligacao, indice), None, registros
+    except Exception as e:
+        return None, e, registros
+    finally:
+        _LOG_RETIDO.registros = None
+
+def alertar_ligacao(ligacao, clientes):
+    """Envia o alerta de falta de registro; retorna False se não foi entregue em nenhum canal"""
+    if clientes:
+        perfil.contar("alertas")
+        with perfil.etapa("enviar"):
             # Envia alerta para o Telegram
             sucesso_telegram = enviar_alerta_telegram(
                 ligacao['nome_atendente'],
@@ -833,16 +878,183 @@ def processar_ligacoes():
                 clientes[0]['telefone'],
                 ligacao['ramal']
             )
-            
-            if sucesso_telegram or sucesso_whatsapp:
-                logging.info(f"  ✓ Alerta(s) enviado(s) com sucesso")
-            else:
-                logging.error(f"  ✗ Falha ao enviar alertas")
+        
+        if sucesso_telegram or sucesso_whatsapp:
+            logging.info(f"  ✓ Alerta(s) da ligação {ligacao['id']} enviado(s) com sucesso")
         else:
-            logging.info(f"  ✓ Atendimento encontrado - Sem alerta")
+            logging.error(f"  ✗ Falha ao enviar alertas da ligação {ligacao['id']}")
+            return False
+    return True
+
+def ligacao_para_fila(ligacao):
+    return dict(ligacao, data_hora_final=ligacao['data_hora_final'].strftime(FORMATO_DATA))
+
+def ligacao_da_fila(item):
+    return dict(item, data_hora_final=datetime.strptime(item['data_hora_final'], FORMATO_DATA))
+
+def devolver_a_fila(id_ligacao, vencimento, item, falhou=True):
+    """Volta a ligação para a fila com o mesmo vencimento, contando a tentativa se ela
+    falhou. Retorna False se ela foi descartada (limite de tentativas ou retenção)"""
+    tentativas = item.get("tentativas", 0) + (1 if falhou else 0)
+    expirada = (datetime.now() - datetime.strptime(item['data_hora_final'], FORMATO_DATA)
+                > timedelta(days=REGISTRO_LIGACOES.dias))
+    if tentativas >= LIGACOES_MAX_TENTATIVAS or expirada:
+        motivo = "fora da retenção do registro" if expirada else f"após {tentativas} tentativas"
+        logging.error(f"  ✗ Ligação {id_ligacao} descartada ({motivo}); gravada em {ARQUIVO_DESCARTADAS}")
+        with open(ARQUIVO_DESCARTADAS, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"chave": id_ligacao, "vencimento": vencimento.isoformat(),
+                                "motivo": motivo, "item": item}, ensure_ascii=False) + "\n")
+        perfil.contar("descartadas")
+        return False
+    FILA_LIGACOES.adicionar(id_ligacao, vencimento, dict(item, tentativas=tentativas))
+    return True
+
+def enfileirar_ligacoes(ligacoes):
+    """Põe as ligações na fila com vencimento no fim + carência; retorna quantas entraram"""
+    novas = 0
+    for ligacao in ligacoes:
+        if REGISTRO_LIGACOES.contem(ligacao['id'], ligacao['data_hora_final'].date()):
+            continue
+        vencimento = ligacao['data_hora_final'] + timedelta(minutes=CARENCIA_MINUTOS)
+        if FILA_LIGACOES.adicionar(ligacao['id'], vencimento, ligacao_para_fila(ligacao)):
+            novas += 1
+    return novas
+
+@perfil.medir_ciclo("monitoramento_ligacoes")
+@memo.por_ciclo
+def processar_ligacoes(orcamento=None):
+    """Enfileira as ligações novas e verifica as que já passaram da carência.
+
+    As ligações vencidas são verificadas das mais antigas (mais perto do prazo de
+    registro) para as mais recentes, com os atendimentos automáticos consultados uma
+    vez para todas. Se alguma não puder ser verificada (falha persistente da API),
+    nenhum alerta dela for entregue ou o orçamento do ciclo acabar antes dela, ela
+    volta para a fila e o ciclo é parcial. A última execução avança assim que as
+    ligações novas estão gravadas na fila."""
+    inicio = datetime.now()
+    logging.info("=" * 60)
+    logging.info(f"EXECUÇÃO: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logging.info("=" * 60)
     
-    # Salva o horário atual como última execução
-    salvar_ultima_data_hora()
+    # Testa autenticação primeiro
+    with perfil.etapa("autenticar"):
+        autenticado = testar_autenticacao_ixc()
+    if not autenticado:
+        logging.error("Não é possível continuar devido a falha na autenticação.")
+        perfil.marcar_resultado("falha")
+        return
+    
+    # Obtém ligações desde a última execução
+    with perfil.etapa("buscar"):
+        dados_ligacoes = obter_ligacoes_desde_ultima_execucao()
+    
+    if not dados_ligacoes or dados_ligacoes.get("code") != 200:
+        # As ligações já enfileiradas ainda são verificadas abaixo
+        logging.error("Não foi possível obter ligações do Escallo")
+        perfil.marcar_resultado("falha")
+    else:
+        registros = dados_ligacoes.get("data", {}).get("registros", [])
+        logging.info(f"Novas ligações encontradas: {len(registros)}")
+        perfil.contar("ligacoes", len(registros))
+        
+        # Filtra ligações dos atendentes específicos, ignorando as filas de técnicos
+        with perfil.etapa("filtrar"):
+            ligacoes_filtradas = filtrar_ligacoes(registros)
+        
+        logging.info(f"Ligações filtradas dos atendentes: {len(ligacoes_filtradas)}")
+        perfil.contar("ligacoes_filtradas", len(ligacoes_filtradas))
+        
+        novas = enfileirar_ligacoes(ligacoes_filtradas)
+        FILA_LIGACOES.salvar()
+        logging.info(f"Ligações na fila de carência ({CARENCIA_MINUTOS:g} min): {novas} novas, {len(FILA_LIGACOES)} no total")
+        
+        # As ligações novas estão na fila persistida: a última execução pode avançar
+        salvar_ultima_data_hora(inicio)
+    
+    vencidas = FILA_LIGACOES.retirar_vencidos(datetime.now())
+    logging.info(f"Ligações a verificar (carência vencida): {len(vencidas)}")
+    perfil.contar("ligacoes_vencidas", len(vencidas))
+    
+    indice = None
+    if vencidas:
+        try:
+            with perfil.etapa("enriquecer"):
+                indice = indexar_atendimentos_automaticos()
+        except resiliencia.FalhaRequisicao as e:
+            logging.error(f"  ✗ Atendimentos automáticos não consultados: {e}")
+    
+    falhas = 0
+    adiadas = 0
+    a_verificar = []
+    for id_ligacao, vencimento, item in vencidas:
+        ligacao = ligacao_da_fila(item)
+        if REGISTRO_LIGACOES.contem(id_ligacao, ligacao['data_hora_final'].date()):
+            logging.debug(f"Ligação {id_ligacao} já tratada em um ciclo anterior")
+            continue
+        if indice is None:
+            # Volta para a fila com o mesmo vencimento: continua à frente das mais novas.
+            # A falha é do ciclo, não da ligação, então não conta tentativa
+            devolver_a_fila(id_ligacao, vencimento, item, falhou=False)
+            falhas += 1
+            continue
+        a_verificar.append((id_ligacao, vencimento, item, ligacao))
+    
+    # Verifica até LIGACOES_PARALELAS ligações ao mesmo tempo e alerta na ordem da fila
+    # (a mais antiga primeiro), à medida que cada verificação termina
+    largura = max(1, LIGACOES_PARALELAS)
+    proxima = 0
+    pendentes = deque()
+    try:
+        with ThreadPoolExecutor(max_workers=largura) as executor:
+            while proxima < len(a_verificar) or pendentes:
+                while (proxima < len(a_verificar) and len(pendentes) < largura
+                       and not (orcamento is not None and orcamento.esgotado())):
+                    ligacao = a_verificar[proxima][3]
+                    pendentes.append((a_verificar[proxima], executor.submit(verificar_ligacao_em_bloco, ligacao, indice)))
+                    proxima += 1
+                if not pendentes:
+                    break
+                (id_ligacao, vencimento, item, ligacao), futuro = pendentes[0]
+                clientes, erro, registros = futuro.result()
+                pendentes.popleft()
+                metricas.FILA.definir(len(a_verificar) - proxima + len(pendentes), fila="ligacoes_pendentes")
+                for registro in registros:
+                    logging.getLogger().handle(registro)
+                try:
+                    if erro is not None:
+                        raise erro
+                    entregue = alertar_ligacao(ligacao, clientes)
+                except resiliencia.FalhaRequisicao as e:
+                    logging.error(f"  ✗ Ligação {id_ligacao} não verificada: {e}")
+                    entregue = False
+                except Exception as e:
+                    logging.exception(f"  ✗ Erro inesperado na ligação {id_ligacao}: {e}")
+                    entregue = False
+                if entregue:
+                    REGISTRO_LIGACOES.marcar(id_ligacao, ligacao['data_hora_final'].date())
+                elif devolver_a_fila(id_ligacao, vencimento, item):
+                    falhas += 1
+    finally:
+        # Sem orçamento (ou com o ciclo interrompido), as que não chegaram a ser
+        # tratadas voltam para a fila com o mesmo vencimento
+        restantes = [entrada for entrada, _ in pendentes] + a_verificar[proxima:]
+        for id_ligacao, vencimento, item, _ in restantes:
+            FILA_LIGACOES.adicionar(id_ligacao, vencimento, item)
+        adiadas += len(restantes)
+        FILA_LIGACOES.salvar()
+    
+    metricas.FILA.definir(len(FILA_LIGACOES), fila="ligacoes_em_carencia")
+    REGISTRO_LIGACOES.podar(datetime.now().date())
+    REGISTRO_LIGACOES.compactar()
+    
+    if falhas or adiadas:
+        if adiadas:
+            logging.warning(f"Orçamento do ciclo esgotado; {adiadas} ligação(ões) fica(m) para o próximo")
+        logging.warning(f"Ciclo parcial: {falhas + adiadas} ligação(ões) de volta à fila")
+        perfil.contar("falhas", falhas)
+        perfil.contar("adiadas", adiadas)
+        perfil.marcar_resultado("parcial")
+        return
     
     logging.info("\n" + "=" * 60)
     logging.info("Execução concluída!")
@@ -895,19 +1107,13 @@ def main():
     logging.info("Configurado para executar a cada 40 minutos")
     logging.info("=" * 60)
     
-    # Loop principal (executa a cada 40 minutos)
-    while True:
-        try:
-            processar_ligacoes()
-            logging.info(f"Próxima execução em 40 minutos...")
-            time.sleep(2400)  # 40 minutos em segundos (40 * 60 = 2400)
-        except KeyboardInterrupt:
-            logging.info("Sistema interrompido pelo usuário")
-            break
-        except Exception as e:
-            logging.error(f"Erro inesperado: {e}")
-            logging.info("Reiniciando em 60 segundos...")
-            time.sleep(60)
+    # Loop principal em ritmo fixo de 40 minutos; após erro inesperado, tenta em 60 segundos
+    try:
+        with agendador.instancia_unica("monitoramento_ligacoes"):
+            agendador.executar_em_ritmo(processar_ligacoes, 2400, nome="monitoramento_ligacoes",
+                                        espera_erro_s=60)
+    except KeyboardInterrupt:
+        logging.info("Sistema interrompido pelo usuário")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,695 @@
+"""Servidor substituto do IXC, do Escallo, do Telegram e do serviço de WhatsApp.
+
+Sobe um único servidor HTTP local com dados sintéticos para testar os monitores de
+ponta a ponta sob carga, sem tocar na produção:
+
+- ``POST /webservice/v1/<tabela>``: grid do IXC (qtype/query/oper/page/rp,
+  sortname/sortorder e condições extras em grid_param, inclusive IN) sobre su_oss_chamado, su_oss_chamado_mensagem, su_ticket,
+  su_oss_assunto, funcionarios, cliente, cliente_contrato, cidade, radusuarios,
+  radpop_radio e radpop_radio_cliente_fibra;
+- ``POST /escallo/api/v1/recurso/relatorio/rel001/``: ligações do dia;
+- ``/bot<token>/<método>``: API de bots do Telegram (sendMessage, sendDocument,
+  editMessageText, getMe, getUpdates...), que apenas contabiliza o que recebe;
+- ``GET /health`` e ``POST /send``: serviço de WhatsApp;
+- ``GET /simulador/estatisticas``: contagem de requisições, erros injetados e
+  mensagens recebidas por canal.
+
+Com ``--capacidade-ixc N`` o IXC atende no máximo N requisições ao mesmo tempo: as
+demais esperam na fila (a latência sobe com a carga) e, com a fila maior que N, são
+recusadas com 503, como um servidor sobrecarregado.
+
+Os dados são gerados de forma determinística a partir de ``--semente``. Para apontar
+os monitores para o simulador basta definir ``IXC_BASE_URL`` (``IXC_HOST_API`` no
+monitoramento de ligações), ``ESCALLO_HOST``, ``TELEGRAM_API_URL`` e
+``WHATSAPP_SERVICE_URL``. As ligações e os atendimentos são gerados para o dia em que
+o servidor sobe; reinicie-o ao virar o dia.
+
+Uso:
+    python simulador.py --os 100000 --ligacoes-dia 20000 --latencia-ms 20-200 --erros 0.01
+"""
+import argparse
+import bisect
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+FORMATO_DATA = "%Y-%m-%d %H:%M:%S"
+
+# Espelho dos cadastros usados pelos monitores, para que os dados gerados exercitem
+# os mesmos caminhos da produção (assuntos monitorados, ramais, encarregados...)
+ASSUNTOS_MONITORADOS = [
+    544, 167, 546, 166, 543, 169, 545, 196, 170,
+    547, 172, 258, 259, 192, 168, 252, 171, 393, 176, 380
+]
+ASSUNTOS_AUTOMATICOS = [324, 533, 679, 323, 322, 321, 329, 326, 435, 532, 325, 436, 327, 534, 328, 346, 347, 348, 531]
+RESPONSAVEIS_TECNICOS = [
+    345, 359, 337, 367, 307, 386, 389, 390, 423, 422,
+    421, 416, 415, 414, 404, 424, 425, 306, 379, 343,
+    304, 143, 268, 246, 348, 349
+]
+TERCEIRIZADA_ID = 283
+ENCARREGADO_ID = 152
+RAMAIS = {
+    "4002": 359, "4004": 345, "4006": 307, "4008": 386, "4009": 389,
+    "4021": 367, "4025": 337, "4027": 390, "4028": 414, "4029": 415,
+    "4030": 422, "4031": 423, "4032": 421, "4033": 416,
+    "1204": 268, "1210": 379, "1208": 343, "1205": 266, "1201": 304
+}
+FILAS = ["Suporte", "Suporte", "Suporte", "Comercial", "Suporte - Técnicos", "Comercial - Técnicos"]
+STATUS_OS = ["A"] * 30 + ["AG"] * 25 + ["EN"] * 15 + ["F"] * 30
+EVENTOS_OS = [4] * 35 + [5] * 30 + [11] * 5 + [2] * 30
+BAIRROS = ["Centro", "Jardim América", "Vila Nova", "Parque das Flores", "Santa Cruz", "Boa Vista"]
+RUAS = ["Rua das Palmeiras", "Avenida Brasil", "Rua XV de Novembro", "Rua São João", "Travessa Ipê"]
+
+
+class Tabela:
+    """Registros de uma tabela do IXC guardados como tuplas (campos em ``campos``)"""
+
+    def __init__(self, campos: Tuple[str, ...], linhas: List[tuple]):
+        self.campos = campos
+        self.posicao = {campo: i for i, campo in enumerate(campos)}
+        self.linhas = linhas
+        self._indices: Dict[str, Dict[str, List[tuple]]] = {}
+        self._lock = threading.Lock()
+
+    def indice(self, campo: str) -> Dict[str, List[tuple]]:
+        """Índice de igualdade por campo, montado na primeira consulta"""
+        with self._lock:
+            if campo not in self._indices:
+                i = self.posicao[campo]
+                indice = defaultdict(list)
+                for linha in self.linhas:
+                    indice[linha[i]].append(linha)
+                self._indices[campo] = dict(indice)
+            return self._indices[campo]
+
+    def consultar(self, qtype: str, query: str, oper: str) -> Iterable[tuple]:
+        if not qtype:
+            return self.linhas
+        if qtype not in self.posicao:
+            return []
+        if oper == "=":
+            return self.indice(qtype).get(query, [])
+        i = self.posicao[qtype]
+        return [linha for linha in self.linhas if comparar(linha[i], oper, query)]
+
+    def como_dict(self, linha: tuple) -> Dict[str, str]:
+        return dict(zip(self.campos, linha))
+
+
+class MensagensOS(Tabela):
+    """su_oss_chamado_mensagem gerada sob demanda a partir de cada OS
+
+    Com 100 mil OS seriam centenas de milhares de mensagens em memória; como o
+    acesso normal é por ``id_chamado``, cada OS tem suas mensagens regeneradas (de
+    forma determinística) quando consultada.
+    """
+
+    CAMPOS = ("id", "id_chamado", "data", "id_operador", "id_evento", "status",
+              "id_tecnico", "data_final", "historico")
+
+    def __init__(self, oss: Tabela, semente: int, agora: datetime):
+        super().__init__(self.CAMPOS, [])
+        self.oss = oss
+        self.semente = semente
+        self.agora = agora
+
+    def da_os(self, os_linha: tuple) -> List[tuple]:
+        pos = self.oss.posicao
+        id_os = int(os_linha[pos["id"]])
+        rng = random.Random(self.semente * 1_000_003 + id_os)
+        data = datetime.strptime(os_linha[pos["data_abertura"]], FORMATO_DATA)
+        status = "A"
+        mensagens = []
+        for j in range(rng.randint(1, 6)):
+            data += timedelta(minutes=rng.randint(5, 600))
+            if data > self.agora:
+                break
+            evento = rng.choice(EVENTOS_OS)
+            operador = rng.choice([TERCEIRIZADA_ID] * 3 + [ENCARREGADO_ID] * 2 + RESPONSAVEIS_TECNICOS)
+            tecnico = ""
+            data_final = ""
+            if evento == 4:
+                status = "EN"
+                tecnico = str(rng.choice(RESPONSAVEIS_TECNICOS + [TERCEIRIZADA_ID]))
+            elif evento == 5:
+                status = "AG"
+                data_final = (data + timedelta(days=rng.choice([0, 0, 1, 2]))).strftime(FORMATO_DATA)
+            elif evento == 11:
+                status = "RAG"
+            mensagens.append((
+                str(id_os * 8 + j), str(id_os), data.strftime(FORMATO_DATA), str(operador),
+                str(evento), status, tecnico, data_final, f"Evento {evento} registrado pelo operador {operador}"
+            ))
+        return mensagens
+
+    def consultar(self, qtype: str, query: str, oper: str) -> Iterable[tuple]:
+        if qtype == "id_chamado" and oper == "=":
+            linhas = self.oss.indice("id").get(query, [])
+            return self.da_os(linhas[0]) if linhas else []
+        if qtype == "id" and oper == "=" and query.isdigit():
+            linhas = self.oss.indice("id").get(str(int(query) // 8), [])
+            return [m for m in (self.da_os(linhas[0]) if linhas else []) if m[0] == query]
+        if qtype and qtype not in self.posicao:
+            return []
+        # Consulta ampla: varre todas as OS (cara, como no IXC real)
+        todas = (m for os_linha in self.oss.linhas for m in self.da_os(os_linha))
+        if not qtype:
+            return list(todas)
+        i = self.posicao[qtype]
+        return [m for m in todas if comparar(m[i], oper, query)]
+
+
+def _numero(valor: str) -> Optional[float]:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def comparar(valor: str, oper: str, query: str) -> bool:
+    """Operadores do grid do IXC; números comparam como números, o resto como texto"""
+    if oper == "IN":
+        return any(comparar(valor, "=", opcao) for opcao in query.split(","))
+    if oper == "L":
+        return query.lower() in (valor or "").lower()
+    a, b = _numero(valor), _numero(query)
+    if a is None or b is None:
+        a, b = valor or "", query or ""
+    if oper == "=":
+        return a == b
+    if oper == "!=":
+        return a != b
+    if oper == ">":
+        return a > b
+    if oper == ">=":
+        return a >= b
+    if oper == "<":
+        return a < b
+    if oper == "<=":
+        return a <= b
+    return False
+
+
+def _telefone(rng: random.Random) -> str:
+    return f"11{rng.randint(900000000, 999999999)}"
+
+
+def _formatar_telefone(numero: str) -> str:
+    return f"({numero[:2]}) {numero[2:7]}-{numero[7:]}"
+
+
+class BaseSintetica:
+    """Gera todas as tabelas de uma vez, de forma determinística pela semente"""
+
+    def __init__(self, qtd_os: int, qtd_clientes: int, ligacoes_dia: int,
+                 dias_os: int, semente: int, agora: Optional[datetime] = None):
+        self.agora = agora or datetime.now().replace(microsecond=0)
+        self.semente = semente
+        rng = random.Random(semente)
+        inicio = time.perf_counter()
+
+        self.tabelas: Dict[str, Tabela] = {}
+        self._gerar_cadastros(rng, qtd_clientes)
+        self._gerar_ligacoes(rng, ligacoes_dia)
+        self._gerar_oss(rng, qtd_os, dias_os)
+        self._gerar_mensagens(semente)
+
+        logger.info(
+            f"Base sintética gerada em {time.perf_counter() - inicio:.1f}s: "
+            + ", ".join(f"{nome}={len(t.linhas)}" for nome, t in self.tabelas.items() if t.linhas)
+        )
+
+    def _gerar_mensagens(self, semente: int):
+        """Mensagens sob demanda e ultima_atualizacao de cada OS (data da última mensagem)"""
+        oss = self.tabelas["su_oss_chamado"]
+        mensagens = MensagensOS(oss, semente, self.agora)
+        abertura = oss.posicao["data_abertura"]
+        linhas = []
+        for linha in oss.linhas:
+            historico = mensagens.da_os(linha)
+            linhas.append(linha + (historico[-1][2] if historico else linha[abertura],))
+        mensagens.oss = self.tabelas["su_oss_chamado"] = Tabela(oss.campos + ("ultima_atualizacao",), linhas)
+        self.tabelas["su_oss_chamado_mensagem"] = mensagens
+
+    def _gerar_cadastros(self, rng: random.Random, qtd_clientes: int):
+        self.tabelas["cidade"] = Tabela(("id", "nome", "uf"), [
+            (str(i), f"Cidade {i}", "SP") for i in range(1, 21)
+        ])
+        self.tabelas["su_oss_assunto"] = Tabela(("id", "assunto"), [
+            (str(i), f"Assunto {i}") for i in range(1, 701)
+        ])
+        self.tabelas["funcionarios"] = Tabela(("id", "funcionario", "ativo"), [
+            (str(i), f"Funcionário {i}", "S") for i in range(1, 501)
+        ])
+        transmissores = [(str(i), f"OLT_SIM_{i:02d}") for i in range(1, 9)]
+        self.tabelas["radpop_radio"] = Tabela(("id", "descricao"), transmissores)
+
+        clientes, contratos, logins, fibras = [], [], [], []
+        self.telefones_clientes: List[Tuple[str, str]] = []
+        for i in range(1, qtd_clientes + 1):
+            id_cliente = str(i)
+            celular = _telefone(rng)
+            self.telefones_clientes.append((celular, id_cliente))
+            endereco, numero = rng.choice(RUAS), str(rng.randint(1, 3000))
+            bairro, cidade = rng.choice(BAIRROS), str(rng.randint(1, 20))
+            ativo = "S" if rng.random() < 0.95 else "N"
+            clientes.append((
+                id_cliente, f"Cliente Sintético {i}", "", ativo, _formatar_telefone(celular),
+                _formatar_telefone(celular), "", "", endereco, numero, bairro, cidade,
+                (self.agora - timedelta(days=rng.randint(0, 365))).strftime(FORMATO_DATA)
+            ))
+            contratos.append((id_cliente, id_cliente, "A" if ativo == "S" else "I",
+                              endereco, numero, bairro, cidade,
+                              (self.agora - timedelta(days=rng.randint(0, 365))).strftime(FORMATO_DATA)))
+            online = rng.choice(["S"] * 8 + ["N", "SS"])
+            logins.append((id_cliente, id_cliente, id_cliente, f"cliente{i}@sim", ativo, online,
+                           "" if online == "S" else "LOS",
+                           (self.agora - timedelta(hours=rng.randint(0, 720))).strftime(FORMATO_DATA)))
+            transmissor = rng.choice(transmissores)[0]
+            ponid = f"0/{rng.randint(1, 2)}/{rng.randint(1, 16)}"
+            fibras.append((id_cliente, transmissor, ponid, id_cliente, id_cliente, id_cliente,
+                           (self.agora - timedelta(days=rng.randint(0, 365))).strftime(FORMATO_DATA)))
+
+        self.tabelas["cliente"] = Tabela(
+            ("id", "razao", "fantasia", "ativo", "telefone_celular", "whatsapp", "fone",
+             "telefone_comercial", "endereco", "numero", "bairro", "cidade", "ultima_atualizacao"),
+            clientes)
+        self.tabelas["cliente_contrato"] = Tabela(
+            ("id", "id_cliente", "status", "endereco", "numero", "bairro", "cidade", "ultima_atualizacao"),
+            contratos)
+        self.tabelas["radusuarios"] = Tabela(
+            ("id", "id_cliente", "id_contrato", "login", "ativo", "online", "motivo_desconexao",
+             "ultima_conexao_inicial"),
+            logins)
+        self.tabelas["radpop_radio_cliente_fibra"] = Tabela(
+            ("id", "id_transmissor", "ponid", "id_contrato", "id_login", "id_cliente", "ultima_atualizacao"),
+            fibras)
+
+    def _gerar_ligacoes(self, rng: random.Random, ligacoes_dia: int):
+        """Ligações do dia e os atendimentos (su_ticket) que elas deixam no IXC"""
+        inicio_dia = self.agora.replace(hour=0, minute=0, second=0)
+        self.ligacoes: List[Tuple[datetime, dict]] = []
+        self._tickets: List[tuple] = []
+        ramais = list(RAMAIS)
+        for i in range(1, ligacoes_dia + 1):
+            fim = inicio_dia + timedelta(seconds=rng.randint(0, 86399))
+            sorteio = rng.random()
+            if sorteio < 0.8 and self.telefones_clientes:
+                origem, id_cliente = rng.choice(self.telefones_clientes)
+            elif sorteio < 0.83:
+                origem, id_cliente = "anonymous", ""
+            else:
+                origem, id_cliente = _telefone(rng), ""
+            ramal = rng.choice(ramais)
+            atendida = rng.random() < 0.8
+            self.ligacoes.append((fim, {
+                "filaAtendimentoLigacao.id": str(i),
+                "filaAtendimentoLigacao.origem": "0" + origem,
+                "filaAtendimentoLigacao.destino": f"Atendente ({ramal})",
+                "filaAtendimentoLigacao.statusFormatado": "Atendida" if atendida else "Abandonada",
+                "telefoniaFilaAtendimento.nome": rng.choice(FILAS),
+                "filaAtendimentoLigacao.dataHoraFinal": fim.strftime(FORMATO_DATA),
+            }))
+            if not id_cliente:
+                continue
+            # URA abre atendimento automático com o telefone na mensagem
+            if rng.random() < 0.5:
+                self._tickets.append((
+                    id_cliente, rng.choice(ASSUNTOS_AUTOMATICOS), "",
+                    fim - timedelta(minutes=rng.randint(1, 10)),
+                    f"Atendimento automático. Telefone de contato: {origem}"
+                ))
+            # A maioria dos atendentes registra o atendimento; o resto gera alerta
+            if atendida and rng.random() < 0.85:
+                self._tickets.append((
+                    id_cliente, rng.randint(1, 700), str(RAMAIS[ramal]),
+                    fim + timedelta(minutes=rng.randint(0, 30)), "Atendimento registrado"
+                ))
+        self.ligacoes.sort(key=lambda item: item[0])
+        self._fins_ligacoes = [fim for fim, _ in self.ligacoes]
+
+    def _gerar_oss(self, rng: random.Random, qtd_os: int, dias_os: int):
+        oss = []
+        qtd_clientes = len(self.tabelas["cliente"].linhas) or 1
+        segundos = max(dias_os, 1) * 86400
+        for i in range(1, qtd_os + 1):
+            abertura = self.agora - timedelta(seconds=rng.randint(0, segundos))
+            assunto = rng.choice(ASSUNTOS_MONITORADOS) if rng.random() < 0.4 else rng.randint(1, 700)
+            id_cliente = str(rng.randint(1, qtd_clientes))
+            responsavel = rng.choice(RESPONSAVEIS_TECNICOS) if rng.random() < 0.6 else rng.randint(1, 500)
+            self._tickets.append((id_cliente, assunto, str(responsavel),
+                                  abertura - timedelta(minutes=rng.randint(0, 60)), "Abertura de OS"))
+            oss.append((
+                str(i), id_cliente, str(assunto),
+                str(rng.choice([TERCEIRIZADA_ID, 0] + RESPONSAVEIS_TECNICOS)),
+                str(len(self._tickets)), rng.choice(STATUS_OS), abertura.strftime(FORMATO_DATA),
+            ))
+        self.tabelas["su_oss_chamado"] = Tabela(
+            ("id", "id_cliente", "id_assunto", "id_tecnico", "id_ticket", "status", "data_abertura"),
+            oss)
+        self.tabelas["su_ticket"] = Tabela(
+            ("id", "id_cliente", "id_assunto", "id_responsavel_tecnico", "data_criacao", "menssagem",
+             "ultima_atualizacao"),
+            [(str(i), id_cliente, str(assunto), responsavel, criacao.strftime(FORMATO_DATA), mensagem,
+              criacao.strftime(FORMATO_DATA))
+             for i, (id_cliente, assunto, responsavel, criacao, mensagem) in enumerate(self._tickets, 1)])
+        del self._tickets
+
+    def ligacoes_encerradas(self, desde: datetime, ate: datetime) -> List[dict]:
+        """Ligações com dataHoraFinal no intervalo e já encerradas no relógio real"""
+        ate = min(ate, datetime.now())
+        i = bisect.bisect_left(self._fins_ligacoes, desde)
+        j = bisect.bisect_right(self._fins_ligacoes, ate)
+        return [registro for _, registro in self.ligacoes[i:j]]
+
+
+class Simulador:
+    """Estado compartilhado pelas requisições: base, latência, erros e estatísticas"""
+
+    def __init__(self, base: BaseSintetica, latencia_ms: Tuple[float, float], latencia_registro_ms: float,
+                 taxa_erros: float, taxa_erros_telegram: float, semente: int, capacidade_ixc: int = 0):
+        self.base = base
+        self.latencia_ms = latencia_ms
+        self.latencia_registro_ms = latencia_registro_ms
+        self.taxa_erros = taxa_erros
+        self.taxa_erros_telegram = taxa_erros_telegram
+        self._rng = random.Random(semente)
+        self._lock = threading.Lock()
+        self.requisicoes = Counter()
+        self.erros = Counter()
+        self.mensagens = Counter()
+        self._proximo_id_mensagem = 1
+        self.capacidade_ixc = capacidade_ixc
+        self._vagas_ixc = threading.Semaphore(capacidade_ixc) if capacidade_ixc > 0 else None
+        self._aguardando_ixc = 0
+
+    def sortear(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def esperar(self, registros: int = 0):
+        minimo, maximo = self.latencia_ms
+        with self._lock:
+            espera = self._rng.uniform(minimo, maximo) if maximo > minimo else minimo
+        espera += registros * self.latencia_registro_ms
+        if espera > 0:
+            time.sleep(espera / 1000)
+
+    @contextmanager
+    def vaga_ixc(self) -> Iterator[bool]:
+        """Ocupa uma das vagas do IXC; False se a fila já passou da capacidade"""
+        if self._vagas_ixc is None:
+            yield True
+            return
+        with self._lock:
+            lotada = self._aguardando_ixc >= self.capacidade_ixc
+            if not lotada:
+                self._aguardando_ixc += 1
+        if lotada:
+            yield False
+            return
+        self._vagas_ixc.acquire()
+        with self._lock:
+            self._aguardando_ixc -= 1
+        try:
+            yield True
+        finally:
+            self._vagas_ixc.release()
+
+    def contar(self, contador: Counter, chave: str):
+        with self._lock:
+            contador[chave] += 1
+
+    def novo_id_mensagem(self) -> int:
+        with self._lock:
+            self._proximo_id_mensagem += 1
+            return self._proximo_id_mensagem
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "requisicoes": dict(self.requisicoes),
+                "erros_injetados": dict(self.erros),
+                "mensagens": dict(self.mensagens),
+            }
+
+
+def parse_latencia(valor: str) -> Tuple[float, float]:
+    """'0', '120' ou '20-200' (ms), no mesmo formato de ALERTAS_LATENCIA_MS"""
+    partes = str(valor).split("-", 1)
+    minimo = float(partes[0] or 0)
+    maximo = float(partes[1]) if len(partes) > 1 else minimo
+    return minimo, max(minimo, maximo)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    simulador: Simulador = None
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    # ==================== RESPOSTAS ====================
+    def _responder(self, status: int, corpo, tipo: str = "application/json; charset=utf-8"):
+        if not isinstance(corpo, (bytes, str)):
+            corpo = json.dumps(corpo, ensure_ascii=False)
+        if isinstance(corpo, str):
+            corpo = corpo.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _ler_corpo(self) -> bytes:
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(tamanho) if tamanho else b""
+
+    def _ler_json(self, corpo: bytes) -> dict:
+        try:
+            dados = json.loads(corpo or b"{}")
+            return dados if isinstance(dados, dict) else {}
+        except ValueError:
+            return {}
+
+    def _erro_injetado(self, origem: str) -> bool:
+        """Sorteia uma falha de infraestrutura no lugar da resposta"""
+        sim = self.simulador
+        if sim.taxa_erros <= 0 or sim.sortear() >= sim.taxa_erros:
+            return False
+        sim.contar(sim.erros, origem)
+        sim.esperar()
+        if sim.sortear() < 0.5:
+            self._responder(502, "<html><body><h1>502 Bad Gateway</h1></body></html>", "text/html")
+        else:
+            self._responder(500, {"type": "error", "message": "Erro interno simulado"})
+        return True
+
+    # ==================== ROTAS ====================
+    def do_GET(self):
+        caminho = urlparse(self.path).path
+        self._ler_corpo()
+        if caminho == "/health":
+            self.simulador.contar(self.simulador.requisicoes, "whatsapp/health")
+            self._responder(200, {"status": "ok", "whatsapp_ready": True})
+        elif caminho == "/simulador/estatisticas":
+            self._responder(200, self.simulador.estatisticas())
+        elif caminho.startswith("/bot"):
+            self._telegram(caminho, {})
+        else:
+            self._responder(404, {"erro": "rota desconhecida"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        corpo = self._ler_corpo()
+        if url.path.startswith("/webservice/v1/"):
+            self._ixc(url.path.rsplit("/", 1)[-1], self._ler_json(corpo))
+        elif url.path.rstrip("/").endswith("/relatorio/rel001"):
+            self._escallo(parse_qs(url.query), self._ler_json(corpo))
+        elif url.path.startswith("/bot"):
+            tipo = self.headers.get("Content-Type", "")
+            dados = self._ler_json(corpo) if "json" in tipo else parse_qs(corpo.decode("utf-8", "replace"))
+            self._telegram(url.path, dados)
+        elif url.path == "/send":
+            self.simulador.contar(self.simulador.requisicoes, "whatsapp/send")
+            self.simulador.contar(self.simulador.mensagens, "whatsapp")
+            self.simulador.esperar()
+            self._responder(200, {"success": True})
+        else:
+            self._responder(404, {"erro": "rota desconhecida"})
+
+    def _ixc(self, nome: str, filtro: dict):
+        sim = self.simulador
+        sim.contar(sim.requisicoes, f"ixc/{nome}")
+        if not self.headers.get("Authorization"):
+            self._responder(401, {"type": "error", "message": "Não autorizado"})
+            return
+        if self._erro_injetado(f"ixc/{nome}"):
+            return
+        with sim.vaga_ixc() as aceita:
+            if not aceita:
+                sim.contar(sim.erros, f"ixc/{nome}:sobrecarga")
+                self._responder(503, {"type": "error", "message": "Servidor sobrecarregado"})
+                return
+            self._ixc_consultar(nome, filtro)
+
+    def _ixc_consultar(self, nome: str, filtro: dict):
+        sim = self.simulador
+        tabela = sim.base.tabelas.get(nome)
+        if tabela is None:
+            sim.esperar()
+            self._responder(200, {"type": "error", "message": f"Tabela {nome} não encontrada"})
+            return
+
+        qtype = str(filtro.get("qtype") or "").split(".")[-1]
+        linhas = list(tabela.consultar(qtype, str(filtro.get("query") or ""), str(filtro.get("oper") or "=")))
+        try:
+            condicoes = json.loads(filtro.get("grid_param") or "[]")
+        except ValueError:
+            sim.esperar()
+            self._responder(200, {"type": "error", "message": "grid_param inválido"})
+            return
+        for c in condicoes:
+            campo = str(c.get("TB") or "").split(".")[-1]
+            if campo not in tabela.posicao:
+                linhas = []
+                break
+            i = tabela.posicao[campo]
+            linhas = [linha for linha in linhas if comparar(linha[i], str(c.get("OP") or "="), str(c.get("P") or ""))]
+
+        ordem = str(filtro.get("sortname") or "id").split(".")[-1]
+        if ordem in tabela.posicao:
+            i = tabela.posicao[ordem]
+            linhas.sort(key=lambda linha: (_numero(linha[i]) is None, _numero(linha[i]) or 0, linha[i]),
+                        reverse=str(filtro.get("sortorder") or "asc").lower() == "desc")
+
+        page = max(int(_numero(filtro.get("page")) or 1), 1)
+        rp = int(_numero(filtro.get("rp")) or 20)
+        pagina = linhas[(page - 1) * rp: page * rp]
+        sim.esperar(len(pagina))
+        self._responder(200, {
+            "page": str(page),
+            "total": str(len(linhas)),
+            "registros": [tabela.como_dict(linha) for linha in pagina],
+        })
+
+    def _escallo(self, parametros: Dict[str, List[str]], filtro: dict):
+        sim = self.simulador
+        sim.contar(sim.requisicoes, "escallo/rel001")
+        if self._erro_injetado("escallo/rel001"):
+            return
+        try:
+            desde = datetime.strptime(f"{filtro['dataInicial']} {filtro.get('horarioInicial', '00:00:00')}", FORMATO_DATA)
+            ate = datetime.strptime(f"{filtro['dataFinal']} {filtro.get('horarioFinal', '23:59:59')}", FORMATO_DATA)
+        except (KeyError, ValueError):
+            self._responder(200, {"code": 400, "message": "Período inválido"})
+            return
+        registros = sim.base.ligacoes_encerradas(desde, ate)
+        qtd = int(_numero((parametros.get("registros") or ["2000"])[0]) or 2000)
+        pagina = int(_numero((parametros.get("pagina") or ["0"])[0]) or 0)
+        trecho = registros[pagina * qtd: (pagina + 1) * qtd]
+        sim.esperar(len(trecho))
+        self._responder(200, {"code": 200, "data": {"total": len(registros), "registros": trecho}})
+
+    def _telegram(self, caminho: str, dados: dict):
+        sim = self.simulador
+        metodo = caminho.rsplit("/", 1)[-1]
+        sim.contar(sim.requisicoes, f"telegram/{metodo}")
+
+        if metodo == "getMe":
+            self._responder(200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Simulador", "username": "simulador_bot"}})
+            return
+        if metodo == "getUpdates":
+            # Long polling sem novidades: segura a conexão por pouco tempo
+            time.sleep(min(float(_valor(dados, "timeout") or 0), 1.0))
+            self._responder(200, {"ok": True, "result": []})
+            return
+        if metodo in ("sendMessage", "sendDocument", "editMessageText"):
+            if sim.taxa_erros_telegram > 0 and sim.sortear() < sim.taxa_erros_telegram:
+                sim.contar(sim.erros, f"telegram/{metodo}")
+                self._responder(429, {"ok": False, "error_code": 429,
+                                      "description": "Too Many Requests: retry after 1",
+                                      "parameters": {"retry_after": 1}})
+                return
+            sim.esperar()
+            sim.contar(sim.mensagens, f"telegram/{metodo}")
+            chat_id = _valor(dados, "chat_id") or 0
+            self._responder(200, {"ok": True, "result": {
+                "message_id": _valor(dados, "message_id") or sim.novo_id_mensagem(),
+                "date": int(time.time()),
+                "chat": {"id": _inteiro(chat_id), "type": "group"},
+                "text": _valor(dados, "text") or "",
+            }})
+            return
+        # deleteWebhook, setMyCommands, answerCallbackQuery...
+        self._responder(200, {"ok": True, "result": True})
+
+
+def _valor(dados: dict, chave: str):
+    """Campo de um corpo JSON ou de formulário (parse_qs devolve listas)"""
+    valor = dados.get(chave)
+    return valor[0] if isinstance(valor, list) else valor
+
+
+def _inteiro(valor) -> int:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor substituto do IXC/Escallo/Telegram para testes de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--os", dest="qtd_os", type=int, default=100000, help="quantidade de OS geradas")
+    parser.add_argument("--clientes", type=int, default=20000, help="quantidade de clientes gerados")
+    parser.add_argument("--ligacoes-dia", type=int, default=20000, help="ligações geradas para o dia")
+    parser.add_argument("--dias-os", type=int, default=30, help="janela de abertura das OS, em dias")
+    parser.add_argument("--latencia-ms", default="0", help="latência por requisição: '120' ou '20-200'")
+    parser.add_argument("--latencia-registro-ms", type=float, default=0.0,
+                        help="latência adicional por registro devolvido")
+    parser.add_argument("--erros", type=float, default=0.0, help="fração de respostas 500/502 no IXC/Escallo")
+    parser.add_argument("--erros-telegram", type=float, default=0.0, help="fração de respostas 429 no Telegram")
+    parser.add_argument("--capacidade-ixc", type=int, default=0,
+                        help="requisições simultâneas atendidas pelo IXC (0: sem limite)")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    base = BaseSintetica(args.qtd_os, args.clientes, args.ligacoes_dia, args.dias_os, args.semente)
+    Handler.simulador = Simulador(base, parse_latencia(args.latencia_ms), args.latencia_registro_ms,
+                                  args.erros, args.erros_telegram, args.semente, args.capacidade_ixc)
+    servidor = ThreadingHTTPServer((args.host, args.porta), Handler)
+    servidor.daemon_threads = True
+    endereco = f"http://{args.host}:{args.porta}"
+    logger.info(f"Simulador ouvindo em {endereco}")
+    logger.info(f"  IXC_BASE_URL={endereco}/webservice/v1  IXC_HOST_API={endereco}/webservice/v1")
+    logger.info(f"  ESCALLO_HOST={args.host}:{args.porta}  TELEGRAM_API_URL={endereco}  WHATSAPP_SERVICE_URL={endereco}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Simulador encerrado")
+        logger.info(json.dumps(Handler.simulador.estatisticas(), ensure_ascii=False))
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Código compartilhado entre os módulos de monitoramento.
+
+Os módulos continuam autônomos: cada script adiciona a raiz do projeto ao
+``sys.path`` antes de importar ``comum``.
+"""
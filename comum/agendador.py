@@ -0,0 +1,114 @@
+"""Ciclos em ritmo fixo, com orçamento de tempo e uma única instância por pasta.
+
+``executar_em_ritmo`` chama o ciclo nos horários ``início + k * intervalo``: a duração
+do ciclo não empurra os seguintes (o atraso não acumula). Se um ciclo passar do
+intervalo, os horários perdidos são pulados em vez de rodar ciclos em sequência.
+
+Cada ciclo recebe um ``Orcamento`` (padrão: 80% do intervalo, ou ``CICLO_ORCAMENTO_S``).
+O ciclo deve processar o trabalho em ordem de prioridade e parar quando o orçamento
+acabar; o que sobrar fica para o ciclo seguinte, que começa por ele.
+
+``instancia_unica`` impede que dois processos do mesmo monitor (ex.: o loop e uma
+execução manual ou do cron) rodem ao mesmo tempo na mesma pasta de trabalho, onde
+dividiriam os arquivos de estado.
+"""
+import logging
+import math
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from comum import metricas
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava entre processos
+    fcntl = None
+
+FRACAO_ORCAMENTO = 0.8
+
+logger = logging.getLogger("alertas.agendador")
+
+
+class Orcamento:
+    """Prazo do ciclo; sem segundos definidos nunca se esgota"""
+
+    def __init__(self, segundos: Optional[float] = None):
+        self.segundos = segundos
+        self.fim = time.monotonic() + segundos if segundos else None
+
+    def restante(self) -> float:
+        if self.fim is None:
+            return math.inf
+        return max(self.fim - time.monotonic(), 0.0)
+
+    def esgotado(self) -> bool:
+        return self.fim is not None and time.monotonic() >= self.fim
+
+
+def orcamento_padrao(intervalo_s: float) -> float:
+    valor = os.getenv("CICLO_ORCAMENTO_S", "").strip()
+    return float(valor) if valor else intervalo_s * FRACAO_ORCAMENTO
+
+
+def executar_em_ritmo(ciclo: Callable[[Orcamento], object], intervalo_s: float, nome: str = "",
+                      orcamento_s: Optional[float] = None, espera_erro_s: Optional[float] = None):
+    """Executa ciclo(orcamento) para sempre, a cada intervalo_s segundos.
+
+    Exceções do ciclo são registradas e o próximo ciclo roda no horário seguinte (ou
+    após espera_erro_s, se menor). KeyboardInterrupt encerra o loop.
+    """
+    orcamento_s = orcamento_padrao(intervalo_s) if orcamento_s is None else orcamento_s
+    proximo = time.monotonic()
+    while True:
+        inicio = time.monotonic()
+        espera_maxima = None
+        try:
+            ciclo(Orcamento(orcamento_s))
+        except Exception as e:
+            logger.exception(f"Erro inesperado no ciclo de {nome}: {e}")
+            espera_maxima = espera_erro_s
+
+        duracao = time.monotonic() - inicio
+        proximo += intervalo_s
+        agora = time.monotonic()
+        if agora > proximo:
+            pulados = int((agora - proximo) // intervalo_s) + 1
+            proximo += pulados * intervalo_s
+            metricas.CICLOS_ATRASADOS.inc(pulados, monitor=nome)
+            logger.warning(f"Ciclo de {nome} levou {duracao:.0f}s (intervalo {intervalo_s:.0f}s); "
+                           f"{pulados} horário(s) pulado(s)")
+        espera = proximo - agora
+        if espera_maxima is not None and espera_maxima < espera:
+            # Após erro, tenta antes e recomeça o ritmo a partir daí
+            espera = espera_maxima
+            proximo = agora + espera
+        logger.info(f"Próxima execução de {nome} em {espera / 60:.1f} minutos")
+        time.sleep(max(espera, 0))
+
+
+@contextmanager
+def instancia_unica(nome: str, diretorio: str = ".") -> Iterator[None]:
+    """Trava exclusiva em <diretorio>/.<nome>.lock; encerra o processo se já estiver em uso"""
+    if fcntl is None:
+        yield
+        return
+    caminho = os.path.join(diretorio, f".{nome}.lock")
+    with open(caminho, "a+") as arquivo:
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.seek(0)
+            dono = arquivo.read().strip() or "?"
+            logger.error(f"{nome} já está em execução nesta pasta (pid {dono}); encerrando")
+            sys.exit(1)
+        arquivo.seek(0)
+        arquivo.truncate()
+        arquivo.write(str(os.getpid()))
+        arquivo.flush()
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo, fcntl.LOCK_UN)
@@ -0,0 +1,84 @@
+"""Fila de itens com horário de vencimento, persistida em JSON.
+
+Cada item tem uma chave única e só sai da fila quando vence. O heap fica em
+memória; ``salvar`` grava a fila inteira em um arquivo temporário e o troca pelo
+definitivo, então uma queda no meio da gravação não perde a fila anterior.
+
+    fila = FilaAtraso("fila_ligacoes.json")
+    fila.adicionar("123", datetime.now() + timedelta(minutes=10), {"origem": "11999999999"})
+    for chave, vencimento, item in fila.retirar_vencidos(datetime.now()):
+        ...
+    fila.salvar()
+
+Os itens devem ser serializáveis em JSON (datas convertidas por quem usa a fila).
+"""
+import heapq
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("alertas.fila_atraso")
+
+
+class FilaAtraso:
+    """Heap de (vencimento, chave, item) com no máximo um item por chave"""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._heap: List[Tuple[datetime, str, Dict]] = []
+        self._chaves = set()
+        self._carregar()
+
+    def _carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                entradas = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Fila {self.caminho} ilegível, começando vazia: {e}")
+            return
+        for entrada in entradas:
+            chave = str(entrada["chave"])
+            if chave in self._chaves:
+                continue
+            self._chaves.add(chave)
+            self._heap.append((datetime.fromisoformat(entrada["vencimento"]), chave, entrada["item"]))
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, chave) -> bool:
+        return str(chave) in self._chaves
+
+    def adicionar(self, chave, vencimento: datetime, item: Dict) -> bool:
+        """Enfileira o item; retorna False se a chave já estava na fila"""
+        chave = str(chave)
+        if chave in self._chaves:
+            return False
+        self._chaves.add(chave)
+        heapq.heappush(self._heap, (vencimento, chave, item))
+        return True
+
+    def proximo_vencimento(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def retirar_vencidos(self, agora: datetime) -> List[Tuple[str, datetime, Dict]]:
+        """Remove e retorna (chave, vencimento, item) dos itens vencidos, o mais antigo primeiro"""
+        vencidos = []
+        while self._heap and self._heap[0][0] <= agora:
+            vencimento, chave, item = heapq.heappop(self._heap)
+            self._chaves.discard(chave)
+            vencidos.append((chave, vencimento, item))
+        return vencidos
+
+    def salvar(self):
+        entradas = [{"chave": chave, "vencimento": vencimento.isoformat(), "item": item}
+                    for vencimento, chave, item in sorted(self._heap)]
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(entradas, f, ensure_ascii=False)
+        os.replace(temporario, self.caminho)
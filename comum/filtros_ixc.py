@@ -0,0 +1,68 @@
+"""Filtros adicionais das listagens do IXC (``grid_param``).
+
+Além do filtro principal (qtype/query/oper), o grid do IXC aceita uma lista de
+condições em ``grid_param``, como texto JSON, que precisam valer todas ao mesmo tempo:
+
+    payload["grid_param"] = grid_param([
+        condicao("su_oss_chamado.status", "=", "A"),
+        condicao("su_oss_chamado.id_assunto", "IN", [544, 167]),
+    ])
+
+``atende`` aplica as mesmas condições a um registro recebido, para conferir a
+resposta de um servidor que ignore alguma delas.
+"""
+import json
+from typing import Dict, Iterable, Optional
+
+
+def condicao(campo: str, operador: str, valor) -> Dict[str, str]:
+    """Condição do grid; listas (operador IN) viram valores separados por vírgula"""
+    if isinstance(valor, (list, tuple, set)):
+        valor = ",".join(str(v) for v in valor)
+    return {"TB": campo, "OP": operador, "P": str(valor)}
+
+
+def grid_param(condicoes: Iterable[Dict[str, str]]) -> str:
+    return json.dumps(list(condicoes))
+
+
+def _numero(valor) -> Optional[float]:
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _comparar(valor, operador: str, parametro: str) -> bool:
+    if operador == "IN":
+        opcoes = parametro.split(",")
+        numero = _numero(valor)
+        return str(valor) in opcoes or (numero is not None and numero in map(_numero, opcoes))
+    if operador == "L":
+        return parametro.lower() in str(valor or "").lower()
+    a, b = _numero(valor), _numero(parametro)
+    if a is None or b is None:
+        # Datas no formato do IXC (AAAA-MM-DD HH:MM:SS) comparam certo como texto
+        a, b = str(valor or ""), parametro
+    if operador == "=":
+        return a == b
+    if operador == "!=":
+        return a != b
+    if operador == ">":
+        return a > b
+    if operador == ">=":
+        return a >= b
+    if operador == "<":
+        return a < b
+    if operador == "<=":
+        return a <= b
+    return False
+
+
+def atende(registro: Dict, condicoes: Iterable[Dict[str, str]]) -> bool:
+    """Se o registro satisfaz todas as condições (campos ausentes não satisfazem)"""
+    for c in condicoes:
+        campo = c["TB"].rsplit(".", 1)[-1]
+        if campo not in registro or not _comparar(registro[campo], c["OP"], c["P"]):
+            return False
+    return True
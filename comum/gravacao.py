@@ -0,0 +1,192 @@
+"""Gravação e reprodução do tráfego HTTP (IXC, Escallo, Telegram, WhatsApp).
+
+Com ``ALERTAS_GRAVACAO=gravar`` cada requisição feita com ``requests`` é enviada
+normalmente e o par requisição/resposta é acrescentado a um cassete
+(JSON por linha, compactado com gzip). Com ``ALERTAS_GRAVACAO=reproduzir`` nenhuma
+conexão é aberta: as respostas saem do cassete, na ordem em que foram gravadas para
+cada requisição idêntica, com a latência definida em ``ALERTAS_LATENCIA_MS``:
+
+- ``0`` (padrão): sem espera;
+- ``120``: espera fixa de 120 ms;
+- ``50-400``: espera uniforme no intervalo, sorteada com ``ALERTAS_SEMENTE``;
+- ``gravada``: a duração observada na gravação.
+
+Requisições sem gravação correspondente falham com ``requests.ConnectionError``,
+caindo no mesmo tratamento de erro de uma falha de rede.
+O token do bot do Telegram é mascarado na URL gravada; cabeçalhos da requisição
+(Authorization) não são gravados.
+"""
+import atexit
+import base64
+import gzip
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+_TOKEN_BOT = re.compile(r"/bot[^/]+/")
+
+_instalado = None
+
+
+def _normalizar_url(url: str) -> str:
+    return _TOKEN_BOT.sub("/bot<TOKEN>/", url or "")
+
+
+def _normalizar_corpo(corpo) -> str:
+    if corpo is None:
+        return ""
+    if isinstance(corpo, bytes):
+        corpo = corpo.decode("utf-8", errors="replace")
+    try:
+        return json.dumps(json.loads(corpo), sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return corpo
+
+
+def chave_requisicao(metodo: str, url: str, corpo) -> Tuple[str, str, str]:
+    return (metodo.upper(), _normalizar_url(url), _normalizar_corpo(corpo))
+
+
+class Gravador:
+    """Acrescenta ao cassete cada requisição enviada pela sessão original"""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._arquivo = gzip.open(caminho, "at", encoding="utf-8")
+        atexit.register(self.fechar)
+
+    def gravar(self, request, response, duracao: float):
+        metodo, url, corpo = chave_requisicao(request.method, request.url, request.body)
+        linha = json.dumps({
+            "metodo": metodo,
+            "url": url,
+            "corpo": corpo,
+            "status": response.status_code,
+            "motivo": response.reason,
+            "cabecalhos": dict(response.headers),
+            "conteudo": base64.b64encode(response.content).decode("ascii"),
+            "duracao": round(duracao, 4),
+        }, ensure_ascii=False)
+        with self._lock:
+            self._arquivo.write(linha + "\n")
+            self._arquivo.flush()
+
+    def fechar(self):
+        with self._lock:
+            if not self._arquivo.closed:
+                self._arquivo.close()
+
+
+class Reprodutor:
+    """Responde às requisições com as interações gravadas no cassete"""
+
+    def __init__(self, caminho: str, latencia: str = "0", semente: int = 0):
+        self._lock = threading.Lock()
+        self._fitas: Dict[Tuple[str, str, str], deque] = defaultdict(deque)
+        self._ultimas: Dict[Tuple[str, str, str], Dict] = {}
+        self._aleatorio = random.Random(semente)
+        self._latencia = latencia.strip().lower()
+        with gzip.open(caminho, "rt", encoding="utf-8") as f:
+            for linha in f:
+                if linha.strip():
+                    interacao = json.loads(linha)
+                    chave = (interacao["metodo"], interacao["url"], interacao["corpo"])
+                    self._fitas[chave].append(interacao)
+
+    def _espera(self, interacao: Dict) -> float:
+        if self._latencia == "gravada":
+            return interacao.get("duracao", 0.0)
+        if "-" in self._latencia:
+            minimo, maximo = (float(v) for v in self._latencia.split("-", 1))
+            with self._lock:
+                return self._aleatorio.uniform(minimo, maximo) / 1000.0
+        return float(self._latencia or 0) / 1000.0
+
+    def proxima(self, request) -> Optional[Dict]:
+        chave = chave_requisicao(request.method, request.url, request.body)
+        with self._lock:
+            fita = self._fitas.get(chave)
+            if fita:
+                self._ultimas[chave] = fita.popleft()
+            # Esgotada a fita, repete a última resposta (ex.: consultas de ciclos seguintes)
+            return self._ultimas.get(chave)
+
+    def responder(self, request) -> requests.Response:
+        interacao = self.proxima(request)
+        if interacao is None:
+            raise requests.ConnectionError(
+                f"Sem gravação para {request.method} {_normalizar_url(request.url)}", request=request
+            )
+        espera = self._espera(interacao)
+        if espera > 0:
+            time.sleep(espera)
+        response = requests.Response()
+        response.status_code = interacao["status"]
+        response.reason = interacao.get("motivo")
+        response.headers = CaseInsensitiveDict(interacao.get("cabecalhos", {}))
+        response._content = base64.b64decode(interacao["conteudo"])
+        # Conteúdo já em memória: iter_content (stream=True) percorre os bytes gravados
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.elapsed = timedelta(seconds=espera)
+        return response
+
+
+def instalar(modo: str, caminho: str, latencia: str = "0", semente: int = 0):
+    """Substitui requests.Session.send para gravar ou reproduzir o tráfego do processo"""
+    global _instalado
+    if _instalado is not None:
+        return _instalado
+    envio_original = requests.Session.send
+
+    if modo == "gravar":
+        gravador = Gravador(caminho)
+
+        def send(self, request, **kwargs):
+            inicio = time.perf_counter()
+            response = envio_original(self, request, **kwargs)
+            # Lê o corpo inteiro (mesmo com stream=True) para poder gravá-lo
+            response.content
+            gravador.gravar(request, response, time.perf_counter() - inicio)
+            return response
+
+        _instalado = gravador
+    elif modo == "reproduzir":
+        reprodutor = Reprodutor(caminho, latencia, semente)
+
+        def send(self, request, **kwargs):
+            return reprodutor.responder(request)
+
+        _instalado = reprodutor
+    else:
+        raise ValueError(f"Modo de gravação desconhecido: {modo}")
+
+    requests.Session.send = send
+    logging.getLogger(__name__).info(f"Tráfego HTTP em modo '{modo}' (cassete: {caminho})")
+    return _instalado
+
+
+def instalar_de_ambiente():
+    """Ativa a gravação/reprodução conforme ALERTAS_GRAVACAO; sem a variável nada muda"""
+    modo = os.getenv("ALERTAS_GRAVACAO", "").strip().lower()
+    if not modo:
+        return None
+    return instalar(
+        modo,
+        os.getenv("ALERTAS_CASSETE", "cassete.jsonl.gz"),
+        os.getenv("ALERTAS_LATENCIA_MS", "0"),
+        int(os.getenv("ALERTAS_SEMENTE", "0")),
+    )
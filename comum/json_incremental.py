@@ -0,0 +1,109 @@
+"""Leitura incremental das respostas JSON do IXC.
+
+``iterar_registros`` recebe a resposta em pedaços de bytes e gera os itens de
+``registros`` um a um, sem montar o documento inteiro em memória:
+
+    cabecalho = {}
+    for registro in iterar_registros(response.iter_content(65536), cabecalho):
+        ...
+
+Os demais campos do objeto (``total``, ``type``, ``message``...) vão para o dict
+``cabecalho`` conforme aparecem na resposta. Os que vêm depois de ``registros`` só
+estão lá quando a iteração termina, então ``cabecalho`` deve ser lido depois dela.
+"""
+import codecs
+import json
+from typing import Dict, Iterable, Iterator
+
+# Caracteres ignorados entre os tokens JSON
+_ESPACOS = " \t\n\r"
+
+
+class _LeitorIncremental:
+    """Lê valores JSON de uma sequência de pedaços de bytes sem carregar o documento inteiro"""
+
+    def __init__(self, pedacos: Iterable[bytes]):
+        self._pedacos = iter(pedacos)
+        self._decodificador_utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._fim = False
+
+    def _carregar(self) -> bool:
+        """Acrescenta o próximo pedaço ao buffer. Retorna False no fim do fluxo"""
+        while not self._fim:
+            pedaco = next(self._pedacos, None)
+            if pedaco is None:
+                self._fim = True
+                texto = self._decodificador_utf8.decode(b"", final=True)
+            else:
+                texto = self._decodificador_utf8.decode(pedaco)
+            if texto:
+                # Descarta o que já foi consumido para manter o buffer pequeno
+                self._buffer = self._buffer[self._pos:] + texto
+                self._pos = 0
+                return True
+        return False
+
+    def caractere(self) -> str:
+        """Retorna (sem consumir) o próximo caractere que não é espaço"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _ESPACOS:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._carregar():
+                raise ValueError("Fim inesperado do JSON")
+
+    def consumir(self, esperado: str) -> str:
+        c = self.caractere()
+        if c not in esperado:
+            raise ValueError(f"JSON inválido: esperado {esperado!r}, encontrado {c!r}")
+        self._pos += 1
+        return c
+
+    def valor(self):
+        """Decodifica o próximo valor JSON completo"""
+        self.caractere()
+        while True:
+            try:
+                valor, fim = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._carregar():
+                    raise
+                continue
+            # Um número no fim do buffer pode continuar no próximo pedaço
+            if fim == len(self._buffer) and not self._fim and self._carregar():
+                continue
+            self._pos = fim
+            return valor
+
+
+def iterar_registros(pedacos: Iterable[bytes], cabecalho: Dict) -> Iterator[Dict]:
+    """Gera um a um os itens de ``registros`` de uma resposta do IXC lida em pedaços
+    (ex.: ``response.iter_content(65536)`` com ``stream=True``).
+
+    Os demais campos do objeto (``total``, ``page``, ``type``, ``message``...) são
+    gravados em ``cabecalho`` conforme aparecem; após o fim da iteração todos estão presentes.
+    """
+    leitor = _LeitorIncremental(pedacos)
+    leitor.consumir("{")
+    if leitor.caractere() == "}":
+        return
+    while True:
+        chave = leitor.valor()
+        leitor.consumir(":")
+        if chave == "registros" and leitor.caractere() == "[":
+            leitor.consumir("[")
+            if leitor.caractere() == "]":
+                leitor.consumir("]")
+            else:
+                while True:
+                    yield leitor.valor()
+                    if leitor.consumir(",]") == "]":
+                        break
+        else:
+            cabecalho[chave] = leitor.valor()
+        if leitor.consumir(",}") == "}":
+            return
@@ -0,0 +1,184 @@
+"""Limite adaptativo de requisições simultâneas por serviço (AIMD guiado pela latência).
+
+Com ``instalar_de_ambiente()`` o limitador fica na frente de toda requisição ao IXC
+feita com ``requests`` no processo: todos os monitores e threads dividem o mesmo
+limite, e quem passar dele espera uma vaga antes de enviar.
+
+O limite é ajustado a cada ``JANELA`` respostas:
+
+- aumento aditivo (+1) se o p95 da latência na janela ficou perto da linha de base
+  (até ``TOLERANCIA`` vezes) e o limite chegou a ser usado por inteiro;
+- redução suave (``FATOR_LATENCIA``) se o p95 passou disso: o servidor está
+  enfileirando;
+- redução multiplicativa (``FATOR_SOBRECARGA``) na hora em timeout, erro de conexão,
+  429 ou 5xx (as falhas transitórias de ``resiliencia``), no máximo uma vez por
+  janela, para que uma rajada de erros da mesma leva não derrube o limite ao mínimo.
+
+A linha de base é o menor p95 visto; acima dele ela sobe devagar, acompanhando
+mudanças duradouras do servidor. Configuração: ``IXC_CONCORRENCIA_INICIAL`` (4, ou o
+valor passado a ``instalar_de_ambiente``), ``IXC_CONCORRENCIA_MIN`` (1) e
+``IXC_CONCORRENCIA_MAX`` (32); ``IXC_LIMITADOR=0`` desliga.
+
+A latência medida é até o cabeçalho da resposta; com ``stream=True`` o corpo é lido
+depois de liberada a vaga.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import requests
+
+from comum import metricas, resiliencia
+
+JANELA = 20
+TOLERANCIA = 1.5
+FATOR_LATENCIA = 0.9
+FATOR_SOBRECARGA = 0.5
+SUBIDA_BASE = 0.05
+
+SERVICOS = ("ixc",)
+
+logger = logging.getLogger("alertas.limitador")
+
+_limitadores: Dict[str, "Limitador"] = {}
+_lock_limitadores = threading.Lock()
+_instalado = False
+_inicial_padrao = 4
+
+
+def _p95(valores: Sequence[float]) -> float:
+    ordenados = sorted(valores)
+    return ordenados[int(0.95 * (len(ordenados) - 1))]
+
+
+class Limitador:
+    """Vagas de requisição simultânea com limite ajustado pelas respostas"""
+
+    def __init__(self, nome: str, inicial: int = 4, minimo: int = 1, maximo: int = 32,
+                 janela: int = JANELA):
+        self.nome = nome
+        self.minimo = max(1, minimo)
+        self.maximo = max(self.minimo, maximo)
+        self.janela = janela
+        self.limite = float(min(max(inicial, self.minimo), self.maximo))
+        self.em_uso = 0
+        self.base: Optional[float] = None
+        self._latencias = []
+        self._respostas = 0
+        self._saturado = False
+        self._reduzido = False
+        self._cond = threading.Condition()
+        metricas.CONCORRENCIA.definir(self.limite, servico=nome)
+
+    @property
+    def vagas(self) -> int:
+        return max(self.minimo, int(self.limite))
+
+    def adquirir(self):
+        with self._cond:
+            while self.em_uso >= self.vagas:
+                self._cond.wait()
+            self.em_uso += 1
+            if self.em_uso >= self.vagas:
+                self._saturado = True
+            metricas.CONCORRENCIA_EM_USO.definir(self.em_uso, servico=self.nome)
+
+    def liberar(self, latencia: Optional[float] = None, sobrecarga: bool = False):
+        """Devolve a vaga com o resultado da requisição (latência só das bem-sucedidas)"""
+        with self._cond:
+            self.em_uso -= 1
+            self._respostas += 1
+            if sobrecarga:
+                if not self._reduzido:
+                    self._reduzido = True
+                    self._definir(self.limite * FATOR_SOBRECARGA, "sobrecarga")
+            elif latencia is not None:
+                self._latencias.append(latencia)
+            if self._respostas >= self.janela:
+                self._ajustar()
+            metricas.CONCORRENCIA_EM_USO.definir(self.em_uso, servico=self.nome)
+            self._cond.notify_all()
+
+    def _ajustar(self):
+        if self._latencias:
+            p95 = _p95(self._latencias)
+            if self.base is None or p95 < self.base:
+                self.base = p95
+            else:
+                self.base += (p95 - self.base) * SUBIDA_BASE
+            if p95 > self.base * TOLERANCIA:
+                if not self._reduzido:
+                    self._definir(self.limite * FATOR_LATENCIA, f"p95 {p95 * 1000:.0f} ms")
+            elif self._saturado and not self._reduzido:
+                self._definir(self.limite + 1, None)
+        self._latencias = []
+        self._respostas = 0
+        self._reduzido = False
+        self._saturado = self.em_uso >= self.vagas
+
+    def _definir(self, limite: float, motivo: Optional[str]):
+        anterior = self.vagas
+        self.limite = min(max(limite, self.minimo), self.maximo)
+        metricas.CONCORRENCIA.definir(self.limite, servico=self.nome)
+        if motivo and self.vagas != anterior:
+            logger.info(f"Concorrência de {self.nome}: {anterior} -> {self.vagas} ({motivo})")
+
+
+def _inteiro_env(nome: str, padrao: int) -> int:
+    valor = os.getenv(nome, "").strip()
+    return int(valor) if valor else padrao
+
+
+def limitador(servico: str) -> Limitador:
+    """Limitador do serviço, único no processo"""
+    with _lock_limitadores:
+        atual = _limitadores.get(servico)
+        if atual is None:
+            prefixo = servico.upper()
+            atual = _limitadores[servico] = Limitador(
+                servico,
+                inicial=_inteiro_env(f"{prefixo}_CONCORRENCIA_INICIAL", _inicial_padrao),
+                minimo=_inteiro_env(f"{prefixo}_CONCORRENCIA_MIN", 1),
+                maximo=_inteiro_env(f"{prefixo}_CONCORRENCIA_MAX", max(32, _inicial_padrao)),
+            )
+        return atual
+
+
+def instalar(servicos: Sequence[str] = SERVICOS):
+    """Envolve requests.Session.send (depois da gravação e das métricas, se houver)"""
+    global _instalado
+    if _instalado:
+        return
+    envio_original = requests.Session.send
+
+    def send(self, request, **kwargs):
+        servico, _ = metricas.classificar_url(request.url)
+        if servico not in servicos:
+            return envio_original(self, request, **kwargs)
+        atual = limitador(servico)
+        atual.adquirir()
+        inicio = time.perf_counter()
+        try:
+            response = envio_original(self, request, **kwargs)
+        except Exception as e:
+            atual.liberar(sobrecarga=resiliencia.classificar(erro=e) is not None)
+            raise
+        sobrecarga = resiliencia.classificar(response=response) is not None
+        atual.liberar(None if sobrecarga else time.perf_counter() - inicio, sobrecarga)
+        return response
+
+    requests.Session.send = send
+    _instalado = True
+
+
+def instalar_de_ambiente(inicial: Optional[int] = None):
+    """Limita o IXC, a não ser que IXC_LIMITADOR=0. ``inicial`` é o limite de partida do
+    processo quando IXC_CONCORRENCIA_INICIAL não está definida"""
+    global _inicial_padrao
+    if os.getenv("IXC_LIMITADOR", "1").strip() == "0":
+        return
+    if inicial is not None:
+        _inicial_padrao = inicial
+    instalar()
@@ -0,0 +1,105 @@
+"""Memo de consultas por ciclo, com uma única requisição em andamento por chave.
+
+Dentro de um ciclo marcado com ``por_ciclo`` (ou ``with ciclo():``), ``memorizar``
+guarda o resultado de cada consulta pela chave (endpoint + payload, ver ``chave``):
+
+- a primeira chamada executa a consulta; chamadas simultâneas com a mesma chave,
+  de outras threads, esperam por ela em vez de repetir a requisição;
+- as chamadas seguintes recebem o resultado guardado, sem rede;
+- falhas não são guardadas: quem estava esperando recebe a mesma exceção e a
+  próxima chamada tenta de novo.
+
+O memo vale só até o fim do ciclo, então dados alterados no IXC entre ciclos são
+vistos no ciclo seguinte. Os resultados são compartilhados: quem chama não deve
+alterá-los. Fora de um ciclo, ``memorizar`` apenas executa a consulta.
+
+Acertos e faltas entram em ``alertas_cache_total{cache=...}``.
+"""
+import functools
+import json
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+from comum import metricas
+
+_ciclo_atual: Optional["Memo"] = None
+
+
+class _Entrada:
+    __slots__ = ("pronto", "valor", "erro")
+
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.valor = None
+        self.erro: Optional[BaseException] = None
+
+
+class Memo:
+    """Resultados por chave, com single-flight entre threads"""
+
+    def __init__(self, nome: str = "memo_ciclo"):
+        self.nome = nome
+        self._entradas: Dict[Hashable, _Entrada] = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave: Hashable, consulta: Callable, *args, **kwargs):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            dono = entrada is None
+            if dono:
+                entrada = self._entradas[chave] = _Entrada()
+        metricas.registrar_cache(self.nome, not dono)
+
+        if not dono:
+            entrada.pronto.wait()
+            if entrada.erro is not None:
+                raise entrada.erro
+            return entrada.valor
+
+        try:
+            entrada.valor = consulta(*args, **kwargs)
+        except BaseException as e:
+            entrada.erro = e
+            with self._lock:
+                self._entradas.pop(chave, None)
+            raise
+        finally:
+            entrada.pronto.set()
+        return entrada.valor
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+
+def chave(endpoint: str, payload: Dict) -> Tuple[str, str]:
+    return endpoint, json.dumps(payload, sort_keys=True)
+
+
+@contextmanager
+def ciclo(nome: str = "memo_ciclo") -> Iterator[Memo]:
+    """Ativa um memo novo (compartilhado por todas as threads) até o fim do bloco"""
+    global _ciclo_atual
+    anterior = _ciclo_atual
+    _ciclo_atual = Memo(nome)
+    try:
+        yield _ciclo_atual
+    finally:
+        _ciclo_atual = anterior
+
+
+def por_ciclo(funcao: Callable) -> Callable:
+    """Decorador: cada chamada de `funcao` é um ciclo com memo próprio"""
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        with ciclo():
+            return funcao(*args, **kwargs)
+    return executar
+
+
+def memorizar(chave: Hashable, consulta: Callable, *args, **kwargs):
+    """consulta(*args, **kwargs) memorizada no ciclo atual (sem ciclo, só executa)"""
+    memo = _ciclo_atual
+    if memo is None:
+        return consulta(*args, **kwargs)
+    return memo.obter(chave, consulta, *args, **kwargs)
@@ -0,0 +1,279 @@
+"""Métricas no formato de texto do Prometheus, servidas por HTTP local.
+
+Com ``METRICAS_PORTA`` definida, ``instalar_de_ambiente()`` sobe um servidor em
+``http://<METRICAS_HOST>:<porta>/metrics`` (thread daemon) e passa a medir toda
+requisição feita com ``requests``: contagem por serviço/endpoint/resultado e
+histograma de latência. IXC, Escallo, Telegram e WhatsApp são reconhecidos pela URL.
+
+As métricas de domínio (etapas do ciclo, filas, alertas por canal, caches) são
+atualizadas pelos próprios módulos com os objetos declarados no fim deste arquivo.
+Sem a variável nada é servido, mas os contadores continuam baratos de atualizar.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+LIMITES_REQUISICAO = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LIMITES_CICLO = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800)
+
+_REGISTRO: List["_Metrica"] = []
+_servidor = None
+_transporte_instalado = False
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(nomes: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        _REGISTRO.append(self)
+
+    def _chave(self, rotulos: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(rotulos.get(nome, "")) for nome in self.rotulos)
+
+    def expor(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        linhas.extend(self._amostras())
+        return linhas
+
+    def _amostras(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (requisições, alertas enviados...)"""
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos) -> float:
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+    def _amostras(self) -> List[str]:
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(v)}" for chave, v in itens]
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (tamanho de fila, itens em andamento...)"""
+    tipo = "gauge"
+
+    def definir(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = valor
+
+    def dec(self, valor: float = 1, **rotulos):
+        self.inc(-valor, **rotulos)
+
+
+class Histograma(_Metrica):
+    """Distribuição de durações em faixas cumulativas (``le``)"""
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                 limites: Sequence[float] = LIMITES_REQUISICAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(sorted(limites))
+        # chave -> [contagem por faixa..., soma, total]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observar(self, valor: float, **rotulos):
+        chave = self._chave(rotulos)
+        faixa = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(self.limites) + 1) + [0.0, 0]
+            serie[faixa] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    @contextmanager
+    def cronometrar(self, **rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **rotulos)
+
+    def _amostras(self) -> List[str]:
+        with self._lock:
+            series = sorted((chave, list(serie)) for chave, serie in self._series.items())
+        linhas = []
+        for chave, serie in series:
+            acumulado = 0
+            for limite, contagem in zip(self.limites + (float("inf"),), serie):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, f'le="{_formatar_numero(limite)}"')
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_formatar_numero(serie[-2])}")
+            linhas.append(f"{self.nome}_count{rotulos} {serie[-1]}")
+        return linhas
+
+
+def expor() -> str:
+    """Todas as métricas registradas no formato de texto 0.0.4"""
+    linhas = []
+    for metrica in list(_REGISTRO):
+        linhas.extend(metrica.expor())
+    return "\n".join(linhas) + "\n"
+
+
+# ==================== MÉTRICAS COMPARTILHADAS ====================
+HTTP_REQUISICOES = Contador(
+    "alertas_http_requisicoes_total", "Requisições HTTP por serviço, endpoint e resultado",
+    ("servico", "endpoint", "resultado"))
+HTTP_LATENCIA = Histograma(
+    "alertas_http_latencia_segundos", "Latência até o cabeçalho da resposta",
+    ("servico", "endpoint"))
+PAGINAS = Contador(
+    "alertas_ixc_paginas_total", "Páginas do IXC lidas por consulta paginada", ("consulta",))
+REGISTROS = Contador(
+    "alertas_ixc_registros_total", "Registros do IXC lidos por consulta paginada", ("consulta",))
+CICLO_DURACAO = Histograma(
+    "alertas_ciclo_duracao_segundos", "Duração do ciclo ('total') e de cada etapa",
+    ("etapa",), LIMITES_CICLO)
+CICLOS = Contador("alertas_ciclos_total", "Ciclos executados por resultado", ("resultado",))
+CICLOS_ATRASADOS = Contador(
+    "alertas_ciclos_pulados_total", "Horários de ciclo pulados porque o ciclo anterior passou do intervalo", ("monitor",))
+FILA = Medidor("alertas_fila_tamanho", "Itens aguardando processamento no ciclo", ("fila",))
+ALERTAS = Contador("alertas_enviados_total", "Alertas por canal e resultado", ("canal", "resultado"))
+CACHE = Contador("alertas_cache_total", "Consultas a caches locais por resultado", ("cache", "resultado"))
+HTTP_FALHAS = Contador(
+    "alertas_http_falhas_transitorias_total",
+    "Falhas transitórias (timeout, conexao, 429, 5xx) e bloqueios por circuito aberto", ("servico", "motivo"))
+DISJUNTOR = Medidor(
+    "alertas_disjuntor_aberto", "1 enquanto o disjuntor do endpoint está aberto", ("servico", "endpoint"))
+CONCORRENCIA = Medidor(
+    "alertas_concorrencia_limite", "Requisições simultâneas permitidas pelo limitador adaptativo", ("servico",))
+CONCORRENCIA_EM_USO = Medidor(
+    "alertas_concorrencia_em_uso", "Requisições em andamento sob o limitador adaptativo", ("servico",))
+
+
+def registrar_cache(cache: str, acerto: bool):
+    CACHE.inc(cache=cache, resultado="acerto" if acerto else "falta")
+
+
+# ==================== TRANSPORTE ====================
+_IXC = re.compile(r"/webservice/v1/([^/?]+)")
+_TELEGRAM = re.compile(r"/bot[^/]+/([^/?]+)")
+
+
+def classificar_url(url: str) -> Tuple[str, str]:
+    """(serviço, endpoint) com cardinalidade limitada; nunca expõe o token do bot"""
+    caminho = requests.utils.urlparse(url or "").path
+    achado = _IXC.search(caminho)
+    if achado:
+        return "ixc", achado.group(1)
+    if "/relatorio/" in caminho:
+        return "escallo", caminho.rstrip("/").rsplit("/", 1)[-1]
+    achado = _TELEGRAM.search(caminho)
+    if achado:
+        return "telegram", achado.group(1)
+    if caminho in ("/send", "/health"):
+        return "whatsapp", caminho.strip("/")
+    return "outro", (caminho.strip("/").split("/", 1)[0] or "/")
+
+
+def instalar_transporte():
+    """Envolve requests.Session.send (depois da gravação/reprodução, se houver)"""
+    global _transporte_instalado
+    if _transporte_instalado:
+        return
+    envio_original = requests.Session.send
+
+    def send(self, request, **kwargs):
+        servico, endpoint = classificar_url(request.url)
+        inicio = time.perf_counter()
+        try:
+            response = envio_original(self, request, **kwargs)
+        except Exception:
+            HTTP_REQUISICOES.inc(servico=servico, endpoint=endpoint, resultado="erro")
+            raise
+        HTTP_LATENCIA.observar(time.perf_counter() - inicio, servico=servico, endpoint=endpoint)
+        HTTP_REQUISICOES.inc(servico=servico, endpoint=endpoint, resultado=f"{response.status_code // 100}xx")
+        return response
+
+    requests.Session.send = send
+    _transporte_instalado = True
+
+
+# ==================== SERVIDOR ====================
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        corpo = expor().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def iniciar_servidor(porta: int, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    global _servidor
+    if _servidor is not None:
+        return _servidor
+    try:
+        servidor = ThreadingHTTPServer((host, porta), _Handler)
+    except OSError as e:
+        logging.getLogger(__name__).error(f"Não foi possível abrir as métricas em {host}:{porta}: {e}")
+        return None
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+    _servidor = servidor
+    logging.getLogger(__name__).info(f"Métricas em http://{host}:{servidor.server_address[1]}/metrics")
+    return servidor
+
+
+def instalar_de_ambiente():
+    """Serve as métricas e mede o tráfego HTTP se METRICAS_PORTA estiver definida"""
+    porta = os.getenv("METRICAS_PORTA", "").strip()
+    if not porta:
+        return None
+    instalar_transporte()
+    return iniciar_servidor(int(porta), os.getenv("METRICAS_HOST", "127.0.0.1"))
@@ -0,0 +1,97 @@
+"""Paginação das listagens do IXC com busca concorrente das páginas seguintes."""
+import math
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator
+
+from comum import metricas
+
+# Páginas buscadas ao mesmo tempo depois que o total é conhecido
+PAGINAS_PARALELAS = int(os.getenv("IXC_PAGINAS_PARALELAS", "4"))
+
+# buscar_pagina(page, cabecalho) -> registros da página; falhas são sinalizadas com
+# exceção ou com a chave 'erro' no cabecalho
+BuscarPagina = Callable[[int, Dict], Iterable[Dict]]
+
+
+def _contar_pagina(nome: str, registros: int):
+    metricas.PAGINAS.inc(consulta=nome)
+    metricas.REGISTROS.inc(registros, consulta=nome)
+
+
+def _baixar_pagina(buscar_pagina: BuscarPagina, page: int):
+    cabecalho = {}
+    registros = list(buscar_pagina(page, cabecalho))
+    if "erro" in cabecalho:
+        raise RuntimeError(cabecalho["erro"])
+    return registros
+
+
+def paginar(buscar_pagina: BuscarPagina, rp: int, paralelas: int = PAGINAS_PARALELAS,
+            cabecalho_total: Dict = None, nome: str = "") -> Iterator[Dict]:
+    """Gera os registros de todas as páginas, na ordem.
+
+    A primeira página é consumida em fluxo; com o ``total`` dela, as demais são
+    buscadas em paralelo (no máximo ``paralelas`` em andamento, o que também limita a
+    memória). Sem ``total`` a paginação volta a ser sequencial. Na primeira página que
+    falhar a geração termina e, se informado, ``cabecalho_total['erro']`` é preenchido.
+    ``nome`` identifica a consulta nas métricas de páginas e registros lidos.
+    """
+    if cabecalho_total is None:
+        cabecalho_total = {}
+    cabecalho = {}
+    recebidos = 0
+    try:
+        for registro in buscar_pagina(1, cabecalho):
+            recebidos += 1
+            yield registro
+    except Exception as e:
+        cabecalho["erro"] = str(e)
+    cabecalho_total.update(cabecalho)
+    if "erro" in cabecalho:
+        return
+    _contar_pagina(nome, recebidos)
+    if recebidos < rp:
+        return
+
+    try:
+        total = int(cabecalho.get("total") or 0)
+    except (TypeError, ValueError):
+        total = 0
+
+    if total <= 0:
+        # Total desconhecido: segue página a página até uma incompleta
+        page = 2
+        while True:
+            try:
+                registros = _baixar_pagina(buscar_pagina, page)
+            except Exception as e:
+                cabecalho_total["erro"] = str(e)
+                return
+            _contar_pagina(nome, len(registros))
+            yield from registros
+            if len(registros) < rp:
+                return
+            page += 1
+
+    ultima = math.ceil(total / rp)
+    if ultima < 2:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, paralelas)) as executor:
+        pendentes = deque()
+        proxima = 2
+        while proxima <= ultima or pendentes:
+            while proxima <= ultima and len(pendentes) < max(1, paralelas):
+                pendentes.append(executor.submit(_baixar_pagina, buscar_pagina, proxima))
+                proxima += 1
+            futuro = pendentes.popleft()
+            try:
+                registros = futuro.result()
+            except Exception as e:
+                cabecalho_total["erro"] = str(e)
+                for f in pendentes:
+                    f.cancel()
+                return
+            _contar_pagina(nome, len(registros))
+            yield from registros
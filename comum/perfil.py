@@ -0,0 +1,195 @@
+"""Tempo por etapa de cada ciclo e captura de perfil (cProfile) sob demanda.
+
+Uso nos monitores::
+
+    @perfil.medir_ciclo("monitoramento_ligacoes")
+    def processar_ligacoes():
+        with perfil.etapa("buscar"):
+            ...
+        perfil.contar("ligacoes", len(registros))
+
+Ao fim do ciclo é emitido um único registro JSON (logger ``alertas.perfil``, e
+também acrescentado a ``PERFIL_ARQUIVO`` se definido) com a duração total, a soma e
+o número de ocorrências de cada etapa, os contadores e o resultado. As etapas também
+alimentam ``alertas_ciclo_duracao_segundos`` das métricas. ``etapa()`` fora de um
+ciclo só atualiza as métricas.
+
+Para investigar um ciclo lento, o próximo ciclo pode rodar sob ``cProfile``:
+
+- ``PERFIL_PROXIMO_CICLO=1`` no ambiente: perfila o primeiro ciclo do processo;
+- ``kill -USR1 <pid>``: perfila o ciclo seguinte (onde houver SIGUSR1).
+
+O perfil é gravado em ``PERFIL_DIRETORIO`` (padrão: pasta atual) como
+``perfil_<monitor>_<data>.prof`` (abrir com ``pstats``/snakeviz) e ``.txt`` com as
+funções de maior tempo acumulado. Só a thread que executa o ciclo é perfilada.
+"""
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from comum import metricas
+
+logger = logging.getLogger("alertas.perfil")
+
+_lock = threading.Lock()
+_ciclo_atual: Optional["Ciclo"] = None
+_perfilar_proximo = threading.Event()
+
+
+class Ciclo:
+    """Acumula a duração das etapas de um ciclo (de qualquer thread)"""
+
+    def __init__(self, monitor: str):
+        self.monitor = monitor
+        self.inicio = datetime.now()
+        self._relogio = time.perf_counter()
+        self.etapas: Dict[str, list] = {}
+        self.contadores: Dict[str, float] = {}
+        self.resultado = "ok"
+        self.arquivo_perfil: Optional[str] = None
+
+    def registrar_etapa(self, nome: str, duracao: float):
+        with _lock:
+            acumulado = self.etapas.setdefault(nome, [0.0, 0])
+            acumulado[0] += duracao
+            acumulado[1] += 1
+
+    def contar(self, nome: str, valor: float = 1):
+        with _lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + valor
+
+    def registro(self) -> Dict:
+        with _lock:
+            etapas = {nome: {"s": round(s, 4), "n": n} for nome, (s, n) in self.etapas.items()}
+            contadores = dict(self.contadores)
+        registro = {
+            "tipo": "ciclo",
+            "monitor": self.monitor,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "duracao_s": round(time.perf_counter() - self._relogio, 4),
+            "resultado": self.resultado,
+            "etapas": etapas,
+            "contadores": contadores,
+        }
+        if self.arquivo_perfil:
+            registro["perfil"] = self.arquivo_perfil
+        return registro
+
+
+@contextmanager
+def etapa(nome: str) -> Iterator[None]:
+    """Mede uma etapa; chamadas repetidas no mesmo ciclo são somadas"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        metricas.CICLO_DURACAO.observar(duracao, etapa=nome)
+        ciclo_atual = _ciclo_atual
+        if ciclo_atual is not None:
+            ciclo_atual.registrar_etapa(nome, duracao)
+
+
+@contextmanager
+def ciclo(monitor: str) -> Iterator[Ciclo]:
+    """Delimita um ciclo do monitor e emite o registro de tempos ao final"""
+    global _ciclo_atual
+    atual = Ciclo(monitor)
+    perfilador = None
+    if _perfilar_proximo.is_set():
+        _perfilar_proximo.clear()
+        perfilador = cProfile.Profile()
+    _ciclo_atual = atual
+    try:
+        if perfilador is not None:
+            perfilador.enable()
+        yield atual
+    except BaseException:
+        atual.resultado = "erro"
+        raise
+    finally:
+        if perfilador is not None:
+            perfilador.disable()
+            atual.arquivo_perfil = _salvar_perfil(perfilador, monitor)
+        _ciclo_atual = None
+        registro = atual.registro()
+        metricas.CICLO_DURACAO.observar(registro["duracao_s"], etapa="total")
+        metricas.CICLOS.inc(resultado=atual.resultado)
+        _emitir(registro)
+
+
+def medir_ciclo(monitor: str):
+    """Decorador: cada chamada da função é um ciclo do monitor"""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with ciclo(monitor):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def contar(nome: str, valor: float = 1):
+    """Soma um contador no registro do ciclo em andamento (ignorado fora de ciclo)"""
+    ciclo_atual = _ciclo_atual
+    if ciclo_atual is not None:
+        ciclo_atual.contar(nome, valor)
+
+
+def marcar_resultado(resultado: str):
+    """Resultado do ciclo em andamento quando não é 'ok' sem exceção (ex.: 'falha')"""
+    ciclo_atual = _ciclo_atual
+    if ciclo_atual is not None:
+        ciclo_atual.resultado = resultado
+
+
+def _emitir(registro: Dict):
+    linha = json.dumps(registro, ensure_ascii=False)
+    logger.info(linha)
+    caminho = os.getenv("PERFIL_ARQUIVO", "").strip()
+    if caminho:
+        try:
+            with open(caminho, "a", encoding="utf-8") as f:
+                f.write(linha + "\n")
+        except OSError as e:
+            logger.error(f"Erro ao gravar registro de tempos em {caminho}: {e}")
+
+
+def _salvar_perfil(perfilador: cProfile.Profile, monitor: str) -> Optional[str]:
+    diretorio = os.getenv("PERFIL_DIRETORIO", ".")
+    base = os.path.join(diretorio, f"perfil_{monitor}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        perfilador.dump_stats(base + ".prof")
+        texto = io.StringIO()
+        pstats.Stats(perfilador, stream=texto).sort_stats("cumulative").print_stats(40)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(texto.getvalue())
+    except OSError as e:
+        logger.error(f"Erro ao gravar perfil em {base}: {e}")
+        return None
+    logger.info(f"Perfil do ciclo gravado em {base}.prof")
+    return base + ".prof"
+
+
+def perfilar_proximo_ciclo(*_):
+    """Agenda o cProfile do próximo ciclo (também usado como handler do SIGUSR1)"""
+    _perfilar_proximo.set()
+
+
+def instalar_de_ambiente():
+    """Liga o SIGUSR1 e atende PERFIL_PROXIMO_CICLO; chamar na thread principal"""
+    if os.getenv("PERFIL_PROXIMO_CICLO", "").strip().lower() in ("1", "true", "sim"):
+        perfilar_proximo_ciclo()
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, perfilar_proximo_ciclo)
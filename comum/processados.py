@@ -0,0 +1,132 @@
+"""Registro persistido dos ids já processados, particionado por dia.
+
+Cada dia guarda os ids numéricos em um array ordenado (``array('q')``, 8 bytes por
+id), e a consulta é uma busca binária. Ids não numéricos, raros, ficam em um
+conjunto à parte. Os dias além da retenção são descartados por ``podar``.
+
+Para que uma queda não perca nada sem regravar o arquivo a cada id, ``marcar``
+acrescenta uma linha a um diário (``<caminho>.log``). ``compactar`` grava o estado
+inteiro em ``<caminho>`` (arquivo temporário + troca) e zera o diário. Ao carregar,
+o estado é o arquivo mais as linhas do diário.
+
+    registro = RegistroProcessados("ligacoes_processadas.json", dias=3)
+    if not registro.contem(id_ligacao, dia):
+        ...
+        registro.marcar(id_ligacao, dia)
+    registro.podar(date.today())
+    registro.compactar()
+"""
+import json
+import logging
+import os
+from array import array
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger("alertas.processados")
+
+
+class RegistroProcessados:
+    """Ids processados por dia, com retenção de `dias` dias"""
+
+    def __init__(self, caminho: str, dias: int = 3):
+        self.caminho = caminho
+        self.diario = caminho + ".log"
+        self.dias = dias
+        self._numericos: Dict[date, array] = {}
+        self._outros: Dict[date, Set[str]] = {}
+        self._carregar()
+
+    def _carregar(self):
+        if os.path.exists(self.caminho):
+            try:
+                with open(self.caminho, "r", encoding="utf-8") as f:
+                    dados = json.load(f)
+                for dia, ids in dados.get("numericos", {}).items():
+                    self._numericos[date.fromisoformat(dia)] = array("q", sorted(ids))
+                for dia, ids in dados.get("outros", {}).items():
+                    self._outros[date.fromisoformat(dia)] = set(ids)
+            except (OSError, ValueError) as e:
+                logger.error(f"Registro {self.caminho} ilegível, usando só o diário: {e}")
+        if os.path.exists(self.diario):
+            linha = ""
+            with open(self.diario, "r", encoding="utf-8") as f:
+                for linha in f:
+                    dia, _, chave = linha.rstrip("\n").partition(" ")
+                    if chave:
+                        # Linha cortada por uma queda no meio da escrita é ignorada
+                        try:
+                            self._inserir(chave, date.fromisoformat(dia))
+                        except ValueError:
+                            continue
+            if linha and not linha.endswith("\n"):
+                # Fecha a linha cortada para não emendar com a próxima marcação
+                with open(self.diario, "a", encoding="utf-8") as f:
+                    f.write("\n")
+
+    @staticmethod
+    def _numero(chave) -> Optional[int]:
+        try:
+            return int(chave)
+        except (TypeError, ValueError):
+            return None
+
+    def _inserir(self, chave, dia: date) -> bool:
+        numero = self._numero(chave)
+        if numero is None:
+            outros = self._outros.setdefault(dia, set())
+            if str(chave) in outros:
+                return False
+            outros.add(str(chave))
+            return True
+        ids = self._numericos.setdefault(dia, array("q"))
+        i = bisect_left(ids, numero)
+        if i < len(ids) and ids[i] == numero:
+            return False
+        ids.insert(i, numero)
+        return True
+
+    def contem(self, chave, dia: Optional[date] = None) -> bool:
+        """Se o id foi processado no dia (ou em qualquer dia retido, sem dia)"""
+        numero = self._numero(chave)
+        dias = [dia] if dia is not None else set(self._numericos) | set(self._outros)
+        for d in dias:
+            if numero is None:
+                if str(chave) in self._outros.get(d, ()):
+                    return True
+                continue
+            ids = self._numericos.get(d)
+            if ids:
+                i = bisect_left(ids, numero)
+                if i < len(ids) and ids[i] == numero:
+                    return True
+        return False
+
+    def marcar(self, chave, dia: date):
+        """Registra o id e o grava no diário na hora"""
+        if self._inserir(chave, dia):
+            with open(self.diario, "a", encoding="utf-8") as f:
+                f.write(f"{dia.isoformat()} {chave}\n")
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._numericos.values()) + sum(len(ids) for ids in self._outros.values())
+
+    def podar(self, hoje: date):
+        """Descarta os dias anteriores à retenção"""
+        limite = hoje - timedelta(days=self.dias - 1)
+        for particao in (self._numericos, self._outros):
+            for dia in [dia for dia in particao if dia < limite]:
+                del particao[dia]
+
+    def compactar(self):
+        dados = {
+            "numericos": {dia.isoformat(): ids.tolist() for dia, ids in sorted(self._numericos.items())},
+            "outros": {dia.isoformat(): sorted(ids) for dia, ids in sorted(self._outros.items())},
+        }
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f)
+        os.replace(temporario, self.caminho)
+        # O diário só é zerado depois que o estado completo está gravado
+        open(self.diario, "w").close()
@@ -0,0 +1,142 @@
+"""Registros compactos das entidades do IXC e do Escallo.
+
+Cada classe guarda apenas os campos usados pelos monitores, já convertidos
+(inteiros e datas) no momento da leitura, em vez do dicionário completo da API.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+DATA_VAZIA = "0000-00-00 00:00:00"
+
+
+def para_int(valor, padrao: Optional[int] = None) -> Optional[int]:
+    """Converte o valor da API em int; vazio ou inválido retorna o padrão"""
+    if valor is None or valor == "":
+        return padrao
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return padrao
+
+
+def para_data(valor) -> Optional[datetime]:
+    """Converte 'YYYY-MM-DD HH:MM:SS' em datetime; vazio, zerado ou inválido retorna None"""
+    if not valor or valor == DATA_VAZIA:
+        return None
+    try:
+        # fromisoformat é bem mais rápido que strptime para esse formato fixo
+        return datetime.fromisoformat(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+class OrdemServico:
+    """OS (su_oss_chamado)"""
+    __slots__ = ("id", "id_cliente", "id_assunto", "id_tecnico", "id_ticket",
+                 "status", "data_abertura", "ultima_atualizacao")
+
+    def __init__(self, id, id_cliente, id_assunto, id_tecnico, id_ticket, status, data_abertura,
+                 ultima_atualizacao=None):
+        self.id = id
+        self.id_cliente = id_cliente
+        self.id_assunto = id_assunto
+        self.id_tecnico = id_tecnico
+        self.id_ticket = id_ticket
+        self.status = status
+        self.data_abertura = data_abertura
+        self.ultima_atualizacao = ultima_atualizacao
+
+    @classmethod
+    def de_registro(cls, r: Dict) -> "OrdemServico":
+        return cls(
+            str(r.get("id", "")),
+            str(r.get("id_cliente", "")),
+            para_int(r.get("id_assunto"), 0),
+            para_int(r.get("id_tecnico")),
+            para_int(r.get("id_ticket")) or None,
+            r.get("status", ""),
+            para_data(r.get("data_abertura")),
+            para_data(r.get("ultima_atualizacao")),
+        )
+
+
+class MensagemOS:
+    """Evento do histórico de uma OS (su_oss_chamado_mensagem)"""
+    __slots__ = ("id", "id_chamado", "data", "id_operador", "id_evento", "status",
+                 "id_tecnico", "data_final", "historico")
+
+    def __init__(self, id, id_chamado, data, id_operador, id_evento, status,
+                 id_tecnico, data_final, historico):
+        self.id = id
+        self.id_chamado = id_chamado
+        self.data = data
+        self.id_operador = id_operador
+        self.id_evento = id_evento
+        self.status = status
+        self.id_tecnico = id_tecnico
+        self.data_final = data_final
+        self.historico = historico
+
+    @classmethod
+    def de_registro(cls, r: Dict) -> "MensagemOS":
+        return cls(
+            para_int(r.get("id"), 0),
+            str(r.get("id_chamado", "")),
+            para_data(r.get("data")),
+            para_int(r.get("id_operador"), 0),
+            para_int(r.get("id_evento"), 0),
+            r.get("status", "") or "",
+            para_int(r.get("id_tecnico")),
+            para_data(r.get("data_final")),
+            r.get("historico", "") or "",
+        )
+
+
+class Ticket:
+    """Atendimento (su_ticket)"""
+    __slots__ = ("id", "id_cliente", "id_assunto", "id_responsavel_tecnico",
+                 "data_criacao", "mensagem")
+
+    def __init__(self, id, id_cliente, id_assunto, id_responsavel_tecnico, data_criacao, mensagem):
+        self.id = id
+        self.id_cliente = id_cliente
+        self.id_assunto = id_assunto
+        self.id_responsavel_tecnico = id_responsavel_tecnico
+        self.data_criacao = data_criacao
+        self.mensagem = mensagem
+
+    @classmethod
+    def de_registro(cls, r: Dict) -> "Ticket":
+        return cls(
+            str(r.get("id", "")),
+            str(r.get("id_cliente", "") or ""),
+            para_int(r.get("id_assunto"), 0),
+            str(r.get("id_responsavel_tecnico", "") or ""),
+            para_data(r.get("data_criacao")),
+            # O campo vem com esse nome na API do IXC
+            r.get("menssagem", "") or "",
+        )
+
+
+class Ligacao:
+    """Ligação atendida em fila (relatório rel001 do Escallo)"""
+    __slots__ = ("id", "origem", "destino", "status", "fila_nome", "data_hora_final")
+
+    def __init__(self, id, origem, destino, status, fila_nome, data_hora_final):
+        self.id = id
+        self.origem = origem
+        self.destino = destino
+        self.status = status
+        self.fila_nome = fila_nome
+        self.data_hora_final = data_hora_final
+
+    @classmethod
+    def de_registro(cls, r: Dict) -> "Ligacao":
+        return cls(
+            r.get("filaAtendimentoLigacao.id"),
+            r.get("filaAtendimentoLigacao.origem"),
+            r.get("filaAtendimentoLigacao.destino", "") or "",
+            r.get("filaAtendimentoLigacao.statusFormatado", "") or "",
+            r.get("telefoniaFilaAtendimento.nome", "") or "",
+            para_data(r.get("filaAtendimentoLigacao.dataHoraFinal")),
+        )
@@ -0,0 +1,192 @@
+"""Requisições HTTP com novas tentativas, backoff com jitter e disjuntor por endpoint.
+
+``requisitar`` repete só as falhas transitórias:
+
+- ``timeout`` e ``conexao`` (exceções do requests);
+- ``429`` (respeitando ``Retry-After``) e ``5xx``.
+
+As demais respostas (2xx, 4xx) voltam para quem chamou decidir. Entre tentativas a
+espera é sorteada entre 0 e ``base * 2**tentativa`` (limitada a ``HTTP_BACKOFF_MAX``),
+para que vários monitores não voltem todos ao mesmo tempo.
+
+Cada endpoint (serviço + tabela/método, como nas métricas) tem um disjuntor: após
+``DISJUNTOR_FALHAS`` requisições seguidas que falharam (cada uma conta uma vez, depois
+de esgotadas as suas tentativas) ele abre e as chamadas falham na hora com
+``CircuitoAberto`` por ``DISJUNTOR_ESPERA`` segundos; depois uma única chamada de
+teste, sem novas tentativas, decide se fecha de novo. Esgotadas as tentativas, ``FalhaRequisicao`` é lançada:
+quem chama deve tratar o ciclo como parcial em vez de seguir com dados faltando.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+
+from comum import metricas
+
+TENTATIVAS = int(os.getenv("HTTP_TENTATIVAS", "4"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", "30"))
+DISJUNTOR_FALHAS = int(os.getenv("DISJUNTOR_FALHAS", "5"))
+DISJUNTOR_ESPERA = float(os.getenv("DISJUNTOR_ESPERA", "60"))
+
+logger = logging.getLogger("alertas.resiliencia")
+
+
+class FalhaRequisicao(Exception):
+    """Falha transitória que persistiu após as tentativas (ou circuito aberto)"""
+
+    def __init__(self, mensagem: str, motivo: str, response: Optional[requests.Response] = None):
+        super().__init__(mensagem)
+        self.motivo = motivo
+        self.response = response
+
+
+class CircuitoAberto(FalhaRequisicao):
+    pass
+
+
+def classificar(response: Optional[requests.Response] = None,
+                erro: Optional[BaseException] = None) -> Optional[str]:
+    """Motivo da falha se ela vale nova tentativa; None se não vale"""
+    if erro is not None:
+        if isinstance(erro, requests.exceptions.Timeout):
+            return "timeout"
+        if isinstance(erro, requests.exceptions.ConnectionError):
+            return "conexao"
+        return None
+    if response is not None:
+        if response.status_code == 429:
+            return "429"
+        if response.status_code >= 500:
+            return "5xx"
+    return None
+
+
+def espera_backoff(tentativa: int, retry_after: Optional[float] = None) -> float:
+    """Segundos até a próxima tentativa (tentativa começa em 0)"""
+    if retry_after is not None:
+        return min(max(retry_after, 0.0), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** tentativa))
+
+
+def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    if response is None or response.status_code not in (429, 503):
+        return None
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class Disjuntor:
+    """Abre após `limite` falhas seguidas; meio-aberto libera uma chamada de teste"""
+
+    def __init__(self, limite: int = DISJUNTOR_FALHAS, espera: float = DISJUNTOR_ESPERA):
+        self.limite = limite
+        self.espera = espera
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self.testando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        if self.falhas < self.limite:
+            return "fechado"
+        return "aberto" if time.monotonic() < self.aberto_ate or self.testando else "meio_aberto"
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.falhas < self.limite:
+                return True
+            if time.monotonic() < self.aberto_ate or self.testando:
+                return False
+            self.testando = True
+            return True
+
+    def sucesso(self) -> bool:
+        """Zera as falhas; retorna True se o circuito estava aberto"""
+        with self._lock:
+            estava_aberto = self.falhas >= self.limite
+            self.falhas = 0
+            self.testando = False
+            return estava_aberto
+
+    def falha(self) -> bool:
+        """Registra a falha; retorna True se o circuito (re)abriu com ela"""
+        with self._lock:
+            self.falhas += 1
+            self.testando = False
+            if self.falhas >= self.limite:
+                self.aberto_ate = time.monotonic() + self.espera
+                return True
+            return False
+
+
+_disjuntores: Dict[Tuple[str, str], Disjuntor] = {}
+_lock_disjuntores = threading.Lock()
+
+
+def disjuntor(chave: Tuple[str, str]) -> Disjuntor:
+    with _lock_disjuntores:
+        atual = _disjuntores.get(chave)
+        if atual is None:
+            atual = _disjuntores[chave] = Disjuntor()
+        return atual
+
+
+def requisitar(metodo: str, url: str, tentativas: int = None, **kwargs) -> requests.Response:
+    """requests.request com novas tentativas para falhas transitórias.
+
+    Retorna a resposta (inclusive 4xx); lança ``FalhaRequisicao`` se as falhas
+    transitórias persistirem e ``CircuitoAberto`` se o endpoint estiver bloqueado.
+    """
+    tentativas = tentativas or TENTATIVAS
+    servico, endpoint = metricas.classificar_url(url)
+    circuito = disjuntor((servico, endpoint))
+    tentativa = 0
+
+    while True:
+        if not circuito.permitir():
+            metricas.HTTP_FALHAS.inc(servico=servico, motivo="circuito_aberto")
+            raise CircuitoAberto(f"Circuito aberto para {servico}/{endpoint}", "circuito_aberto")
+        # Chamada de teste do circuito meio-aberto: uma falha já o reabre
+        teste = circuito.testando
+
+        response = None
+        try:
+            response = requests.request(metodo, url, **kwargs)
+            motivo = classificar(response=response)
+            descricao = f"HTTP {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            motivo = classificar(erro=e)
+            if motivo is None:
+                raise
+            descricao = str(e)
+
+        if motivo is None:
+            if circuito.sucesso():
+                metricas.DISJUNTOR.definir(0, servico=servico, endpoint=endpoint)
+            return response
+
+        metricas.HTTP_FALHAS.inc(servico=servico, motivo=motivo)
+        if response is not None:
+            response.close()
+
+        tentativa += 1
+        if tentativa >= tentativas or teste:
+            # O disjuntor conta a requisição, não cada tentativa dela
+            if circuito.falha():
+                metricas.DISJUNTOR.definir(1, servico=servico, endpoint=endpoint)
+                logger.warning(f"Circuito de {servico}/{endpoint} aberto por {circuito.espera:g}s "
+                               f"após {circuito.falhas} requisições seguidas com falha")
+            raise FalhaRequisicao(f"{servico}/{endpoint}: {descricao} após {tentativa} "
+                                  f"tentativa{'s' if tentativa > 1 else ''}",
+                                  motivo, response)
+        espera = espera_backoff(tentativa - 1, _retry_after(response))
+        logger.info(f"{servico}/{endpoint}: {descricao}; nova tentativa em {espera:.1f}s")
+        time.sleep(espera)
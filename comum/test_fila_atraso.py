@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from comum.fila_atraso import FilaAtraso
+
+AGORA = datetime(2024, 5, 2, 10, 0)
+
+
+def test_retira_so_vencidos_mais_antigo_primeiro(tmp_path):
+    fila = FilaAtraso(str(tmp_path / "fila.json"))
+    fila.adicionar("b", AGORA + timedelta(minutes=5), {"n": 2})
+    fila.adicionar("a", AGORA - timedelta(minutes=5), {"n": 1})
+    fila.adicionar("c", AGORA + timedelta(minutes=20), {"n": 3})
+
+    assert fila.proximo_vencimento() == AGORA - timedelta(minutes=5)
+    assert fila.retirar_vencidos(AGORA + timedelta(minutes=10)) == [
+        ("a", AGORA - timedelta(minutes=5), {"n": 1}),
+        ("b", AGORA + timedelta(minutes=5), {"n": 2}),
+    ]
+    assert len(fila) == 1 and "c" in fila and "a" not in fila
+
+
+def test_chave_repetida_nao_entra(tmp_path):
+    fila = FilaAtraso(str(tmp_path / "fila.json"))
+    assert fila.adicionar(123, AGORA, {})
+    assert not fila.adicionar("123", AGORA + timedelta(minutes=1), {})
+    assert len(fila) == 1
+    fila.retirar_vencidos(AGORA)
+    # Depois de retirada, a chave pode voltar
+    assert fila.adicionar("123", AGORA, {})
+
+
+def test_salvar_e_recarregar(tmp_path):
+    caminho = str(tmp_path / "fila.json")
+    fila = FilaAtraso(caminho)
+    fila.adicionar("1", AGORA + timedelta(minutes=3), {"origem": "11999999999", "tentativas": 2})
+    fila.adicionar("2", AGORA, {"origem": "1133334444"})
+    fila.salvar()
+
+    recarregada = FilaAtraso(caminho)
+    assert len(recarregada) == 2
+    assert recarregada.retirar_vencidos(AGORA + timedelta(hours=1)) == [
+        ("2", AGORA, {"origem": "1133334444"}),
+        ("1", AGORA + timedelta(minutes=3), {"origem": "11999999999", "tentativas": 2}),
+    ]
+    assert not (tmp_path / "fila.json.tmp").exists()
+
+
+def test_arquivo_ilegivel_comeca_vazia(tmp_path):
+    caminho = tmp_path / "fila.json"
+    caminho.write_text('[{"chave": "1", "venc', encoding="utf-8")
+    assert len(FilaAtraso(str(caminho))) == 0
@@ -0,0 +1,47 @@
+import json
+
+from comum.filtros_ixc import atende, condicao, grid_param
+
+
+def test_condicao_e_grid_param():
+    condicoes = [
+        condicao("su_oss_chamado.status", "=", "A"),
+        condicao("su_oss_chamado.id_assunto", "IN", [544, 167]),
+    ]
+    assert condicoes[1] == {"TB": "su_oss_chamado.id_assunto", "OP": "IN", "P": "544,167"}
+    assert json.loads(grid_param(condicoes)) == condicoes
+
+
+def test_in_compara_texto_e_numero():
+    assuntos = [condicao("su_oss_chamado.id_assunto", "IN", [544, 167])]
+    assert atende({"id_assunto": "544"}, assuntos)
+    assert atende({"id_assunto": 167}, assuntos)
+    assert atende({"id_assunto": "167.0"}, assuntos)
+    assert not atende({"id_assunto": "54"}, assuntos)
+    assert not atende({"id_assunto": ""}, assuntos)
+
+
+def test_datas_comparam_como_texto():
+    ate = [condicao("su_oss_chamado.data_abertura", "<", "2024-06-01 00:00:00")]
+    assert atende({"data_abertura": "2024-05-31 23:59:59"}, ate)
+    assert not atende({"data_abertura": "2024-06-01 00:00:00"}, ate)
+    assert not atende({"data_abertura": "2024-06-10 08:00:00"}, ate)
+
+    desde = [condicao("su_oss_chamado.data_abertura", ">=", "2024-05-01 00:00:00")]
+    assert atende({"data_abertura": "2024-05-01 00:00:00"}, desde)
+    assert not atende({"data_abertura": "2024-04-30 23:59:59"}, desde)
+
+
+def test_numeros_comparam_como_numero():
+    # Como texto, "9" > "10"
+    assert atende({"id": "9"}, [condicao("su_ticket.id", "<", 10)])
+    assert not atende({"id": "10"}, [condicao("su_ticket.id", "!=", "10")])
+
+
+def test_campo_ausente_nao_atende():
+    assert not atende({"status": "A"}, [condicao("su_oss_chamado.id_assunto", "=", "1")])
+    assert atende({"status": "A"}, [])
+
+
+def test_like():
+    assert atende({"assunto": "Sem Conexão"}, [condicao("su_oss_assunto.assunto", "L", "conexão")])
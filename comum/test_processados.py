@@ -0,0 +1,73 @@
+from datetime import date
+
+from comum.processados import RegistroProcessados
+
+HOJE = date(2024, 5, 3)
+ONTEM = date(2024, 5, 2)
+
+
+def test_contem_por_dia_e_em_qualquer_dia(tmp_path):
+    registro = RegistroProcessados(str(tmp_path / "processados.json"), dias=3)
+    registro.marcar(42, ONTEM)
+    registro.marcar("abc-1", HOJE)
+
+    assert registro.contem("42", ONTEM)
+    assert not registro.contem(42, HOJE)
+    assert registro.contem(42)
+    assert registro.contem("abc-1", HOJE) and not registro.contem("abc-1", ONTEM)
+    assert len(registro) == 2
+
+
+def test_diario_reaplicado_apos_queda(tmp_path):
+    caminho = str(tmp_path / "processados.json")
+    registro = RegistroProcessados(caminho)
+    for chave in (30, 10, 20, "x"):
+        registro.marcar(chave, HOJE)
+    # Marcar de novo não duplica a linha do diário
+    registro.marcar(10, HOJE)
+    assert len((tmp_path / "processados.json.log").read_text().splitlines()) == 4
+
+    # Sem compactar: o estado vem só do diário
+    recarregado = RegistroProcessados(caminho)
+    assert all(recarregado.contem(chave, HOJE) for chave in (10, 20, 30, "x"))
+    assert len(recarregado) == 4
+
+
+def test_linha_cortada_no_diario(tmp_path):
+    caminho = str(tmp_path / "processados.json")
+    diario = tmp_path / "processados.json.log"
+    diario.write_text(f"{HOJE.isoformat()} 1\n2024-05-0", encoding="utf-8")
+
+    registro = RegistroProcessados(caminho)
+    assert registro.contem(1, HOJE) and len(registro) == 1
+    # A próxima marcação não emenda com a linha cortada
+    registro.marcar(2, HOJE)
+    assert RegistroProcessados(caminho).contem(2, HOJE)
+
+
+def test_compactar_grava_estado_e_zera_diario(tmp_path):
+    caminho = str(tmp_path / "processados.json")
+    registro = RegistroProcessados(caminho)
+    registro.marcar(7, ONTEM)
+    registro.marcar("y", HOJE)
+    registro.compactar()
+
+    assert (tmp_path / "processados.json.log").read_text() == ""
+    registro.marcar(8, HOJE)
+    recarregado = RegistroProcessados(caminho)
+    assert recarregado.contem(7, ONTEM) and recarregado.contem("y", HOJE) and recarregado.contem(8, HOJE)
+
+
+def test_podar_descarta_dias_fora_da_retencao(tmp_path):
+    caminho = str(tmp_path / "processados.json")
+    registro = RegistroProcessados(caminho, dias=2)
+    registro.marcar(1, date(2024, 5, 1))
+    registro.marcar("z", date(2024, 5, 1))
+    registro.marcar(2, ONTEM)
+    registro.marcar(3, HOJE)
+    registro.podar(HOJE)
+
+    assert not registro.contem(1) and not registro.contem("z")
+    assert registro.contem(2, ONTEM) and registro.contem(3, HOJE)
+    registro.compactar()
+    assert len(RegistroProcessados(caminho, dias=2)) == 2